@@ -1,5 +1,6 @@
 import ctypes as ct
 import os, time
+import json
 import numpy as np
 import matplotlib.pyplot as plt
 from enum import Enum
@@ -10,6 +11,257 @@ class TrigMode(Enum):
     LEVEL = 3
     INTERNAL = 4
 
+
+class StreamRingBuffer:
+    """
+    Preallocated two channel int16 ring buffer for streamed data.
+
+    Each transfer page (first half ch1, second half ch2) is copied in with
+    one memcpy per channel, wrapping at the end of the buffer. Blocks are
+    read out in order as (2, n) int16 arrays.
+
+    Arguments
+    ---------
+        int: capacity - Samples per channel the buffer can hold
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        self.data = np.zeros((2, self.capacity), dtype=np.int16)
+        self.read_index = 0
+        self.available = 0
+        self.total_written = 0
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.available
+
+    def write_page(self, page: np.ndarray) -> None:
+        """
+        Copy one transfer page into the buffer
+
+        Arguments
+        ---------
+            np.ndarray: page - int16 page of the form [ch1..., ch2...]
+        """
+        half = page.size // 2
+        if half > self.free:
+            raise BufferError("Stream ring buffer full, read data out first")
+        start = (self.read_index + self.available) % self.capacity
+        first = min(half, self.capacity - start)
+        for ch in range(2):
+            channel = page[ch * half:(ch + 1) * half]
+            np.copyto(self.data[ch, start:start + first], channel[:first])
+            if first < half:
+                np.copyto(self.data[ch, :half - first], channel[first:])
+        self.available += half
+        self.total_written += half
+
+    def read(self, samples: int, out: np.ndarray = None) -> np.ndarray:
+        """
+        Read the oldest samples out of the buffer
+
+        Arguments
+        ---------
+            int: samples - Samples per channel to read
+            np.ndarray: out (opt) - (2, samples) int16 array to fill
+
+        Returns
+        -------
+            np.ndarray: block - (2, samples) int16 data, ch1 = block[0]
+        """
+        if samples > self.available:
+            raise BufferError("Not enough data in stream ring buffer")
+        if out is None:
+            out = np.empty((2, samples), dtype=np.int16)
+        first = min(samples, self.capacity - self.read_index)
+        np.copyto(out[:, :first], self.data[:, self.read_index:self.read_index + first])
+        if first < samples:
+            np.copyto(out[:, first:], self.data[:, :samples - first])
+        self.read_index = (self.read_index + samples) % self.capacity
+        self.available -= samples
+        return out
+
+SDR14_SAMPLE_RATE = 800e6
+STREAM_FILE_MAGIC = b"ADQSTRM1"
+STREAM_HEADER_SIZE = 4096
+
+
+class StreamRecorder:
+    """
+    Raw binary recorder for streamed data.
+
+    Transfer pages are written to disk exactly as they come from the
+    device, one write per page. The file starts with a fixed size header
+    (magic, then JSON padded to STREAM_HEADER_SIZE bytes) describing the
+    layout, followed by the pages. Each page holds nof_samples_per_buffer
+    int16 samples: the first half ch1, the second half ch2 ("page planar"
+    interleave). Use read_stream_file() to map a recording back.
+
+    Arguments
+    ---------
+        str: path - Output file
+        dict: header - Stream settings stored in the header, must include
+                       samples_per_page
+        int: total_pages (opt) - Preallocate the file for this many pages
+                                 and write through np.memmap. The file is
+                                 truncated to the pages written on close
+    """
+
+    def __init__(self, path: str, header: dict, total_pages: int = None):
+        self.path = path
+        self.samples_per_page = int(header["samples_per_page"])
+        self.pages = 0
+        header = dict(header, dtype="int16", interleave="page_planar", header_size=STREAM_HEADER_SIZE)
+        encoded = json.dumps(header).encode()
+        if len(encoded) > STREAM_HEADER_SIZE - len(STREAM_FILE_MAGIC):
+            raise ValueError("Stream header too large")
+
+        with open(path, "wb") as f:
+            f.write(STREAM_FILE_MAGIC + encoded.ljust(STREAM_HEADER_SIZE - len(STREAM_FILE_MAGIC), b" "))
+
+        self.map = None
+        self.file = None
+        if total_pages:
+            self.map = np.memmap(path, dtype=np.int16, mode="r+", offset=STREAM_HEADER_SIZE,
+                                 shape=(int(total_pages), self.samples_per_page))
+        else:
+            self.file = open(path, "ab")
+
+    def write_page(self, page: np.ndarray) -> None:
+        """
+        Append one transfer page
+
+        Arguments
+        ---------
+            np.ndarray: page - int16 page of the form [ch1..., ch2...]
+        """
+        if self.map is not None:
+            self.map[self.pages] = page
+        else:
+            self.file.write(page.data)
+        self.pages += 1
+
+    def close(self) -> int:
+        """
+        Flush and close the recording
+
+        Returns
+        -------
+            int: pages - Number of pages recorded
+        """
+        if self.map is not None:
+            self.map.flush()
+            self.map = None  # Unmaps the file, nothing else holds a view
+            # Drop preallocated pages that were never filled
+            os.truncate(self.path, STREAM_HEADER_SIZE + self.pages * self.samples_per_page * 2)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        return self.pages
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_stream_file(path: str) -> (dict, np.ndarray):
+    """
+    Memory map a recording made by StreamRecorder
+
+    Arguments
+    ---------
+        str: path - Recording file
+
+    Returns
+    -------
+        dict: header - Stream settings (sample_skip, clock_source, ...)
+        np.memmap: data - Read only int16 array of shape
+                          (pages, 2, samples_per_page / 2), so
+                          data[:, 0].ravel() is the whole of ch1
+    """
+    with open(path, "rb") as f:
+        raw_header = f.read(STREAM_HEADER_SIZE)
+    if not raw_header.startswith(STREAM_FILE_MAGIC):
+        raise ValueError("{} is not an ADQ stream recording".format(path))
+    header = json.loads(raw_header[len(STREAM_FILE_MAGIC):].decode())
+
+    half = header["samples_per_page"] // 2
+    pages = (os.path.getsize(path) - STREAM_HEADER_SIZE) // (header["samples_per_page"] * 2)
+    if pages == 0:
+        return header, np.zeros((0, 2, half), dtype=np.int16)
+    data = np.memmap(path, dtype=np.int16, mode="r", offset=STREAM_HEADER_SIZE, shape=(pages, 2, half))
+    return header, data
+
+
+class TransferBufferWait:
+    """
+    Waits for filled transfer buffers without spinning on the CPU.
+
+    Polls ADQ_GetTransferBufferStatus, sleeping between polls with an
+    exponential backoff from min_sleep up to latency_target, so a page is
+    picked up at most latency_target after it is filled while an idle
+    stream costs almost no CPU (and leaves the GIL to other threads). Wall
+    and CPU time spent waiting are accumulated.
+
+    Arguments
+    ---------
+        float: latency_target (opt) - Longest sleep between polls (s)
+        float: min_sleep (opt) - First sleep after an empty poll (s)
+    """
+
+    def __init__(self, latency_target: float = 1e-3, min_sleep: float = 20e-6):
+        self.latency_target = latency_target
+        self.min_sleep = min_sleep
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.waits = 0
+        self.polls = 0
+        self.wait_time = 0.0
+        self.cpu_time = 0.0
+
+    def wait(self, poll) -> int:
+        """
+        Wait until at least one transfer buffer is filled
+
+        Arguments
+        ---------
+            callable: poll - Returns the number of filled buffers
+
+        Returns
+        -------
+            int: filled - Number of filled buffers
+        """
+        filled = poll()
+        self.polls += 1
+        if filled:
+            return filled
+
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        sleep = self.min_sleep
+        while not filled:
+            time.sleep(sleep)
+            sleep = min(2 * sleep, self.latency_target)
+            filled = poll()
+            self.polls += 1
+        self.waits += 1
+        self.wait_time += time.perf_counter() - start
+        self.cpu_time += time.thread_time() - cpu_start
+        return filled
+
+    def summary(self) -> str:
+        """
+        Returns
+        -------
+            str: One line summary of time spent waiting
+        """
+        return "Waited {} times ({} polls): {:.3f} s, {:.3f} s CPU".format(self.waits, self.polls,
+                                                                       self.wait_time, self.cpu_time)
+
+
 class sdr14:
     """
     SDR14 tools - v1.1
@@ -33,15 +285,19 @@ class sdr14:
             default = False
             Can be overidden after initialisation using the
             'set_global_quiet()' method
+        object: api (opt): Already loaded API object to use instead of
+            loading lib_dir, e.g. FakeADQAPI for running without hardware
+            default = None
 
     Provides
     --------
 
     """
 
-    def __init__(self, lib_dir="", adq_logs=False, quiet=False):
+    def __init__(self, lib_dir="", adq_logs=False, quiet=False, api=None):
         self.__quiet = quiet  # Set global quiet state
-        self.__api = self.__load_api(lib_dir)  # Load api as private object
+        # Load api as private object
+        self.__api = api if api is not None else self.__load_api(lib_dir)
         if adq_logs:  # Enable error logging to file
             conf = self.__api.ADQControlUnit_EnableErrorTrace(self.__cu,
                                                               3,
@@ -75,6 +331,7 @@ class sdr14:
 
         ### Create additional objects for data recording ###
         self.stream_cfg_data = self.stream_config_struct()
+        self.buffer_wait = TransferBufferWait()
 
         return
 
@@ -671,7 +928,7 @@ api.ADQ_GetBoardProductName.restype = ct.c_char_p\n
 
 
     def get_data_setup(self, write_to_file=None, total_records=None, records_per_transfer=None, samples_per_record=None,
-                       quiet=None):
+                       quiet=None, file_format="binary", memmap=False):
         """
         Setup procedure for reading recorded data from SDR14
 
@@ -685,10 +942,17 @@ api.ADQ_GetBoardProductName.restype = ct.c_char_p\n
                                           transfer
         int: samples_per_record (opt) - Set samples per record
         bool: quiet (opt) - Override global quiet
+        str: file_format (opt) - "binary" records raw pages with
+                                 StreamRecorder (read back with
+                                 read_stream_file), "csv" writes one
+                                 "ch1, ch2" line per sample
+        bool: memmap (opt) - Preallocate the binary file for all records
+                             and write through np.memmap
 
         Returns
         -------
-            array: data - Data recorded. data[0] = ch1, data[2] = ch2
+            np.ndarray: data - (2, n) int16 data recorded. data[0] = ch1,
+                               data[1] = ch2
             int: exit_code - Reason for exit
         """
         quiet = self.__qtest(quiet)
@@ -700,14 +964,127 @@ api.ADQ_GetBoardProductName.restype = ct.c_char_p\n
         if exit_code == 50:
             if not quiet:
                 print("Config types must be int")
+        total_nof_buffers = self.stream_cfg_data.total_nof_buffers
+        half = self.stream_cfg_data.nof_samples_per_buffer // 2
+        # Holds the whole recording, so never wraps
+        ring = StreamRingBuffer(total_nof_buffers * half)
+        output_file = None
+
+        if write_to_file:
+            extension = "csv" if file_format == "csv" else "adq"
+            if type(write_to_file) == str:
+                path = write_to_file
+            else:
+                path = "ADQ-Recording-{:0>2}-{:0>2}-{:0>2}--{:0>2}-{:0>2}-{:0>2}.{}".format(*time.localtime()[0:6],
+                                                                                            extension)
+            if file_format == "csv":
+                output_file = open(path, "a+")
+            else:
+                header = {"samples_per_page": self.stream_cfg_data.nof_samples_per_buffer,
+                          "channels": 2,
+                          "sample_skip": self.stream_cfg_data.sample_skip,
+                          "clock_source": self.stream_cfg_data.clock_source,
+                          "sample_rate": SDR14_SAMPLE_RATE / self.stream_cfg_data.sample_skip,
+                          "start_time": time.time()}
+                output_file = StreamRecorder(path, header, total_nof_buffers if memmap else None)
+
+        if not halt:
+            halt, exit_code = self.__start_stream(quiet)
+        try:
+            if not quiet and not halt:
+                print("\n**************************")
+                print("* Staring data recording *")
+                print("*          **            *")
+                print("*  Press <Ctl-c> at any  *")
+                print("*     time to abort      *")
+                print("**************************\n")
+            while self.stream_cfg_data.records_fetched < total_nof_buffers \
+                    and not halt and exit_code != 5:
+                exit_code = self.__fetch_data(ring,
+                                              output_file,
+                                              exit_code,
+                                              total_nof_buffers - self.stream_cfg_data.records_fetched,
+                                              quiet)
+            if not quiet:
+                print("")  # newline after record screen data
+        except KeyboardInterrupt:
+            if not quiet:
+                print("Operation cancelled by user")
+            exit_code = -1
+        finally:
+            if output_file:
+                output_file.close()
+
+        exit_code = self.__stop_stream(exit_code, quiet)
+        return ring.read(ring.available), exit_code
+
+    def stream_blocks(self, block_size: int, total_records=None, records_per_transfer=None, samples_per_record=None,
+                      quiet=None):
+        """
+        Generator for continuous streaming. Transfer pages are collected
+        into a ring buffer and yielded as fixed size blocks. Streaming
+        stops when the generator is closed or total_records pages have
+        been collected.
+
+        Arguments
+        ---------
+        int: block_size - Samples per channel in each block
+        int: total_records (opt) - Stop after this many transfer pages,
+                                   None streams until closed
+        int: records_per_transfer (opt) - Set number of records per
+                                          transfer
+        int: samples_per_record (opt) - Set samples per transfer page
+                                        (both channels)
+        bool: quiet (opt) - Override global quiet
+
+        Yields
+        ------
+            np.ndarray: block - (2, block_size) int16 data, ch1 = block[0]
+        """
+        quiet = self.__qtest(quiet)
+        halt, exit_code = self.stream_cfg_data.set_config(None,
+                                                          records_per_transfer,
+                                                          samples_per_record)
+        if halt:
+            raise ValueError("Config types must be int")
+        half = self.stream_cfg_data.nof_samples_per_buffer // 2
+        # Room for one block plus every page the device can hold
+        ring = StreamRingBuffer(block_size + self.stream_cfg_data.nof_buffers * half)
+
+        halt, exit_code = self.__start_stream(quiet)
+        if halt:
+            self.__stop_stream(exit_code, quiet)
+            raise RuntimeError("Could not start streaming, exit code {}".format(exit_code))
+        try:
+            while True:
+                while ring.available < block_size:
+                    pages = (ring.free // half) if total_records is None \
+                        else min(ring.free // half, total_records - self.stream_cfg_data.records_fetched)
+                    if pages == 0 or exit_code == 5:
+                        break
+                    exit_code = self.__fetch_data(ring, None, exit_code, pages, quiet)
+                if ring.available < block_size:
+                    break  # total_records reached or collection failed
+                yield ring.read(block_size)
+        finally:
+            self.__stop_stream(exit_code, quiet)
+
+    def __start_stream(self, quiet=None) -> (bool, int):
+        """
+        Configure the device for streaming and start the stream
+
+        Returns
+        -------
+            bool: halt - True if streaming could not be started
+            int: exit_code - Reason for exit
+        """
+        halt, exit_code = False, 0
         nof_buffers, nof_samples_per_buffer, sample_skip, \
         bytes_per_sample, clock_source, \
         total_nof_buffers = self.stream_cfg_data.get_config()
-        buftype = ct.c_int16 * nof_samples_per_buffer
-        filled_buffers = ct.c_uint()
-        fetched = 0
-        data = [[], []]
-        output_file = None
+        self.stream_cfg_data.records_fetched = 0
+        self.stream_cfg_data.overflows = 0
+        self.buffer_wait.reset_stats()
 
         # Setup device for streaming
         if not self.__api.ADQ_SetClockSource(self.__cu,
@@ -735,13 +1112,6 @@ api.ADQ_GetBoardProductName.restype = ct.c_char_p\n
                 print("Could not disarm trigger. Aborting!")
             halt, exit_code = True, 54
 
-        if write_to_file:
-            if type(write_to_file) == str:
-                output_file = open(write_to_file, "a+")
-            else:
-                output_file = open(
-                    "ADQ-Recording-{:0>2}-{:0>2}-{:0>2}--{:0>2}-{:0>2}-{:0>2}.csv".format(*time.localtime()[0:6]), "a+")
-
         if not self.__api.ADQ_SetStreamStatus(self.__cu,
                                               self.device_number,
                                               0x1):
@@ -750,36 +1120,22 @@ api.ADQ_GetBoardProductName.restype = ct.c_char_p\n
             halt, exit_code = True, 55
 
         # Start streaming
-        self.stream_cfg_data.tstart = time.time()
-        while self.stream_cfg_data.tstart == time.time():
-            pass  # wait for timer to progress, prevents div by 0
+        self.stream_cfg_data.tstart = time.perf_counter()
         if not self.__api.ADQ_StartStreaming(self.__cu,
                                              self.device_number):
             if not quiet:
                 print("Could not start streaming data. Aborting!")
             halt, exit_code = True, 60
-        try:
-            if not quiet and not halt:
-                print("\n**************************")
-                print("* Staring data recording *")
-                print("*          **            *")
-                print("*  Press <Ctl-c> at any  *")
-                print("*     time to abort      *")
-                print("**************************\n")
-            while self.stream_cfg_data.records_fetched < total_nof_buffers \
-                    and not halt:
-                buf, exit_code = self.__fetch_data(buftype,
-                                                   output_file,
-                                                   exit_code,
-                                                   quiet)
-                data[0] += buf[0]
-                data[1] += buf[1]
-            print("")  # newline after record screen data
-        except KeyboardInterrupt:
-            if not quiet:
-                print("Operation cancelled by user")
-            exit_code = -1
+        return halt, exit_code
+
+    def __stop_stream(self, exit_code, quiet=None) -> int:
+        """
+        Stop streaming and disable the data stream
 
+        Returns
+        -------
+            int: exit_code - Reason for exit
+        """
         if not self.__api.ADQ_StopStreaming(self.__cu,
                                             self.device_number):
             if not quiet:
@@ -792,76 +1148,70 @@ api.ADQ_GetBoardProductName.restype = ct.c_char_p\n
             if not quiet:
                 print("Could not disable data stream!")
             exit_code = 62
-        return data, exit_code
+        if not quiet:
+            print(self.buffer_wait.summary())
+        return exit_code
 
-    def __fetch_data(self, buftype, output_file, exit_code, quiet=None):
+    def __fetch_data(self, ring, output_file, exit_code, max_pages=None, quiet=None):
         """
-        Main loop for fetching a single record set, only to be called with
-        correct setup (see get_data_setup)
+        Main loop for fetching the filled transfer pages, only to be called
+        with correct setup (see get_data_setup)
 
         Arguments
         ---------
-            ctypes array: buftype - Buffer type
-            open file/nonetype: output_file - Writeable file (if using)
+            StreamRingBuffer: ring - Buffer the pages are copied into
+            StreamRecorder/open file/nonetype: output_file - Recorder or
+                                                             csv file
             int: exit_code - exit code pass through for persistence
+            int: max_pages (opt) - Maximum pages to collect
 
         Returns
         -------
-            array: data - Data of the form [ch1, ch2]
             int: exit_code - Reason for exit
         """
-        ch1 = []
-        ch2 = []
         quiet = self.__qtest(quiet)
+        nof_samples = self.stream_cfg_data.nof_samples_per_buffer
         filled_buffers = ct.c_uint()
-        self.__api.ADQ_GetTransferBufferStatus(self.__cu,
-                                               self.device_number,
-                                               ct.byref(filled_buffers))
-        while filled_buffers.value == 0:
-            if not quiet:
-                print("\rWaiting for buffers...", end="")
+
+        def poll():
             self.__api.ADQ_GetTransferBufferStatus(self.__cu,
                                                    self.device_number,
                                                    ct.byref(filled_buffers))
+            return filled_buffers.value
+
+        filled_buffers.value = self.buffer_wait.wait(poll)
         if not quiet:
             recs = self.stream_cfg_data.records_fetched
-            # try:
             rate = (recs \
-                    * self.stream_cfg_data.nof_samples_per_buffer \
-                    * 16) / (time.time() - self.stream_cfg_data.tstart) / 1000000
-            # except ZeroDivisionError:
-            #    rate = 0.0
+                    * nof_samples \
+                    * 16) / max(time.perf_counter() - self.stream_cfg_data.tstart, 1e-9) / 1000000
             print("\r{: >6} records collected ({:.2f} Mbit/s) -- ".format(recs, rate), end="")
             print("Filled buffers on device: {}/{: <5}".format(filled_buffers.value,
                                                                self.stream_cfg_data.nof_buffers), end="")
 
-        while filled_buffers.value > 0:
+        pages = filled_buffers.value if max_pages is None else min(filled_buffers.value, max_pages)
+        for _ in range(pages):
             if not self.__api.ADQ_CollectDataNextPage(self.__cu,
                                                       self.device_number):
                 if not quiet:
                     print("Failed to fetch record! Data will be incomplete")
-                exit_code = 5
-            filled_buffers.value -= 1
+                return 5
             self.stream_cfg_data.records_fetched += 1
-            if exit_code != 5:
-                data_ptr = self.__api.ADQ_GetPtrStream(self.__cu,
-                                                       self.device_number)
-                data = ct.cast(data_ptr, ct.POINTER(buftype))[0][:]
-                lenhalf = int(len(data) / 2)
-                ch1 += data[:lenhalf]
-                ch2 += data[lenhalf:]
-                if output_file:
-                    for i in range(lenhalf):
-                        output_file.write("{}, {}\n".format(data[i],
-                                                            data[lenhalf + i]))
-        return [ch1, ch2], exit_code
-
-
-
+            data_ptr = self.__api.ADQ_GetPtrStream(self.__cu,
+                                                   self.device_number)
+            # Zero copy view of the device page, copied into the ring
+            page = np.ctypeslib.as_array(data_ptr, shape=(nof_samples,))
+            ring.write_page(page)
+            if isinstance(output_file, StreamRecorder):
+                output_file.write_page(page)
+            elif output_file:
+                np.savetxt(output_file, page.reshape(2, -1).T, fmt="%d, %d")
+        return exit_code
 
     ### FOR TESTING ONLY ###
 
-x = sdr14()
+if __name__ == "__main__":
+    x = sdr14()
 
 def expand():
     """
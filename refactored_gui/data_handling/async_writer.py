@@ -0,0 +1,161 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+
+class AsyncWriter:
+    """
+    Performs file I/O for the acquisition and GUI threads on a single background thread.
+
+    Writes are executed in the order they were submitted. Consecutive line appends to the same file are batched into
+    one open/write. The queue is bounded: when the disk falls behind, submitting blocks (back-pressure) instead of
+    letting memory grow, and the stall is counted. sync() fsyncs every file written since the previous sync, and is
+    called on command boundaries.
+
+    Data passed to submit() must not be modified afterwards, so callers pass copies of reused buffers. Once closed,
+    writes are performed synchronously on the calling thread.
+    """
+
+    def __init__(self, max_pending: int = 64, batch_size: int = 256, logger: logging.Logger | None = None) -> None:
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.batch_size = batch_size
+        self.dirty_paths = set()
+        # Statistics
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.errors = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+        self.thread = threading.Thread(target=self.run, name="async-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args, path: str | None = None) -> None:
+        """
+        Queues func(*args) to run on the writer thread.
+        :param func: Function performing the write.
+        :param args: Arguments for func.
+        :param path: File written by func, to be fsynced on the next sync().
+        :return:
+        """
+        if not self.put(("call", func, args, path)):
+            func(*args)
+
+    def append_line(self, path: str, line: str) -> None:
+        """
+        Queues a line to be appended to a text file.
+        :param path: File to append to.
+        :param line: Line to append, without newline.
+        :return:
+        """
+        if not self.put(("line", path, line)):
+            self.write_lines({path: [line]})
+
+    def sync(self, wait: bool = False, timeout: float | None = None) -> bool:
+        """
+        Queues an fsync of all files written since the last sync.
+        :param wait: Block until the sync (and so every write submitted before it) is complete.
+        :param timeout: Maximum time to wait in seconds.
+        :return: True if not waiting or the sync completed in time.
+        """
+        done = threading.Event()
+        if not self.put(("sync", done)):
+            return True
+
+        return done.wait(timeout) if wait else True
+
+    def close(self) -> None:
+        """
+        Completes all pending writes and stops the writer thread.
+        :return:
+        """
+        self.sync()
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(None)
+        self.thread.join()
+        self.logger.info(f"Writer closed: {self.stalls} stalls ({self.stall_time:.2f} s), {self.errors} errors")
+
+    def put(self, item) -> bool:
+        """
+        Queues an item for the writer thread.
+        :return: False if the writer is closed and the caller must perform the write itself.
+        """
+        with self.lock:
+            if self.closed:
+                return False
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                # Disk has fallen behind, block the caller until there is room
+                start = time.perf_counter()
+                self.queue.put(item)
+                self.stalls += 1
+                self.stall_time += time.perf_counter() - start
+
+            return True
+
+    def run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = {}
+            for item in batch:
+                if item is None:
+                    self.write_lines(lines)
+                    return
+
+                if item[0] == "line":
+                    _, path, line = item
+                    lines.setdefault(path, []).append(line)
+                    continue
+
+                # Keep ordering between line appends and other writes
+                self.write_lines(lines)
+                if item[0] == "call":
+                    _, func, args, path = item
+                    try:
+                        func(*args)
+                    except Exception as ex:
+                        self.errors += 1
+                        self.logger.error(f"Background write failed: {ex}")
+                    if path is not None:
+                        self.dirty_paths.add(path)
+                elif item[0] == "sync":
+                    self.fsync_dirty_paths()
+                    item[1].set()
+
+            self.write_lines(lines)
+
+    def write_lines(self, lines: dict[str, list[str]]) -> None:
+        """
+        Appends batched lines, one open/write per file.
+        """
+        for path, path_lines in lines.items():
+            try:
+                with open(path, "a") as f:
+                    f.write("".join(f"{line}\n" for line in path_lines))
+            except OSError as ex:
+                self.errors += 1
+                self.logger.error(f"Background write to {path} failed: {ex}")
+            self.dirty_paths.add(path)
+        lines.clear()
+
+    def fsync_dirty_paths(self) -> None:
+        for path in self.dirty_paths:
+            try:
+                with open(path, "ab") as f:
+                    os.fsync(f.fileno())
+            except OSError as ex:
+                self.logger.warning(f"Could not fsync {path}: {ex}")
+        self.dirty_paths.clear()
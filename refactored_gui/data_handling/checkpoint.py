@@ -0,0 +1,74 @@
+import os
+import time
+
+import numpy as np
+
+
+class CheckpointPolicy:
+    """
+    Decides when the running average of an NMR command is written to disk: every N repeats, every T seconds, or
+    both (whichever comes first). The end of a command always writes a final checkpoint. A crash therefore loses at
+    most one interval of averaging.
+    """
+
+    def __init__(self, every_repeats: int = 100, every_seconds: float = 30.0) -> None:
+        """
+        :param every_repeats: Repeats between checkpoints, 0 to disable.
+        :param every_seconds: Seconds between checkpoints, 0 to disable.
+        """
+        self.every_repeats = every_repeats
+        self.every_seconds = every_seconds
+        self.last_repeat = 0
+        self.last_time = time.monotonic()
+
+    def reset(self) -> None:
+        """
+        Starts a new command.
+        :return:
+        """
+        self.last_repeat = 0
+        self.last_time = time.monotonic()
+
+    def due(self, repeat: int) -> bool:
+        """
+        Returns True if a checkpoint should be written after this repeat, and if so starts the next interval.
+        :param repeat: Number of repeats accumulated.
+        :return: bool
+        """
+        now = time.monotonic()
+        by_repeats = self.every_repeats > 0 and repeat - self.last_repeat >= self.every_repeats
+        by_time = self.every_seconds > 0 and now - self.last_time >= self.every_seconds
+
+        if by_repeats or by_time:
+            self.last_repeat = repeat
+            self.last_time = now
+            return True
+
+        return False
+
+
+def write_checkpoint(path: str, accumulator: np.ndarray, repeats: int) -> None:
+    """
+    Atomically writes a binary snapshot of an accumulator. The snapshot is written to a temporary file, synced and then
+    renamed over the previous one, so the file on disk is always a complete checkpoint.
+    :param path: Checkpoint file (.npz).
+    :param accumulator: Array of shape (channels, samples) holding the sum of all repeats.
+    :param repeats: Number of repeats in the sum.
+    :return:
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        np.savez(f, accumulator=accumulator, repeats=repeats)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def read_checkpoint(path: str) -> tuple[np.ndarray, int]:
+    """
+    Reads a checkpoint written by write_checkpoint().
+    :param path: Checkpoint file.
+    :return: (accumulator, repeats). The average is accumulator / repeats.
+    """
+    with np.load(path) as f:
+        return f["accumulator"], int(f["repeats"])
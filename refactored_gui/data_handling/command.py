@@ -1,4 +1,5 @@
 from data_handling.sequence import Sequence
+from data_handling.phase_cycle import PHASE_CYCLES
 from dataclasses import dataclass, field
 import numpy as np
 
@@ -9,6 +10,14 @@ class NMRCommand:
     sequence_filepath: str
     repeats: int
     command_type: str = "NMR"
+    # Minimum time in seconds between the start of consecutive scans
+    repetition_time: float = 0.0
+    # Records acquired and averaged per trigger-armed scan
+    records_per_scan: int = 1
+    # Decimation factor of the digital down-converter, 1 keeps the raw real records
+    decimation: int = 1
+    # Phase cycle stepped through on successive scans (a key of PHASE_CYCLES), empty for none
+    phase_cycle: str = ""
 
     def __post_init__(self):
         """
@@ -20,7 +29,8 @@ class NMRCommand:
         self.sequence = Sequence(*np.loadtxt(self.sequence_filepath, dtype=int))
 
         # Check validity
-        if self.repeats <= 0:
+        if (self.repeats <= 0 or self.records_per_scan <= 0 or self.decimation <= 0
+                or (self.phase_cycle and self.phase_cycle not in PHASE_CYCLES)):
             self.valid_command = 0
         else:
             self.valid_command = 1
@@ -0,0 +1,99 @@
+import numpy as np
+
+
+def windowed_sinc_lowpass(num_taps: int, cutoff: float, beta: float = 8.0) -> np.ndarray:
+    """
+    Designs a linear phase low-pass FIR filter by the Kaiser windowed sinc method.
+    :param num_taps: Filter length.
+    :param cutoff: Cutoff frequency as a fraction of the sample rate (0 - 0.5).
+    :param beta: Kaiser window shape, higher values trade transition width for stopband attenuation.
+    :return: float64 array of taps with unity DC gain.
+    """
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(num_taps, beta)
+
+    return taps / taps.sum()
+
+
+class DigitalDownConverter:
+    """
+    Quadrature digital down-converter for real SDR14 records.
+
+    Each record is mixed to baseband by a numerically controlled oscillator at the sequence frequency, low-pass
+    filtered and decimated by a polyphase FIR filter, giving complex I/Q samples at sample_rate / decimation. Only the
+    retained output samples are computed: the record is split into blocks of 'decimation' samples and each of the
+    taps_per_phase polyphase rows is applied to all blocks at once.
+
+    The NCO restarts at phase zero for every record, so down-converted repeats of a triggered sequence add coherently.
+    """
+
+    def __init__(self, frequency: float, decimation: int, sample_rate: float = 800e6, taps_per_phase: int = 16,
+                 passband: float = 0.8) -> None:
+        """
+        :param frequency: Mixing frequency in Hz (the sequence frequency).
+        :param decimation: Decimation factor.
+        :param sample_rate: Input sample rate in Hz.
+        :param taps_per_phase: FIR taps per polyphase branch, the filter has decimation * taps_per_phase taps.
+        :param passband: Fraction of the output Nyquist band kept by the filter.
+        """
+        if decimation < 1:
+            raise ValueError(f"Decimation must be at least 1, got {decimation}")
+
+        self.frequency = frequency
+        self.decimation = decimation
+        self.sample_rate = sample_rate
+        self.passband = passband
+        self.taps = windowed_sinc_lowpass(decimation * taps_per_phase, passband / (2 * decimation))
+        # Row q holds taps q*D ... q*D + D - 1 of the time reversed filter, i.e. one tap of every polyphase branch
+        self.phases = self.taps[::-1].reshape(taps_per_phase, decimation).astype(np.float32)
+        self.nco_cache = {}
+        self.work_buffers = {}
+
+    @property
+    def output_rate(self) -> float:
+        return self.sample_rate / self.decimation
+
+    @property
+    def bandwidth(self) -> float:
+        """
+        Width in Hz of the band passed to the output, centred on the mixing frequency.
+        """
+        return self.passband * self.output_rate
+
+    def nco(self, samples: int) -> np.ndarray:
+        """
+        Returns the local oscillator exp(-j 2 pi f n / fs) for a record length, computed once per length.
+        """
+        if samples not in self.nco_cache:
+            n = np.arange(samples)
+            self.nco_cache[samples] = np.exp(-2j * np.pi * (self.frequency / self.sample_rate) * n).astype(np.complex64)
+
+        return self.nco_cache[samples]
+
+    def output_samples(self, samples: int) -> int:
+        return samples // self.decimation
+
+    def process(self, record: np.ndarray) -> np.ndarray:
+        """
+        Down-converts records.
+        :param record: Array of shape (..., samples), e.g. one record or (channels, samples).
+        :return: complex64 array of shape (..., samples // decimation). A new array, so the input buffer may be reused.
+        """
+        D = self.decimation
+        Q = self.phases.shape[0]
+        samples = record.shape[-1]
+        blocks_out = samples // D
+
+        # Mixed record, preceded by Q - 1 blocks of zeros (the filter history)
+        key = (record.shape[:-1], samples)
+        if key not in self.work_buffers:
+            self.work_buffers[key] = np.zeros((*record.shape[:-1], (blocks_out + Q - 1) * D), dtype=np.complex64)
+        work = self.work_buffers[key]
+        np.multiply(record[..., :blocks_out * D], self.nco(samples)[:blocks_out * D], out=work[..., (Q - 1) * D:])
+
+        blocks = work.reshape(*record.shape[:-1], blocks_out + Q - 1, D)
+        output = blocks[..., 0:blocks_out, :] @ self.phases[0]
+        for q in range(1, Q):
+            output += blocks[..., q:q + blocks_out, :] @ self.phases[q]
+
+        return output
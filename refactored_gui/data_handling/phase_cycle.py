@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class PhaseCycle:
+    """
+    Transmitter and receiver phase offsets (degrees) stepped through on successive scans. The offsets are added to the
+    sequence's TX_phase and RX_phase.
+    """
+
+    name: str
+    TX_phases: tuple[int, ...]
+    RX_phases: tuple[int, ...]
+
+    def __len__(self) -> int:
+        return len(self.TX_phases)
+
+    def TX_phase(self, scan: int) -> int:
+        """
+        :param scan: Scan index, starting at 0.
+        :return: Transmitter phase offset of the scan.
+        """
+        return self.TX_phases[scan % len(self)]
+
+    def RX_phase(self, scan: int) -> int:
+        """
+        :param scan: Scan index, starting at 0.
+        :return: Receiver phase offset of the scan.
+        """
+        return self.RX_phases[scan % len(self)]
+
+
+PHASE_CYCLES = {
+    "2-step": PhaseCycle("2-step", (0, 180), (0, 180)),
+    # Cancels receiver DC offset and quadrature imbalance
+    "CYCLOPS": PhaseCycle("CYCLOPS", (0, 90, 180, 270), (0, 90, 180, 270)),
+}
+
+
+def rotate_receiver(ch1_data: np.ndarray, ch2_data: np.ndarray, phase: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Applies the receiver phase to one scan, so scans of a phase cycle add coherently.
+
+    Complex (down-converted I/Q) records are each multiplied by exp(-j phase). Real records are treated as the I and Q
+    channels of a quadrature receiver, rotated by routing and negating channels, which keeps integer data exact.
+    :param ch1_data: Channel 1 record (I for real records).
+    :param ch2_data: Channel 2 record (Q for real records).
+    :param phase: Receiver phase in degrees, a multiple of 90 for real records.
+    :return: Rotated (ch1_data, ch2_data). The inputs are returned unchanged for a phase of 0.
+    """
+    phase %= 360
+    if phase == 0:
+        return ch1_data, ch2_data
+
+    if np.iscomplexobj(ch1_data):
+        weight = np.exp(-1j * np.deg2rad(phase)).astype(ch1_data.dtype)
+        return ch1_data * weight, ch2_data * weight
+
+    if phase % 90:
+        raise ValueError(f"Receiver phase of real records must be a multiple of 90 degrees, got {phase}")
+
+    # (I + jQ) exp(-j phase)
+    if phase == 90:
+        return ch2_data, np.negative(ch1_data)
+    if phase == 180:
+        return np.negative(ch1_data), np.negative(ch2_data)
+    return np.negative(ch2_data), ch1_data
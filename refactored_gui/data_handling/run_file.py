@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+class RunFile:
+    """
+    Binary (HDF5) container for the data of one NMRCommand. Replaces the per-repeat text files.
+
+    Layout:
+        raw         (repeats, 2, samples) dataset, one chunk per repeat, appended to as repeats arrive. Stored as int16
+                    for raw SDR14 records and complex64 for down-converted I/Q records.
+        average     (2, samples) float64 (complex128 for I/Q) dataset holding the latest running average.
+        conditions  (n, 3) float64 dataset of (unix time, T, H) PPMS readings.
+    The sequence parameters, command and PPMS conditions at the start of the command are stored as file attributes.
+
+    All methods are thread safe, so the NMR worker can append raw data while the experiment manager writes averages.
+    """
+
+    def __init__(self, path: str, attributes: dict | None = None) -> None:
+        if h5py is None:
+            raise ImportError("h5py is required for binary run files, install it or use text output")
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = h5py.File(path, "w")
+        self.file.attrs["created"] = time.time()
+        self.set_attributes(attributes or {})
+
+    @staticmethod
+    def available() -> bool:
+        """
+        Returns True if binary run files can be written (h5py installed).
+        """
+        return h5py is not None
+
+    def set_attributes(self, attributes: dict) -> None:
+        """
+        Stores metadata as file attributes. None values are skipped.
+        :param attributes: dict of attribute name -> value
+        :return:
+        """
+        with self.lock:
+            for key, value in attributes.items():
+                if value is not None:
+                    self.file.attrs[key] = value
+
+    def append_repeat(self, ch1_data: np.ndarray, ch2_data: np.ndarray) -> int:
+        """
+        Appends the records of one repeat to the raw dataset.
+        :param ch1_data: Channel 1 record.
+        :param ch2_data: Channel 2 record.
+        :return: Number of repeats stored.
+        """
+        with self.lock:
+            if "raw" not in self.file:
+                if ch1_data.dtype == np.int16:
+                    dtype = np.int16
+                elif np.iscomplexobj(ch1_data):
+                    dtype = np.complex64
+                else:
+                    dtype = np.float64
+                self.file.create_dataset("raw", shape=(0, 2, ch1_data.size), maxshape=(None, 2, ch1_data.size),
+                                         dtype=dtype, chunks=(1, 2, ch1_data.size))
+            raw = self.file["raw"]
+            n = raw.shape[0]
+            raw.resize(n + 1, axis=0)
+            raw[n, 0] = ch1_data
+            raw[n, 1] = ch2_data
+
+            return n + 1
+
+    def write_average(self, ch1_average: np.ndarray, ch2_average: np.ndarray, repeats: int) -> None:
+        """
+        Overwrites the running average.
+        :param ch1_average: Channel 1 average.
+        :param ch2_average: Channel 2 average.
+        :param repeats: Number of repeats in the average.
+        :return:
+        """
+        with self.lock:
+            if "average" not in self.file:
+                dtype = np.complex128 if np.iscomplexobj(ch1_average) else np.float64
+                self.file.create_dataset("average", shape=(2, ch1_average.size), dtype=dtype,
+                                         chunks=(1, ch1_average.size))
+            average = self.file["average"]
+            average[0] = ch1_average
+            average[1] = ch2_average
+            average.attrs["repeats"] = repeats
+
+    def append_conditions(self, T: float, H: float, timestamp: float | None = None) -> None:
+        """
+        Appends a PPMS reading.
+        :param T: Temperature (K).
+        :param H: Field (Oe).
+        :param timestamp: Unix time of the reading, defaults to now.
+        :return:
+        """
+        with self.lock:
+            if "conditions" not in self.file:
+                self.file.create_dataset("conditions", shape=(0, 3), maxshape=(None, 3), dtype=np.float64,
+                                         chunks=(256, 3))
+            conditions = self.file["conditions"]
+            n = conditions.shape[0]
+            conditions.resize(n + 1, axis=0)
+            conditions[n] = (time.time() if timestamp is None else timestamp, T, H)
+
+    def flush(self) -> None:
+        with self.lock:
+            self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file:
+                self.file.close()
+
+    def __enter__(self) -> "RunFile":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def export_run_to_text(path: str, output_directory: str | None = None) -> None:
+    """
+    Exports a binary run file to the text files written by earlier versions: {name}_{repeat}.txt for each repeat and
+    {name}_avg.txt for the average, each holding the two channels as rows.
+    :param path: Run file to export.
+    :param output_directory: Directory for the text files, defaults to the run file's directory.
+    :return:
+    """
+    if h5py is None:
+        raise ImportError("h5py is required to read binary run files")
+
+    output_directory = output_directory or os.path.dirname(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    with h5py.File(path, "r") as f:
+        if "raw" in f:
+            for i, (ch1_data, ch2_data) in enumerate(f["raw"]):
+                np.savetxt(f"{output_directory}/{name}_{i + 1}.txt", (ch1_data, ch2_data))
+        if "average" in f:
+            np.savetxt(f"{output_directory}/{name}_avg.txt", f["average"][()])
@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class RunningAverage:
+    """
+    Running average of multichannel records, accumulated in place.
+
+    Integer records (raw int16 SDR14 data) are summed exactly in an int64 buffer, floating point and complex records
+    in float64/complex128. The mean is only computed when asked for, into a preallocated buffer that is reused, so
+    adding a repeat allocates nothing.
+    """
+
+    def __init__(self) -> None:
+        self.sums = None
+        self.mean = None
+        self.repeats = 0
+        self.mean_repeats = 0
+
+    @staticmethod
+    def accumulator_dtype(dtype: np.dtype) -> np.dtype:
+        """
+        Returns the accumulator dtype for records of the given dtype.
+        :param dtype: Record dtype.
+        :return: np.dtype
+        """
+        if np.issubdtype(dtype, np.integer) or np.issubdtype(dtype, np.bool_):
+            return np.dtype(np.int64)
+        if np.issubdtype(dtype, np.complexfloating):
+            return np.dtype(np.complex128)
+        return np.dtype(np.float64)
+
+    def add(self, *channels: np.ndarray) -> int:
+        """
+        Adds one repeat.
+        :param channels: One record per channel, all of the same length.
+        :return: Number of repeats accumulated.
+        """
+        if self.repeats == 0:
+            self.allocate(len(channels), channels[0].size, self.accumulator_dtype(np.result_type(*channels)))
+
+        for channel_sum, data in zip(self.sums, channels):
+            np.add(channel_sum, data, out=channel_sum)
+        self.repeats += 1
+
+        return self.repeats
+
+    def allocate(self, num_channels: int, samples: int, dtype: np.dtype) -> None:
+        """
+        Prepares zeroed buffers for a new average, reusing the previous ones if the shape and dtype are unchanged.
+        :return:
+        """
+        shape = (num_channels, samples)
+        if self.sums is not None and self.sums.shape == shape and self.sums.dtype == dtype:
+            self.sums.fill(0)
+            return
+
+        self.sums = np.zeros(shape, dtype=dtype)
+        self.mean = np.zeros(shape, dtype=np.complex128 if dtype == np.complex128 else np.float64)
+
+    def average(self) -> np.ndarray | None:
+        """
+        Returns the mean of all repeats, computed only if repeats were added since the last call.
+        :return: Array of shape (channels, samples), reused between calls. None if nothing was added.
+        """
+        if self.repeats == 0:
+            return None
+
+        if self.mean_repeats != self.repeats:
+            np.divide(self.sums, self.repeats, out=self.mean)
+            self.mean_repeats = self.repeats
+
+        return self.mean
+
+    def reset(self) -> None:
+        """
+        Discards all repeats. The buffers are kept for the next average.
+        :return:
+        """
+        self.repeats = 0
+        self.mean_repeats = 0
+
+    def __bool__(self) -> bool:
+        return self.repeats > 0
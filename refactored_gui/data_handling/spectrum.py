@@ -0,0 +1,79 @@
+import numpy as np
+import scipy.fft
+
+
+class SpectrumAnalyser:
+    """
+    Magnitude spectra of SDR14 records for display.
+
+    Real records use a real FFT, which computes only the non-negative frequencies (half the work of a complex FFT).
+    Complex (down-converted I/Q) records use a complex FFT and are returned with zero frequency in the centre. The
+    window, frequency axis and windowed work buffer are computed once per record length and sample rate, and the
+    magnitude is written into a caller supplied buffer, so a steady stream of records only allocates the FFT output.
+    """
+
+    def __init__(self, workers: int = -1) -> None:
+        """
+        :param workers: Threads used by scipy.fft, negative values count back from the number of CPUs.
+        """
+        self.workers = workers
+        self.plans = {}
+
+    def plan(self, samples: int, sample_rate: float, is_complex: bool) -> dict:
+        """
+        Returns the cached window, frequency axis, amplitude scale and work buffer for a record length.
+        :param samples: Record length.
+        :param sample_rate: Sample rate in Hz.
+        :param is_complex: Complex records.
+        :return: dict
+        """
+        key = (samples, sample_rate, is_complex)
+        if key not in self.plans:
+            window = np.hanning(samples).astype(np.float32)
+            if is_complex:
+                frequencies = np.fft.fftshift(np.fft.fftfreq(samples, d=1 / sample_rate))
+                # Amplitude of a complex exponential
+                scale = 1 / window.sum()
+                work = np.empty(samples, dtype=np.complex64)
+            else:
+                frequencies = np.fft.rfftfreq(samples, d=1 / sample_rate)
+                # Amplitude of a sinusoid, whose power is split between positive and negative frequencies
+                scale = 2 / window.sum()
+                work = np.empty(samples, dtype=np.float32)
+
+            self.plans[key] = {'window': window, 'frequencies': frequencies, 'scale': scale, 'work': work}
+
+        return self.plans[key]
+
+    def output_samples(self, samples: int, is_complex: bool) -> int:
+        return samples if is_complex else samples // 2 + 1
+
+    def magnitude(self, record: np.ndarray, sample_rate: float, out: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Computes the windowed amplitude spectrum of one record.
+        :param record: 1D record, real or complex.
+        :param sample_rate: Sample rate of the record in Hz.
+        :param out: float32 array of output_samples() to write the magnitude into, allocated if None.
+        :return: (frequencies, magnitude). The frequency axis is cached and must not be modified.
+        """
+        is_complex = np.iscomplexobj(record)
+        samples = record.size
+        plan = self.plan(samples, sample_rate, is_complex)
+        if out is None:
+            out = np.empty(self.output_samples(samples, is_complex), dtype=np.float32)
+
+        work = plan['work']
+        np.multiply(record, plan['window'], out=work, casting='unsafe')
+
+        if is_complex:
+            spectrum = scipy.fft.fft(work, overwrite_x=True, workers=self.workers)
+            # fftshift into the output buffer
+            split = samples - samples // 2
+            np.abs(spectrum[split:], out=out[:samples // 2])
+            np.abs(spectrum[:split], out=out[samples // 2:])
+        else:
+            spectrum = scipy.fft.rfft(work, overwrite_x=True, workers=self.workers)
+            np.abs(spectrum, out=out)
+        np.multiply(out, plan['scale'], out=out)
+
+        return plan['frequencies'], out
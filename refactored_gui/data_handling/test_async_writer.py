@@ -0,0 +1,59 @@
+import threading
+
+import numpy as np
+
+from refactored_gui.data_handling.async_writer import AsyncWriter
+
+
+def test_writes_complete_in_order(tmp_path):
+    writer = AsyncWriter(max_pending=4)
+    path = str(tmp_path / "conditions.txt")
+    for i in range(100):
+        writer.append_line(path, str(i))
+    writer.submit(np.savetxt, str(tmp_path / "data.txt"), np.arange(4), path=str(tmp_path / "data.txt"))
+    assert writer.sync(wait=True, timeout=5)
+
+    with open(path) as f:
+        assert f.read().split() == [str(i) for i in range(100)]
+    assert np.loadtxt(tmp_path / "data.txt").tolist() == [0, 1, 2, 3]
+    writer.close()
+
+
+def test_failed_write_does_not_stop_writer(tmp_path):
+    writer = AsyncWriter()
+
+    def fail():
+        raise OSError("disk full")
+
+    writer.submit(fail)
+    writer.append_line(str(tmp_path / "log.txt"), "ok")
+    writer.close()
+
+    assert writer.errors == 1
+    assert (tmp_path / "log.txt").read_text() == "ok\n"
+
+
+def test_backpressure_blocks_submitter(tmp_path):
+    writer = AsyncWriter(max_pending=1)
+    release = threading.Event()
+    writer.submit(release.wait)
+    writer.submit(lambda: None)
+
+    blocked = threading.Thread(target=writer.submit, args=(lambda: None,))
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+
+    release.set()
+    blocked.join(5)
+    writer.close()
+    assert writer.stalls >= 1
+
+
+def test_writes_after_close_are_synchronous(tmp_path):
+    writer = AsyncWriter()
+    writer.close()
+
+    writer.append_line(str(tmp_path / "late.txt"), "late")
+    assert writer.sync(wait=True)
+    assert (tmp_path / "late.txt").read_text() == "late\n"
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+
+from refactored_gui.data_handling.checkpoint import CheckpointPolicy, read_checkpoint, write_checkpoint
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / "seq_avg.npz")
+    write_checkpoint(path, np.ones((2, 8)), 4)
+    write_checkpoint(path, np.full((2, 8), 2.0), 8)
+
+    accumulator, repeats = read_checkpoint(path)
+    assert repeats == 8
+    assert np.array_equal(accumulator, np.full((2, 8), 2.0))
+    assert os.listdir(tmp_path) == ["seq_avg.npz"]
+
+
+def test_policy_every_repeats():
+    policy = CheckpointPolicy(every_repeats=10, every_seconds=0)
+    due = [rep for rep in range(1, 36) if policy.due(rep)]
+    assert due == [10, 20, 30]
+
+
+def test_policy_every_seconds(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("refactored_gui.data_handling.checkpoint.time.monotonic", lambda: now[0])
+    policy = CheckpointPolicy(every_repeats=0, every_seconds=5.0)
+
+    now[0] = 4.0
+    assert not policy.due(1)
+    now[0] = 5.0
+    assert policy.due(2)
+    now[0] = 9.0
+    assert not policy.due(3)
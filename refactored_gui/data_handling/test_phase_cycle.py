@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from refactored_gui.data_handling.phase_cycle import PHASE_CYCLES, rotate_receiver
+from refactored_gui.data_handling.running_average import RunningAverage
+
+
+def test_real_rotation_is_exact_quadrature_routing():
+    I = np.array([1, -2, 3], dtype=np.int16)
+    Q = np.array([4, 5, -6], dtype=np.int16)
+
+    for phase in (0, 90, 180, 270):
+        ch1, ch2 = rotate_receiver(I, Q, phase)
+        assert ch1.dtype == np.int16
+        assert np.array_equal(ch1 + 1j * ch2, (I + 1j * Q) * np.exp(-1j * np.deg2rad(phase)).round())
+
+    with pytest.raises(ValueError):
+        rotate_receiver(I, Q, 45)
+
+
+def test_complex_rotation():
+    iq = np.exp(1j * np.linspace(0, 1, 8)).astype(np.complex64)
+    ch1, ch2 = rotate_receiver(iq, iq, 30)
+    assert ch1.dtype == np.complex64
+    assert np.allclose(ch1, iq * np.exp(-1j * np.pi / 6), atol=1e-6)
+
+
+def test_cyclops_keeps_signal_and_cancels_receiver_offset():
+    cycle = PHASE_CYCLES["CYCLOPS"]
+    signal = 1000 * np.exp(1j * np.linspace(0, 4 * np.pi, 64))
+    offset = 50 + 20j
+    average = RunningAverage()
+
+    for scan in range(2 * len(cycle)):
+        # Stepping the transmitter phase rotates the signal but not the receiver's DC offset
+        received = signal * np.exp(1j * np.deg2rad(cycle.TX_phase(scan))) + offset
+        I, Q = np.round(received.real).astype(np.int16), np.round(received.imag).astype(np.int16)
+        average.add(*rotate_receiver(I, Q, cycle.RX_phase(scan)))
+
+    ch1, ch2 = average.average()
+    assert np.allclose(ch1 + 1j * ch2, signal, atol=1)
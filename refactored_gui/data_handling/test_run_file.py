@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from refactored_gui.data_handling.run_file import RunFile, export_run_to_text
+
+h5py = pytest.importorskip("h5py")
+
+
+def test_append_and_export(tmp_path) -> None:
+    path = tmp_path / "seq.h5"
+    ch1 = np.arange(8, dtype=np.int16)
+    ch2 = -ch1
+
+    with RunFile(str(path), {"sequence_p1": 1000, "start_T": None}) as run_file:
+        for _ in range(3):
+            run_file.append_repeat(ch1, ch2)
+        run_file.write_average(ch1 / 2, ch2 / 2, 3)
+        run_file.append_conditions(300.0, 10.0, timestamp=1.0)
+
+    with h5py.File(path, "r") as f:
+        assert f["raw"].shape == (3, 2, 8)
+        assert f["raw"].dtype == np.int16
+        assert f["average"].attrs["repeats"] == 3
+        assert f.attrs["sequence_p1"] == 1000
+        assert "start_T" not in f.attrs
+        assert np.array_equal(f["conditions"][0], (1.0, 300.0, 10.0))
+
+    export_run_to_text(str(path))
+    assert np.array_equal(np.loadtxt(tmp_path / "seq_2.txt"), (ch1, ch2))
+    assert np.array_equal(np.loadtxt(tmp_path / "seq_avg.txt"), (ch1 / 2, ch2 / 2))
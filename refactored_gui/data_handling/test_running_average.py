@@ -0,0 +1,48 @@
+import numpy as np
+
+from refactored_gui.data_handling.running_average import RunningAverage
+
+
+def test_int16_accumulates_exactly():
+    average = RunningAverage()
+    record = np.full(16, 2**15 - 1, dtype=np.int16)
+    for _ in range(1000):
+        average.add(record, -record)
+
+    assert average.sums.dtype == np.int64
+    assert average.sums[0, 0] == 1000 * (2**15 - 1)
+    assert np.array_equal(average.average(), [record, -record])
+
+
+def test_mean_is_lazy_and_reused():
+    average = RunningAverage()
+    assert average.average() is None
+
+    average.add(np.array([1, 2], dtype=np.int16), np.array([3, 4], dtype=np.int16))
+    mean = average.average()
+    assert average.average() is mean
+
+    average.add(np.array([3, 4], dtype=np.int16), np.array([5, 6], dtype=np.int16))
+    assert average.average() is mean
+    assert np.array_equal(mean, [[2, 3], [4, 5]])
+
+
+def test_reset_reuses_buffers():
+    average = RunningAverage()
+    average.add(np.ones(4, dtype=np.int16))
+    sums = average.sums
+
+    average.reset()
+    assert not average
+    average.add(np.full(4, 3, dtype=np.int16))
+    assert average.sums is sums
+    assert np.array_equal(average.average(), [[3, 3, 3, 3]])
+
+
+def test_complex_records():
+    average = RunningAverage()
+    average.add(np.array([1 + 1j, 2j]))
+    average.add(np.array([3 + 1j, 0j]))
+
+    assert average.sums.dtype == np.complex128
+    assert np.allclose(average.average(), [[2 + 1j, 1j]])
@@ -0,0 +1,45 @@
+import numpy as np
+
+from refactored_gui.data_handling.spectrum import SpectrumAnalyser
+
+FS = 800e6
+
+
+def test_real_tone_amplitude_and_frequency():
+    analyser = SpectrumAnalyser()
+    n = np.arange(65536)
+    # Frequency on a bin centre
+    f0 = 1000 * FS / n.size
+    record = (8000 * np.cos(2 * np.pi * f0 / FS * n)).astype(np.int16)
+
+    frequencies, magnitude = analyser.magnitude(record, FS)
+
+    assert magnitude.dtype == np.float32 and magnitude.size == n.size // 2 + 1
+    assert frequencies[np.argmax(magnitude)] == f0
+    assert np.isclose(magnitude.max(), 8000, rtol=1e-3)
+
+
+def test_complex_spectrum_is_centred():
+    analyser = SpectrumAnalyser()
+    n = np.arange(1024)
+    record = (np.exp(-2j * np.pi * 100 / n.size * n) + 0.5 * np.exp(2j * np.pi * 7 / n.size * n)).astype(np.complex64)
+
+    frequencies, magnitude = analyser.magnitude(record, 12.5e6)
+
+    expected = np.fft.fftshift(np.abs(np.fft.fft(record * np.hanning(n.size)))) / np.hanning(n.size).sum()
+    assert np.allclose(magnitude, expected, atol=1e-5)
+    assert np.all(np.diff(frequencies) > 0)
+    assert np.isclose(frequencies[np.argmax(magnitude)], -100 * 12.5e6 / n.size)
+
+
+def test_buffers_are_reused():
+    analyser = SpectrumAnalyser()
+    record = np.random.default_rng(0).normal(size=4096)
+    out = np.empty(analyser.output_samples(record.size, False), dtype=np.float32)
+
+    frequencies, magnitude = analyser.magnitude(record, FS, out=out)
+    frequencies_2, _ = analyser.magnitude(record, FS, out=out)
+
+    assert magnitude is out
+    assert frequencies_2 is frequencies
+    assert len(analyser.plans) == 1
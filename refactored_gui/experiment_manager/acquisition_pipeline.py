@@ -0,0 +1,132 @@
+import time
+import queue
+import logging
+import threading
+
+
+class StageMeter:
+    """
+    Records how many items a pipeline stage handled and how long it spent on them.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.count = 0
+        self.busy_time = 0.0
+        self.start_time = time.perf_counter()
+
+    def record(self, duration: float) -> None:
+        self.count += 1
+        self.busy_time += duration
+
+    def summary(self) -> str:
+        """
+        Returns a one line throughput summary for logging.
+        :return: str
+        """
+        elapsed = time.perf_counter() - self.start_time
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        capacity = self.count / self.busy_time if self.busy_time > 0 else 0.0
+
+        return (f"Stage '{self.name}': {self.count} items, {rate:.2f} items/s "
+                f"(busy {self.busy_time:.2f} s, max {capacity:.2f} items/s)")
+
+
+class PipelineStage(threading.Thread):
+    """
+    Thread applying one function to every item taken from its input queue and passing the item on. A function that
+    returns a tuple replaces the item with it (e.g. a down-conversion stage), otherwise the item is passed on unchanged.
+    """
+
+    sentinel = object()
+
+    def __init__(self, name: str, func, input_queue: queue.Queue, output_queue: queue.Queue | None,
+                 logger: logging.Logger) -> None:
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self.func = func
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.logger = logger
+        self.meter = StageMeter(name)
+        self.errors = 0
+
+    def run(self) -> None:
+        # Pipelines may be built well before they start, e.g. while preparing a command
+        self.meter.start_time = time.perf_counter()
+        while True:
+            item = self.input_queue.get()
+
+            if item is not self.sentinel:
+                start = time.perf_counter()
+                try:
+                    result = self.func(*item)
+                    if isinstance(result, tuple):
+                        item = result
+                except Exception as ex:
+                    self.errors += 1
+                    self.logger.error(f"Pipeline stage '{self.meter.name}' failed: {ex}")
+                self.meter.record(time.perf_counter() - start)
+
+            if self.output_queue is not None:
+                self.output_queue.put(item)
+            if item is self.sentinel:
+                return
+
+
+class AcquisitionPipeline:
+    """
+    Chain of stages, each on its own thread, connected by bounded queues. Items submitted by the producer (the
+    acquisition loop) pass through every stage in order. submit() blocks when the first queue is full, so a slow stage
+    throttles acquisition rather than letting memory grow.
+    """
+
+    def __init__(self, stages: list[tuple[str, callable]], queue_size: int = 2,
+                 logger: logging.Logger | None = None) -> None:
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.queue_size = queue_size
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.stages = [PipelineStage(name, func, self.queues[i], self.queues[i + 1] if i + 1 < len(stages) else None,
+                                     self.logger)
+                       for i, (name, func) in enumerate(stages)]
+        self.running = False
+
+    @property
+    def capacity(self) -> int:
+        """
+        Maximum number of items in flight inside the pipeline (queued or being processed).
+        """
+        return len(self.stages) * (self.queue_size + 1)
+
+    def __enter__(self) -> "AcquisitionPipeline":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def start(self) -> None:
+        for stage in self.stages:
+            stage.start()
+        self.running = True
+
+    def submit(self, *item) -> None:
+        """
+        Passes an item to the first stage, blocking while the pipeline is full.
+        :param item: Arguments for the stage functions.
+        :return:
+        """
+        self.queues[0].put(item)
+
+    def close(self) -> None:
+        """
+        Waits for all submitted items to pass through every stage, stops the stage threads and logs their throughput.
+        :return:
+        """
+        if not self.running:
+            return
+
+        self.queues[0].put(PipelineStage.sentinel)
+        for stage in self.stages:
+            stage.join()
+            self.logger.info(stage.meter.summary())
+        self.running = False
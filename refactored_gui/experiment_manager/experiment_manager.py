@@ -1,10 +1,17 @@
 import numpy as np
 import os
+import time
 import logging
 from datetime import datetime
 from ..data_handling.command import NMRCommand, PPMSCommand
+from ..data_handling.run_file import RunFile, export_run_to_text
+from ..data_handling.async_writer import AsyncWriter
+from ..data_handling.checkpoint import CheckpointPolicy, write_checkpoint
+from ..data_handling.running_average import RunningAverage
 from ..experiment_manager.multithreading_instrument_classes import SpectrometerControllerDummy, PPMSControllerDummy
 from ..experiment_manager.multithreading_instrument_classes import SpectrometerController
+from ..experiment_manager.frame_ring import FrameRing
+from ..instrument_controllers.ppms_sampler import PPMSSampler
 from PyQt5.QtCore import QObject, QThread, pyqtSignal
 
 
@@ -13,21 +20,23 @@ class ExperimentManager(QObject):
 
     # NMR signals
     run_NMR_command = pyqtSignal(object)
+    prepare_NMR_command = pyqtSignal(object)
     current_repeat = pyqtSignal(int)
-    NMR_data = pyqtSignal(object, object, object, object)
+    # (frame slot, ch1 average, ch2 average), each receiver releases the slot once
+    NMR_data = pyqtSignal(int, object, object)
     set_NMR_output_path = pyqtSignal(str)
+    set_NMR_run_file = pyqtSignal(object)
     close_NMR_thread = pyqtSignal()
     # PPMS signals
     run_PPMS_command = pyqtSignal(object)
     set_PPMS_output_path = pyqtSignal(str)
-    get_PPMS_conditions = pyqtSignal(str)
     PPMS_data_to_gui = pyqtSignal(float, float)
     close_PPMS_thread = pyqtSignal()
     # Progress signals
     curr_command = pyqtSignal(int)
     experiment_finished = pyqtSignal(int)
 
-    def __init__(self):
+    def __init__(self, PPMS_poll_interval: float = 1.0):
         super().__init__()
         # Initialise logger
         self.logger = self.initialise_logger()
@@ -36,11 +45,27 @@ class ExperimentManager(QObject):
         self.active_command = 0
         self.output_directory = None
         self.current_sample = None
-        self.ch1_accumulator = None
-        self.ch2_accumulator = None
+        self.average = RunningAverage()
+        self.average_path = None
+        self.checkpoint_policy = CheckpointPolicy()
+        # Binary output
+        self.run_directory = None
+        self.run_file = None
+        # Run file created ahead of time for the next NMR command, as (command, run file)
+        self.prepared_run_file = None
+        self.export_text = False
+        self.last_PPMS_conditions = (None, None)
+        # Background writer shared by all threads
+        self.writer = AsyncWriter(logger=self.logger)
+        # Repeats shared with the NMR thread and the plots
+        self.frame_ring = FrameRing()
         # Make instrument threads
         self.NMR_thread, self.NMR_worker = self.create_NMR_thread()
         self.PPMS_thread, self.PPMS_worker = self.create_PPMS_thread()
+        # PPMS conditions are polled in the background, scans look them up from the cache
+        self.PPMS_sampler = PPMSSampler(self.PPMS_worker.read_conditions, interval=PPMS_poll_interval,
+                                        logger=self.logger)
+        self.PPMS_sampler.start()
         # Flags for closing threads
         self.NMR_safe_to_close = False
         self.PPMS_safe_to_close = False
@@ -73,7 +98,7 @@ class ExperimentManager(QObject):
     def create_NMR_thread(self) -> tuple[QThread, SpectrometerControllerDummy]:
         thread = QThread()
         # Create Worker instance for spectrometer
-        worker = SpectrometerController()
+        worker = SpectrometerController(writer=self.writer, frame_ring=self.frame_ring)
         worker.moveToThread(thread)
         self.logger.info("NMR worker thread created")
         # Connect signals
@@ -82,7 +107,9 @@ class ExperimentManager(QObject):
         worker.data_out.connect(self.emit_NMR_data_to_gui)
         # Connect slots
         self.run_NMR_command.connect(worker.run_command)
+        self.prepare_NMR_command.connect(worker.prepare_command)
         self.set_NMR_output_path.connect(worker.set_save_dir)
+        self.set_NMR_run_file.connect(worker.set_run_file)
         self.close_NMR_thread.connect(worker.shutdown_thread)
         # Start thread
         thread.start()
@@ -93,7 +120,7 @@ class ExperimentManager(QObject):
     def create_PPMS_thread(self) -> tuple[QThread, PPMSControllerDummy]:
         thread = QThread()
         # Create worker instance for PPMS
-        worker = PPMSControllerDummy()
+        worker = PPMSControllerDummy(writer=self.writer)
         worker.moveToThread(thread)
         self.logger.info("PPMS worker thread created")
         # Connect signals
@@ -102,7 +129,6 @@ class ExperimentManager(QObject):
         # Connect slots
         self.run_PPMS_command.connect(worker.run_command)
         self.set_PPMS_output_path.connect(worker.set_save_dir)
-        self.get_PPMS_conditions.connect(worker.poll_PPMS)
         self.close_PPMS_thread.connect(worker.shutdown_thread)
         # Start thread
         thread.start()
@@ -123,6 +149,7 @@ class ExperimentManager(QObject):
 
         self.logger.info(f"Experiment starting with sample {self.current_sample}")
         path = self.generate_output_directory()
+        self.run_directory = path
         self.generate_info_file(path)
         self.run_command()
 
@@ -132,8 +159,9 @@ class ExperimentManager(QObject):
         if self.active_command == len(self.command_list.get_command_list()):
             self.experiment_finished.emit(self.active_command-1)
             self.active_command = 0
-            self.ch1_accumulator = None
-            self.ch2_accumulator = None
+            self.average.reset()
+            self.discard_prepared_run_file()
+            self.writer.sync()
             self.logger.info("Experiment finished")
             return
 
@@ -142,50 +170,214 @@ class ExperimentManager(QObject):
         self.logger.info(f"Starting command: {current_command}")
 
         if isinstance(current_command, NMRCommand):
+            self.open_run_file(current_command)
             self.run_NMR_command.emit(current_command)
         else:
             self.run_PPMS_command.emit(current_command)
+            self.prepare_next_command()
+
+    def prepare_next_command(self) -> None:
+        """
+        Looks one command ahead while a PPMS command runs. A following NMR command is validated, prepared on the idle
+        NMR thread (register image, processing pipeline, acquisition buffers) and given its run file, so it starts
+        acquiring as soon as the PPMS is stable.
+        :return:
+        """
+        index = self.active_command + 1
+        if index >= len(self.command_list.get_command_list()):
+            return
+
+        command = self.command_list.get_command(index)
+        if not isinstance(command, NMRCommand):
+            return
+        if not command.valid_command or not command.sequence.valid_sequence:
+            self.logger.warning(f"Next command {command} is invalid, not preparing it")
+            return
+
+        self.logger.info(f"Preparing next command: {command}")
+        self.prepare_NMR_command.emit(command)
+        run_file = self.create_run_file(command)
+        if run_file is not None:
+            self.discard_prepared_run_file()
+            self.prepared_run_file = (command, run_file)
 
     def next_command(self) -> None:
+        # Finish output of previous command
+        self.checkpoint_average(final=True)
+        self.close_run_file()
+        # Sync the command's output to disk, whether it went to a run file or to text/npz files
+        self.writer.sync()
         # Reset accumulators
-        self.ch1_accumulator = None
-        self.ch2_accumulator = None
+        self.average.reset()
         # Increment command
         self.active_command += 1
         # Run
         self.run_command()
 
-    def emit_repeat_to_gui(self, repeat: int, seq_name: str) -> None:
+    def emit_repeat_to_gui(self, repeat: int, seq_name: str, timestamp: float) -> None:
         self.current_repeat.emit(repeat)
-        # Poll PPMS
-        self.logger.debug(seq_name)
-        self.get_PPMS_conditions.emit(seq_name)
+        # PPMS conditions at the start of the scan, from the sampler's cache
+        conditions = self.PPMS_sampler.conditions_at(timestamp)
+        if conditions is None:
+            self.logger.debug(f"No PPMS reading yet for {seq_name} repeat {repeat}")
+            return
+        T, H = conditions
+        self.log_PPMS_conditions(T, H, timestamp, seq_name)
+        self.emit_PPMS_data_to_gui(T, H, timestamp)
 
-    def emit_NMR_data_to_gui(self, rep: int, ch1_data: np.ndarray, ch2_data: np.ndarray, save_dir: str) -> None:
+    def log_PPMS_conditions(self, T: float, H: float, timestamp: float, seq_name: str) -> None:
+        timestamp = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d-%H:%M:%S")
+        self.writer.append_line(f"{self.run_directory}/PPMS_conditions_{seq_name}.txt", f"{timestamp},{T},{H}")
 
-        if self.ch1_accumulator is None:
-            self.ch1_accumulator = np.zeros(ch1_data.size)
-            self.ch2_accumulator = np.zeros(ch2_data.size)
+    def emit_NMR_data_to_gui(self, rep: int, slot: int, save_dir: str) -> None:
 
-        # Average data
-        self.ch1_accumulator += ch1_data
-        self.ch2_accumulator += ch2_data
+        ch1_data, ch2_data = self.frame_ring.frame(slot)
 
-        ch1_average = self.ch1_accumulator / rep
-        ch2_average = self.ch2_accumulator / rep
+        if not self.average:
+            # Averages are saved next to the command's raw data
+            if self.run_file is not None:
+                self.average_path = os.path.splitext(self.run_file.path)[0]
+            else:
+                current_command = self.command_list.get_command(self.active_command)
+                seq_name = current_command.sequence_filepath.split('/')[-1][:-4]
+                self.average_path = f"{save_dir}/{seq_name}"
+            self.checkpoint_policy.reset()
 
-        # Get current command
-        current_command = self.command_list.get_command(self.active_command)
-        seq_name = current_command.sequence_filepath.split('/')[-1][:-4]
+        # Average data
+        rep = self.average.add(ch1_data, ch2_data)
+
+        if self.checkpoint_policy.due(rep):
+            self.checkpoint_average()
+        # Send data to plotting, the mean is only computed if something is listening
+        receivers = self.receivers(self.NMR_data)
+        if receivers > 0:
+            ch1_average, ch2_average = self.average.average()
+            self.frame_ring.retain(slot, receivers)
+            self.NMR_data.emit(slot, ch1_average, ch2_average)
+        self.frame_ring.release(slot)
+
+    def checkpoint_average(self, final: bool = False) -> None:
+        """
+        Writes a binary checkpoint ({name}_avg.npz) of the accumulators and repeat count on the writer thread. The final
+        checkpoint of a command also stores the average in the run file, or in {name}_avg.txt without a run file.
+        :param final: Command finished.
+        :return:
+        """
+
+        if not self.average:
+            return
 
-        # Save data
-        np.savetxt(f"{save_dir}/{seq_name}_avg.txt", (ch1_average, ch2_average))
-        # Send data to plotting
-        self.NMR_data.emit(ch1_data, ch2_data, ch1_average, ch2_average)
+        # Copies, the buffers keep changing while the writer thread saves them
+        rep = self.average.repeats
+        self.writer.submit(write_checkpoint, f"{self.average_path}_avg.npz", self.average.sums.copy(), rep)
 
-    def emit_PPMS_data_to_gui(self, T: float, H: float) -> None:
+        if final:
+            average = self.average.average().copy()
+            if self.run_file is not None:
+                self.writer.submit(self.run_file.write_average, average[0], average[1], rep, path=self.run_file.path)
+            else:
+                path = f"{self.average_path}_avg.txt"
+                self.writer.submit(np.savetxt, path, average, path=path)
+            self.logger.info(f"Average of {rep} repeats saved to {self.average_path}")
+
+    def emit_PPMS_data_to_gui(self, T: float, H: float, timestamp: float | None = None) -> None:
+        self.last_PPMS_conditions = (T, H)
+        if self.run_file is not None:
+            timestamp = time.time() if timestamp is None else timestamp
+            self.writer.submit(self.run_file.append_conditions, T, H, timestamp, path=self.run_file.path)
         self.PPMS_data_to_gui.emit(T, H)
 
+    def open_run_file(self, command: NMRCommand) -> None:
+        """
+        Opens the binary run file for an NMR command and passes it to the NMR thread, using the one created ahead of time
+        if there is one. Falls back to text output if h5py is not installed.
+        :param command: NMR command about to run.
+        :return:
+        """
+
+        if self.prepared_run_file is not None and self.prepared_run_file[0] is command:
+            run_file = self.prepared_run_file[1]
+            self.prepared_run_file = None
+            # Conditions when the command actually starts, not when it was prepared
+            T, H = self.last_PPMS_conditions
+            reading = self.PPMS_sampler.latest()
+            if reading is not None:
+                T, H = reading.T, reading.H
+            run_file.set_attributes({"start_T": T, "start_H": H})
+        else:
+            self.discard_prepared_run_file()
+            run_file = self.create_run_file(command)
+            if run_file is None:
+                return
+
+        self.run_file = run_file
+        self.set_NMR_run_file.emit(self.run_file)
+        self.logger.info(f"Run file opened at {self.run_file.path}")
+
+    def create_run_file(self, command: NMRCommand) -> RunFile | None:
+        """
+        Creates the binary run file for an NMR command.
+        :param command: NMR command.
+        :return: RunFile, or None if h5py is not installed.
+        """
+
+        if not RunFile.available():
+            self.logger.warning("h5py not installed, saving NMR data as text")
+            return None
+
+        seq_name = command.sequence_filepath.split('/')[-1][:-4]
+        T, H = self.last_PPMS_conditions
+
+        attributes = {f"sequence_{k}": v for k, v in command.sequence.convert_to_dict().items()}
+        attributes.update({"sequence_filepath": command.sequence_filepath, "repeats": command.repeats,
+                           "records_per_scan": command.records_per_scan, "decimation": command.decimation,
+                           "phase_cycle": command.phase_cycle, "start_T": T, "start_H": H})
+        if self.current_sample:
+            attributes["sample_name"] = self.current_sample.name
+
+        # Don't overwrite the run file of an earlier command using the same sequence
+        path = f"{self.run_directory}/{seq_name}.h5"
+        version = 1
+        while os.path.exists(path):
+            version += 1
+            path = f"{self.run_directory}/{seq_name}_{version}.h5"
+
+        run_file = RunFile(path, attributes)
+        self.logger.info(f"Run file created at {run_file.path}")
+
+        return run_file
+
+    def discard_prepared_run_file(self) -> None:
+        """
+        Deletes a run file created ahead of time for a command that was not run.
+        :return:
+        """
+
+        if self.prepared_run_file is None:
+            return
+
+        _, run_file = self.prepared_run_file
+        self.prepared_run_file = None
+        run_file.close()
+        os.remove(run_file.path)
+        self.logger.info(f"Unused run file deleted: {run_file.path}")
+
+    def close_run_file(self) -> None:
+        """
+        Closes the run file of the finished NMR command, exporting it to text files if export_text is set.
+        :return:
+        """
+
+        if self.run_file is None:
+            return
+
+        # Closed on the writer thread after any pending writes to it
+        self.writer.submit(self.run_file.close, path=self.run_file.path)
+        if self.export_text:
+            self.writer.submit(export_run_to_text, self.run_file.path)
+        self.logger.info(f"Run file closed: {self.run_file.path}")
+        self.run_file = None
+
     def set_current_sample(self, sample) -> None:
         self.current_sample = sample
         self.logger.debug(f"Set active sample to {sample}")
@@ -245,8 +437,13 @@ class ExperimentManager(QObject):
         self.logger.info(f"Info file created at {path}/info.txt")
 
     def close_threads(self):
+        self.PPMS_sampler.stop()
+        self.checkpoint_average(final=True)
+        self.close_run_file()
+        self.discard_prepared_run_file()
         self.close_NMR_thread.emit()
         self.close_PPMS_thread.emit()
+        self.writer.close()
 
 
 class CommandList(QObject):
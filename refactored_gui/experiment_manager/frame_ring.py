@@ -0,0 +1,123 @@
+import threading
+
+import numpy as np
+
+
+class FrameRing:
+    """
+    Fixed set of preallocated frame slots shared between the acquisition worker and its consumers on other threads.
+
+    The producer takes a free slot with acquire(), writes a frame of shape (channels, samples) into it and sends only
+    the slot index over Qt. Consumers read the frame in place and call release() when they have finished with it;
+    a consumer passing the frame on calls retain() first, once per extra holder. A slot is reused once every holder
+    has released it, so memory is bounded by the number of slots, and a producer that outruns its consumers blocks in
+    acquire() instead of queuing frames.
+
+    Each acquisition gets a new sequence number, so a consumer can check that a slot still holds the frame it was told
+    about.
+    """
+
+    def __init__(self, slots: int = 8) -> None:
+        """
+        :param slots: Number of frames that can be in use at once.
+        """
+        self.num_slots = slots
+        self.frames = None
+        self.ref_counts = [0] * slots
+        self.sequences = [-1] * slots
+        self.next_sequence = 0
+        self.next_slot = 0
+        self.condition = threading.Condition()
+
+        self.acquired = 0
+        self.timeouts = 0
+
+    def acquire(self, channels: int, samples: int, dtype: np.dtype, timeout: float | None = None) -> int | None:
+        """
+        Takes a free slot for a frame, blocking until one is released. Slots are (re)allocated when the frame shape or
+        dtype changes, once every slot is free.
+        :param channels: Number of channels.
+        :param samples: Samples per channel.
+        :param dtype: Frame dtype.
+        :param timeout: Seconds to wait, None to wait indefinitely.
+        :return: Slot index, or None if no slot became free in time.
+        """
+        shape = (self.num_slots, channels, samples)
+        dtype = np.dtype(dtype)
+
+        with self.condition:
+            if self.frames is None or self.frames.shape != shape or self.frames.dtype != dtype:
+                if not self.condition.wait_for(lambda: not any(self.ref_counts), timeout):
+                    self.timeouts += 1
+                    return None
+                self.frames = np.empty(shape, dtype=dtype)
+
+            if not self.condition.wait_for(lambda: 0 in self.ref_counts, timeout):
+                self.timeouts += 1
+                return None
+
+            # Oldest free slot first, so recently released frames stay readable as long as possible
+            slot = next(i % self.num_slots for i in range(self.next_slot, self.next_slot + self.num_slots)
+                        if self.ref_counts[i % self.num_slots] == 0)
+            self.next_slot = (slot + 1) % self.num_slots
+            self.ref_counts[slot] = 1
+            self.sequences[slot] = self.next_sequence
+            self.next_sequence += 1
+            self.acquired += 1
+
+        return slot
+
+    def write(self, slot: int, *channels: np.ndarray) -> None:
+        """
+        Copies one record per channel into an acquired slot.
+        :param slot: Slot returned by acquire().
+        :param channels: Records of the slot's length.
+        :return:
+        """
+        for frame_channel, data in zip(self.frames[slot], channels):
+            np.copyto(frame_channel, data, casting='same_kind')
+
+    def frame(self, slot: int) -> np.ndarray:
+        """
+        Returns the frame in a slot, valid until the caller releases it.
+        :param slot: Slot index.
+        :return: View of shape (channels, samples).
+        """
+        return self.frames[slot]
+
+    def sequence(self, slot: int) -> int:
+        return self.sequences[slot]
+
+    def retain(self, slot: int, holders: int = 1) -> None:
+        """
+        Adds holders to a slot, each of which must release it.
+        :param slot: Slot index.
+        :param holders: Number of holders added.
+        :return:
+        """
+        with self.condition:
+            if self.ref_counts[slot] == 0:
+                raise ValueError(f"Frame slot {slot} is not in use")
+            self.ref_counts[slot] += holders
+
+    def release(self, slot: int) -> None:
+        """
+        Drops one holder of a slot, freeing it for the producer when none are left.
+        :param slot: Slot index.
+        :return:
+        """
+        with self.condition:
+            if self.ref_counts[slot] == 0:
+                raise ValueError(f"Frame slot {slot} released more often than acquired")
+            self.ref_counts[slot] -= 1
+            if self.ref_counts[slot] == 0:
+                self.condition.notify_all()
+
+    @property
+    def in_use(self) -> int:
+        with self.condition:
+            return sum(count > 0 for count in self.ref_counts)
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self.frames is None else self.frames.nbytes
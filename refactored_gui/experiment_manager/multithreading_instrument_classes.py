@@ -1,23 +1,59 @@
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 from refactored_gui.instrument_controllers.sdr14_controller import SDR14
+from refactored_gui.instrument_controllers.ppms_controller import PPMS_GPIB
+from refactored_gui.instrument_controllers.fake_ppms import FakePPMSModel, SimulatedPPMS, SimulatedPPMSResource
+from refactored_gui.experiment_manager.acquisition_pipeline import AcquisitionPipeline, StageMeter
+from refactored_gui.experiment_manager.frame_ring import FrameRing
+from refactored_gui.data_handling.async_writer import AsyncWriter
+from refactored_gui.data_handling.ddc import DigitalDownConverter
+from refactored_gui.data_handling.phase_cycle import PhaseCycle, PHASE_CYCLES, rotate_receiver
 from datetime import datetime
 from abc import ABC, abstractmethod
 import time
 import logging
 import numpy as np
 from enum import Enum
+from typing import NamedTuple
+
+
+# Longest wait for the GUI side to release a frame slot before a repeat is dropped from the average
+FRAME_SLOT_TIMEOUT = 10.0
+# Attempts at a scan before it is skipped
+ACQUISITION_ATTEMPTS = 2
 
 
 class FinalMeta(type(ABC), type(QObject)):
     pass
 
 
+def create_down_converter(command) -> DigitalDownConverter | None:
+    """
+    Returns the down-converter for an NMR command, or None if the command keeps the raw records.
+    """
+    if command.decimation <= 1:
+        return None
+
+    return DigitalDownConverter(command.sequence.frequency, command.decimation)
+
+
+class PreparedNMRCommand(NamedTuple):
+    command: object
+    seq_name: str
+    register_writes: list[tuple[int, int, int]]
+    pipeline: AcquisitionPipeline
+    cycle: PhaseCycle | None
+
+
 class SpectrometerThreadController(ABC):
 
     @abstractmethod
     def prepare_device(self, sequence):
         pass
 
+    @abstractmethod
+    def prepare_command(self, command):
+        pass
+
     @abstractmethod
     def run_command(self, command):
         pass
@@ -30,6 +66,10 @@ class SpectrometerThreadController(ABC):
     def set_save_dir(self, save_dir: str):
         pass
 
+    @abstractmethod
+    def set_run_file(self, run_file):
+        pass
+
     @abstractmethod
     def shutdown_thread(self):
         pass
@@ -38,14 +78,20 @@ class SpectrometerThreadController(ABC):
 class SpectrometerControllerDummy(SpectrometerThreadController, QObject, metaclass=FinalMeta):
 
     finished = pyqtSignal()
-    current_repeat = pyqtSignal(int, str)
-    data_out = pyqtSignal(int, object, object, str)
+    # (repeat, seq_name, scan start time)
+    current_repeat = pyqtSignal(int, str, float)
+    # (repeat, frame slot, save_dir), the receiver releases the slot
+    data_out = pyqtSignal(int, int, str)
     safe_to_close = pyqtSignal()
 
-    def __init__(self) -> None:
+    def __init__(self, writer: AsyncWriter | None = None, frame_ring: FrameRing | None = None) -> None:
         super().__init__()
         self.logger = self.initialise_logger()
+        self.writer = writer if writer is not None else AsyncWriter(logger=self.logger)
+        self.frame_ring = frame_ring if frame_ring is not None else FrameRing()
         self.save_dir = None
+        self.run_file = None
+        self.prepared = None
         self.logger.info("NMR thread started")
 
     @staticmethod
@@ -73,24 +119,50 @@ class SpectrometerControllerDummy(SpectrometerThreadController, QObject, metacla
 
         return logger
 
+    @pyqtSlot(object)
+    def prepare_command(self, command) -> None:
+        self.prepared = (command, create_down_converter(command))
+        self.logger.info(f"Prepared {command}")
+
     @pyqtSlot(object)
     def run_command(self, command) -> None:
         self.prepare_device(command.sequence)
         repeats = command.repeats
         seq_name = command.sequence_filepath.split('/')[-1][:-4]
         self.logger.info(f"Running dummy code with command = {command}")
+        if self.prepared is not None and self.prepared[0] is command:
+            ddc = self.prepared[1]
+        else:
+            ddc = create_down_converter(command)
+        self.prepared = None
         for i in range(0, repeats):
-            self.current_repeat.emit(i + 1, seq_name)
+            self.current_repeat.emit(i + 1, seq_name, time.time())
             self.logger.info(f"Current scan = {i + 1} / {repeats}")
             ch1_data = self.generate_test_data()
             ch2_data = self.generate_test_data()
-            self.data_out.emit(i + 1, ch1_data, ch2_data, self.save_dir)
+            if ddc is not None:
+                ch1_data, ch2_data = ddc.process(ch1_data), ddc.process(ch2_data)
+            self.publish_frame(i + 1, ch1_data, ch2_data, self.save_dir)
             self.save_data(ch1_data, ch2_data, i+1, seq_name)
             time.sleep(0.5)
 
+        self.run_file = None
         self.logger.info("NMR Dummy code finished")
         self.finished.emit()
 
+    def publish_frame(self, repeat: int, ch1_data: np.ndarray, ch2_data: np.ndarray, save_dir: str) -> None:
+        """
+        Copies a repeat into a shared frame slot and sends the slot index for averaging and plotting. Blocks while
+        every slot is still held by the GUI side, which throttles acquisition instead of queuing frames.
+        """
+        slot = self.frame_ring.acquire(2, ch1_data.size, np.result_type(ch1_data, ch2_data),
+                                       timeout=FRAME_SLOT_TIMEOUT)
+        if slot is None:
+            self.logger.warning(f"No free frame slot after {FRAME_SLOT_TIMEOUT} s, repeat {repeat} not averaged")
+            return
+        self.frame_ring.write(slot, ch1_data, ch2_data)
+        self.data_out.emit(repeat, slot, save_dir)
+
     def prepare_device(self, sequence) -> None:
 
         # Write command to SDR14 registers
@@ -106,74 +178,267 @@ class SpectrometerControllerDummy(SpectrometerThreadController, QObject, metacla
     def set_save_dir(self, save_dir: str) -> None:
         self.save_dir = save_dir
 
+    @pyqtSlot(object)
+    def set_run_file(self, run_file) -> None:
+        self.run_file = run_file
+
     def save_data(self, ch1_data: np.ndarray, ch2_data: np.ndarray, repeat: int, seq_name: str) -> None:
-        np.savetxt(f"{self.save_dir}/{seq_name}_{repeat}.txt", (ch1_data, ch2_data))
+        # Written on the writer thread, copied as acquisition buffers are reused
+        ch1_data, ch2_data = ch1_data.copy(), ch2_data.copy()
+        if self.run_file is not None:
+            self.writer.submit(self.run_file.append_repeat, ch1_data, ch2_data, path=self.run_file.path)
+        else:
+            path = f"{self.save_dir}/{seq_name}_{repeat}.txt"
+            self.writer.submit(np.savetxt, path, (ch1_data, ch2_data), path=path)
 
     @pyqtSlot()
     def shutdown_thread(self) -> None:
         self.logger.info("Disconnecting SDR14")
+        self.writer.sync(wait=True)
         self.safe_to_close.emit()
 
     @staticmethod
     def generate_test_data() -> np.ndarray:
         l = 65536
-        return np.random.random(l)
+        # Raw 14 bit samples, as returned by the SDR14
+        return np.random.randint(-2**13, 2**13, l, dtype=np.int16)
 
 
 class SpectrometerController(SpectrometerThreadController, QObject, metaclass=FinalMeta):
 
     finished = pyqtSignal()
-    current_repeat = pyqtSignal(int, str)
-    data_out = pyqtSignal(int, object, object, str)
+    # (repeat, seq_name, scan start time)
+    current_repeat = pyqtSignal(int, str, float)
+    # (repeat, frame slot, save_dir), the receiver releases the slot
+    data_out = pyqtSignal(int, int, str)
     safe_to_close = pyqtSignal()
 
-    def __init__(self) -> None:
+    def __init__(self, api=None, writer: AsyncWriter | None = None, frame_ring: FrameRing | None = None) -> None:
         super().__init__()
-        self.SDR14 = SDR14()
+        self.logger = self.initialise_logger()
+        self.writer = writer if writer is not None else AsyncWriter(logger=self.logger)
+        self.frame_ring = frame_ring if frame_ring is not None else FrameRing()
+        self.SDR14 = SDR14(api=api)
+        self.session = None
+        self.prepared = None
         self.save_dir = None
-        print("[NMR Thread] __init__()")
+        self.run_file = None
+        self.logger.info("NMR thread started")
+
+    @staticmethod
+    def initialise_logger() -> logging.Logger:
+
+        logger = logging.getLogger(f"{__name__}.{__class__.__name__}")
+        logger.setLevel(logging.DEBUG)
+
+        # Log formatting
+        log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        date_format = "%Y-%m-%d %H:%M:%S"
+        formatter = logging.Formatter(log_format, date_format)
+
+        # File logging
+        file_handler = logging.FileHandler("logs.log")
+        file_handler.setFormatter(formatter)
+        file_handler.setLevel(logging.INFO)
+        logger.addHandler(file_handler)
+
+        # Console logging
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        console_handler.setLevel(logging.DEBUG)
+        logger.addHandler(console_handler)
+
+        return logger
+
+    @pyqtSlot(object)
+    def prepare_command(self, command) -> None:
+        """
+        Prepares an NMR command ahead of time, while the thread would otherwise idle (e.g. during a PPMS command), so
+        run_command can start acquiring straight away.
+        :param command: The NMR command that will be run next.
+        :return:
+        """
+        start = time.perf_counter()
+        self.prepared = self.prepare(command)
+        self.logger.info(f"Prepared {command} in {time.perf_counter() - start:.3f} s")
+
+    def prepare(self, command) -> PreparedNMRCommand:
+        """
+        Does the per-command setup: the sequence's register image, the processing pipeline (down-converter and phase
+        cycle) and the pooled acquisition buffers. Touches neither the registers nor the acquisition state.
+        :param command: NMR command.
+        :return: PreparedNMRCommand
+        """
+        seq_name = command.sequence_filepath.split('/')[-1][:-4]
+        register_writes = self.SDR14.sequence_register_writes(command.sequence)
+        samples_per_record = self.SDR14.acquisition_parameters.samples_per_record
+
+        def save(rep: int, ch1_data: np.ndarray, ch2_data: np.ndarray, save_dir: str) -> None:
+            self.save_data(ch1_data, ch2_data, rep, seq_name)
+
+        stages = [("plot", self.publish_frame), ("save", save)]
+        ddc = create_down_converter(command)
+        if ddc is not None:
+            def down_convert(rep: int, ch1_data: np.ndarray, ch2_data: np.ndarray, save_dir: str) -> tuple:
+                return rep, ddc.process(ch1_data), ddc.process(ch2_data), save_dir
+
+            stages.insert(0, ("ddc", down_convert))
+            # Local oscillator for the record length, computed once
+            ddc.nco(samples_per_record)
+            self.logger.info(f"Down-converting at {ddc.frequency} Hz to {ddc.output_rate:.0f} S/s I/Q")
+
+        cycle = self.prepare_phase_cycle(command)
+        if cycle is not None:
+            def receive(rep: int, ch1_data: np.ndarray, ch2_data: np.ndarray, save_dir: str) -> tuple:
+                phase = command.sequence.RX_phase + cycle.RX_phase(rep - 1)
+                return rep, *rotate_receiver(ch1_data, ch2_data, phase), save_dir
+
+            stages.insert(1 if ddc is not None else 0, ("receiver", receive))
+
+        # Converting, saving and plotting run on their own threads while the next repeat is acquired
+        pipeline = AcquisitionPipeline(stages, logger=self.logger)
+        # Pooled buffers must outlive every frame in flight, plus the one being acquired and the one being plotted
+        self.SDR14.buffer_pool.reserve(pipeline.capacity + 2)
+        self.SDR14.buffer_pool.preallocate(samples_per_record, command.records_per_scan)
+
+        return PreparedNMRCommand(command, seq_name, register_writes, pipeline, cycle)
 
     @pyqtSlot(object)
     def run_command(self, command) -> None:
-        self.prepare_device(command.sequence)
+        # Use the look-ahead preparation if it was for this command
+        if self.prepared is not None and self.prepared.command is command:
+            prepared = self.prepared
+        else:
+            prepared = self.prepare(command)
+        self.prepared = None
+        _, seq_name, register_writes, pipeline, cycle = prepared
         repeats = command.repeats
-        seq_name = command.sequence_filepath.split('/')[-1][:-4]
-        print(f"[NMR Thread] Running command: {command}")
-        for i in range(0, repeats):
-            self.current_repeat.emit(i + 1, seq_name)
-            print(f"[NMR Thread] Current scan = {i + 1} / {repeats}")
-            ch1_data, ch2_data = self.SDR14.MR_acquisition()
-            self.data_out.emit(i + 1, ch1_data, ch2_data, self.save_dir)
-            self.save_data(ch1_data, ch2_data, i + 1, seq_name)
-            time.sleep(1)
-
-        print("[NMR Thread] Dummy code finished")
+
+        # Write sequence to SDR14 registers, only touching registers that change
+        self.logger.debug(f"Parsing sequence: {command.sequence.name}")
+        self.SDR14.commit_registers(register_writes)
+        self.logger.info(f"Running command: {command}")
+        start = time.perf_counter()
+        acquire_meter = StageMeter("acquire")
+        skipped = 0
+        # Configure MultiRecord once for the whole command, only re-arming between repeats
+        self.SDR14.acquisition_parameters.num_of_records = command.records_per_scan
+        self.session = self.SDR14.multirecord_session()
+        with self.session, pipeline:
+            for i in range(0, repeats):
+                scan_start = time.perf_counter()
+                self.current_repeat.emit(i + 1, seq_name, time.time())
+                self.logger.info(f"Current scan = {i + 1} / {repeats}")
+                if cycle is not None:
+                    TX_phase = (command.sequence.TX_phase + cycle.TX_phase(i)) % 360
+                    self.SDR14.write_sequence_field("TX_phase", TX_phase, quiet=True)
+                scan = self.acquire_scan(command.records_per_scan)
+                acquire_meter.record(time.perf_counter() - scan_start)
+                if scan is None:
+                    # Not averaged, saved or plotted
+                    self.logger.error(f"Scan {i + 1} failed {ACQUISITION_ATTEMPTS} times, skipped")
+                    skipped += 1
+                    continue
+                pipeline.submit(i + 1, *scan, self.save_dir)
+                # Wait out the rest of the repetition time
+                remaining = command.repetition_time - (time.perf_counter() - scan_start)
+                if remaining > 0:
+                    time.sleep(remaining)
+        self.session = None
+        self.run_file = None
+        self.logger.info(acquire_meter.summary())
+
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"Command finished: {repeats} scans in {elapsed:.2f} s ({repeats / elapsed:.2f} scans/s)")
+        if skipped:
+            self.logger.warning(f"{skipped} of {repeats} scans failed and were skipped")
         self.finished.emit()
 
+    def publish_frame(self, repeat: int, ch1_data: np.ndarray, ch2_data: np.ndarray, save_dir: str) -> None:
+        """
+        Copies a repeat into a shared frame slot and sends the slot index for averaging and plotting. Blocks while
+        every slot is still held by the GUI side, which throttles acquisition instead of queuing frames.
+        """
+        slot = self.frame_ring.acquire(2, ch1_data.size, np.result_type(ch1_data, ch2_data),
+                                       timeout=FRAME_SLOT_TIMEOUT)
+        if slot is None:
+            self.logger.warning(f"No free frame slot after {FRAME_SLOT_TIMEOUT} s, repeat {repeat} not averaged")
+            return
+        self.frame_ring.write(slot, ch1_data, ch2_data)
+        self.data_out.emit(repeat, slot, save_dir)
+
+    def acquire_scan(self, records_per_scan: int) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Acquires one scan from the open session, retrying a timed out or failed acquisition.
+        :param records_per_scan: Records averaged per scan.
+        :return: (ch1_data, ch2_data), or None if every attempt failed.
+        """
+        for attempt in range(ACQUISITION_ATTEMPTS):
+            if records_per_scan > 1:
+                scan = self.session.acquire_average()
+            else:
+                scan = self.session.acquire()
+            if scan is not None:
+                return scan
+            self.logger.warning(f"Acquisition failed (attempt {attempt + 1} / {ACQUISITION_ATTEMPTS})")
+
+        return None
+
+    def prepare_phase_cycle(self, command) -> PhaseCycle | None:
+        """
+        Returns the phase cycle of a command, or None if it has none or it can't be run on this device.
+        :param command: NMR command.
+        :return: PhaseCycle | None
+        """
+        if not command.phase_cycle:
+            return None
+
+        cycle = PHASE_CYCLES[command.phase_cycle]
+        # Rotating the receiver without stepping the transmitter would cancel the signal
+        if not self.SDR14.has_register("TX_phase"):
+            self.logger.warning(f"TX_phase has no SDR14 register, phase cycle {cycle.name} disabled")
+            return None
+        if command.decimation <= 1 and (command.sequence.RX_phase % 90):
+            self.logger.warning(f"RX_phase {command.sequence.RX_phase} is not a multiple of 90 degrees, "
+                                f"phase cycle {cycle.name} disabled")
+            return None
+        if command.repeats % len(cycle):
+            self.logger.warning(f"{command.repeats} repeats is not a whole number of {cycle.name} cycles, "
+                                f"artefacts will not fully cancel")
+
+        self.logger.info(f"Phase cycle {cycle.name}: TX {cycle.TX_phases}, RX {cycle.RX_phases}")
+
+        return cycle
+
     def prepare_device(self, sequence) -> None:
 
-        # Write sequence to SDR14 registers
-        for key, value in sequence.convert_to_dict().items():
-            if key == "name":
-                print(f"Parsing sequence: {value}")
-            elif key in ["TX_phase", "RX_phase"]:
-                register_number = self.SDR14.register_lookup[key]
-                mask = self.SDR14.register_mask[key]
-                #self.SDR14.write_register(register_number, value, mask=mask)
-            else:
-                register_number = self.SDR14.register_lookup[key]
-                self.SDR14.write_register(register_number, value)
+        # Write sequence to SDR14 registers, only touching registers that change
+        self.logger.debug(f"Parsing sequence: {sequence.name}")
+        self.SDR14.commit_registers(self.SDR14.sequence_register_writes(sequence))
 
     @pyqtSlot(str)
     def set_save_dir(self, save_dir: str) -> None:
         self.save_dir = save_dir
 
+    @pyqtSlot(object)
+    def set_run_file(self, run_file) -> None:
+        self.run_file = run_file
+
     def save_data(self, ch1_data: np.ndarray, ch2_data: np.ndarray, repeat: int, seq_name: str) -> None:
-        np.savetxt(f"{self.save_dir}/{seq_name}_{repeat}.txt", (ch1_data, ch2_data))
+        # Written on the writer thread, copied as acquisition buffers are reused
+        ch1_data, ch2_data = ch1_data.copy(), ch2_data.copy()
+        if self.run_file is not None:
+            self.writer.submit(self.run_file.append_repeat, ch1_data, ch2_data, path=self.run_file.path)
+        else:
+            path = f"{self.save_dir}/{seq_name}_{repeat}.txt"
+            self.writer.submit(np.savetxt, path, (ch1_data, ch2_data), path=path)
 
     @pyqtSlot()
     def shutdown_thread(self) -> None:
+        if self.session is not None:
+            self.session.close()
         self.SDR14.delete_control_unit()
+        self.writer.sync(wait=True)
         self.safe_to_close.emit()
 
 
@@ -187,6 +452,10 @@ class PPMSThreadController(ABC):
     def poll_PPMS(self):
         pass
 
+    @abstractmethod
+    def read_conditions(self) -> tuple[float, float]:
+        pass
+
     @abstractmethod
     def log_data_to_file(self, T: float, H: float, seq_name: str) -> None:
         pass
@@ -216,9 +485,15 @@ class PPMSControllerDummy(PPMSThreadController, QObject, metaclass=FinalMeta):
     finished = pyqtSignal()
     safe_to_close = pyqtSignal()
 
-    def __init__(self) -> None:
+    def __init__(self, writer: AsyncWriter | None = None, PPMS: PPMS_GPIB | None = None) -> None:
         super().__init__()
         self.logger = self.initialise_logger()
+        self.writer = writer if writer is not None else AsyncWriter(logger=self.logger)
+        # Simulated PPMS, running 600 times faster than real time so sweeps take seconds
+        if PPMS is None:
+            simulator = SimulatedPPMS(FakePPMSModel(speed=600))
+            PPMS = PPMS_GPIB(resource=SimulatedPPMSResource(simulator))
+        self.PPMS = PPMS
         self.save_dir = None
         self.logger.info("PPMS thread started")
 
@@ -250,7 +525,10 @@ class PPMSControllerDummy(PPMSThreadController, QObject, metaclass=FinalMeta):
     @pyqtSlot(object)
     def run_command(self, command) -> None:
         self.logger.info(f"Running dummy code with command = {command}")
-        time.sleep(2)
+        if command.command_type == "PPMS-Temp":
+            self.PPMS.set_temperature(command.set_value, command.rate)
+        elif command.command_type == "PPMS-Field":
+            self.PPMS.set_field(command.set_value, command.rate)
 
         self.logger.info("Dummy code finished")
         self.finished.emit()
@@ -266,22 +544,26 @@ class PPMSControllerDummy(PPMSThreadController, QObject, metaclass=FinalMeta):
         self.log_data_to_file(T, H, seq_name)
         self.PPMS_data_out.emit(T, H)
 
-    @staticmethod
-    def get_T() -> float:
-        return np.random.random(1)[0]
+    def read_conditions(self) -> tuple[float, float]:
+        """
+        Returns (T, H). Called from the PPMS sampler thread.
+        """
+        return self.PPMS.get_current_conditions()
 
-    @staticmethod
-    def get_H() -> float:
-        return np.random.random(1)[0]
+    def get_T(self) -> float:
+        return self.PPMS.get_temperature()
+
+    def get_H(self) -> float:
+        return self.PPMS.get_field()
 
     def log_data_to_file(self, T: float, H: float, seq_name: str) -> None:
         now = datetime.now()
         timestamp = now.strftime("%Y-%m-%d-%H:%M:%S")
 
-        with open(f"{self.save_dir}/PPMS_conditions_{seq_name}.txt", "a") as f:
-            f.write(f"{timestamp},{T},{H}\n")
+        self.writer.append_line(f"{self.save_dir}/PPMS_conditions_{seq_name}.txt", f"{timestamp},{T},{H}")
 
     @pyqtSlot()
     def shutdown_thread(self) -> None:
         self.logger.info("Disconnecting PPMS")
+        self.writer.sync(wait=True)
         self.safe_to_close.emit()
\ No newline at end of file
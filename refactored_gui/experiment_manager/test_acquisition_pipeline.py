@@ -0,0 +1,66 @@
+import time
+import threading
+
+from refactored_gui.experiment_manager.acquisition_pipeline import AcquisitionPipeline
+
+
+def test_items_pass_through_stages_in_order() -> None:
+    plotted = []
+    saved = []
+
+    with AcquisitionPipeline([("plot", lambda rep: plotted.append(rep)),
+                              ("save", lambda rep: saved.append((rep, len(plotted))))]) as pipeline:
+        for i in range(10):
+            pipeline.submit(i)
+
+    assert plotted == list(range(10))
+    assert [rep for rep, _ in saved] == list(range(10))
+    # Each item is plotted before it is saved
+    assert all(n_plotted > rep for rep, n_plotted in saved)
+    assert [stage.meter.count for stage in pipeline.stages] == [10, 10]
+
+
+def test_submit_blocks_when_full() -> None:
+    release = threading.Event()
+    pipeline = AcquisitionPipeline([("save", lambda rep: release.wait())], queue_size=1)
+    pipeline.start()
+
+    submitted = []
+    producer = threading.Thread(target=lambda: [submitted.append(pipeline.submit(i)) for i in range(5)])
+    producer.start()
+    time.sleep(0.1)
+
+    # One item being processed and one queued
+    assert len(submitted) == 2
+
+    release.set()
+    producer.join()
+    pipeline.close()
+    assert len(submitted) == 5
+
+
+def test_stage_errors_do_not_stall_pipeline() -> None:
+    saved = []
+
+    def save(rep: int) -> None:
+        if rep == 1:
+            raise OSError("disk full")
+        saved.append(rep)
+
+    with AcquisitionPipeline([("save", save)]) as pipeline:
+        for i in range(3):
+            pipeline.submit(i)
+
+    assert saved == [0, 2]
+    assert pipeline.stages[0].errors == 1
+
+
+def test_stage_can_transform_items() -> None:
+    saved = []
+
+    with AcquisitionPipeline([("convert", lambda rep, value: (rep, value * 2)),
+                              ("save", lambda rep, value: saved.append(value))]) as pipeline:
+        for i in range(5):
+            pipeline.submit(i, i)
+
+    assert saved == [0, 2, 4, 6, 8]
@@ -0,0 +1,56 @@
+import threading
+
+import numpy as np
+import pytest
+
+from refactored_gui.experiment_manager.frame_ring import FrameRing
+
+
+def test_frames_are_shared_until_released() -> None:
+    ring = FrameRing(slots=2)
+    ch1, ch2 = np.arange(8, dtype=np.int16), -np.arange(8, dtype=np.int16)
+
+    slot = ring.acquire(2, 8, np.int16)
+    ring.write(slot, ch1, ch2)
+    frame = ring.frame(slot)
+
+    assert np.array_equal(frame[0], ch1) and np.array_equal(frame[1], ch2)
+    assert ring.frame(slot).base is ring.frames
+    ring.retain(slot)
+    ring.release(slot)
+    assert ring.in_use == 1
+    ring.release(slot)
+    assert ring.in_use == 0
+    with pytest.raises(ValueError):
+        ring.release(slot)
+
+
+def test_acquire_blocks_until_a_slot_is_released() -> None:
+    ring = FrameRing(slots=2)
+    held = [ring.acquire(2, 8, np.int16) for _ in range(2)]
+
+    assert ring.acquire(2, 8, np.int16, timeout=0.01) is None
+    assert ring.timeouts == 1
+
+    acquired = []
+    producer = threading.Thread(target=lambda: acquired.append(ring.acquire(2, 8, np.int16, timeout=5)))
+    producer.start()
+    producer.join(0.05)
+    assert producer.is_alive()
+
+    ring.release(held[0])
+    producer.join(5)
+    assert acquired == [held[0]]
+    assert ring.sequence(held[0]) == 2
+
+
+def test_reallocates_for_new_frame_shape_once_free() -> None:
+    ring = FrameRing(slots=2)
+    slot = ring.acquire(2, 8, np.int16)
+
+    assert ring.acquire(2, 4, np.complex64, timeout=0.01) is None
+    ring.release(slot)
+
+    slot = ring.acquire(2, 4, np.complex64)
+    assert ring.frame(slot).shape == (2, 4) and ring.frame(slot).dtype == np.complex64
+    assert ring.nbytes == 2 * 2 * 4 * 8
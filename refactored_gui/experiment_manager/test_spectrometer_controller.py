@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+
+from refactored_gui.data_handling.sequence import Sequence
+from refactored_gui.experiment_manager.multithreading_instrument_classes import SpectrometerController
+from refactored_gui.instrument_controllers import sdr14_controller
+from refactored_gui.instrument_controllers.fake_adqapi import FakeADQAPI, FakeSDR14Timing
+
+
+@pytest.fixture
+def controller(tmp_path, monkeypatch) -> SpectrometerController:
+    # The controllers log to logs.log in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sdr14_controller.time, "sleep", lambda s: None)
+    controller = SpectrometerController(api=FakeADQAPI(FakeSDR14Timing(realtime=False)))
+    controller.set_save_dir(str(tmp_path))
+    yield controller
+    controller.writer.close()
+
+
+def make_command(decimation: int = 1) -> SimpleNamespace:
+    return SimpleNamespace(sequence=Sequence(213000000, 0, 0, 1000, 5000, 1500, 0, 0, 10000),
+                           sequence_filepath="sequences/test.txt", repeats=2, repetition_time=0.0,
+                           records_per_scan=1, decimation=decimation, phase_cycle="")
+
+
+def test_prepare_leaves_device_untouched(controller) -> None:
+    command = make_command(decimation=8)
+    registers = list(controller.SDR14.register_shadow)
+
+    controller.prepare_command(command)
+
+    assert controller.prepared.command is command
+    assert controller.SDR14.register_shadow == registers
+    # The whole buffer ring is allocated before the first acquisition
+    pool = controller.SDR14.buffer_pool
+    samples = controller.SDR14.acquisition_parameters.samples_per_record
+    assert len(pool.slots[(samples, 1)]) == pool.depth == controller.prepared.pipeline.capacity + 2
+    assert [stage.meter.name for stage in controller.prepared.pipeline.stages] == ["ddc", "plot", "save"]
+
+
+def test_run_uses_prepared_command(controller) -> None:
+    command = make_command()
+    controller.prepare_command(command)
+    prepared = controller.prepared
+    finished = []
+    controller.finished.connect(lambda: finished.append(True))
+
+    controller.run_command(command)
+
+    assert finished == [True]
+    assert controller.prepared is None
+    assert all(stage.meter.count == command.repeats for stage in prepared.pipeline.stages)
+    device = controller.SDR14
+    assert all(device.expected_register_value(reg_number, data, mask) == device.register_shadow[reg_number]
+               for reg_number, data, mask in prepared.register_writes)
+
+
+def test_failed_scans_are_skipped(controller) -> None:
+    command = make_command()
+    command.repeats = 3
+    controller.prepare_command(command)
+    prepared = controller.prepared
+    # Both attempts at the second scan fail
+    device = controller.SDR14
+    acquire_records = device.acquire_records
+    calls = []
+
+    def failing_acquire_records():
+        calls.append(None)
+        return None if len(calls) in (2, 3) else acquire_records()
+
+    device.acquire_records = failing_acquire_records
+
+    controller.run_command(command)
+
+    assert len(calls) == 4
+    assert controller.frame_ring.acquired == 2
+    assert all(stage.meter.count == 2 for stage in prepared.pipeline.stages)
@@ -0,0 +1,131 @@
+import ctypes as ct
+
+import numpy as np
+
+
+class RecordBuffers:
+    """
+    ctypes target buffers for one MultiRecord transfer from the SDR14, together with zero-copy NumPy views of them.
+    """
+
+    def __init__(self, samples_per_record: int, num_of_records: int, max_channels: int = 2) -> None:
+        self.samples_per_record = samples_per_record
+        self.num_of_records = num_of_records
+
+        # One contiguous block for all channels, so reductions over records cover both channels in one call
+        samples_per_channel = samples_per_record * num_of_records
+        self.block = (ct.c_int16 * (max_channels * samples_per_channel))()
+        record_type = ct.c_int16 * samples_per_record * num_of_records
+        channel_arrays = [record_type.from_buffer(self.block, ch * samples_per_channel * ct.sizeof(ct.c_int16))
+                          for ch in range(max_channels)]
+        self.target_buffers = (ct.POINTER(record_type) * max_channels)(*[ct.pointer(arr) for arr in channel_arrays])
+
+        # View of shape (max_channels, num_of_records, samples_per_record) and one view per channel
+        self.records = np.frombuffer(self.block, dtype=np.int16).reshape(max_channels, num_of_records,
+                                                                         samples_per_record)
+        self.channels = list(self.records)
+
+        # Outputs for record reductions
+        self.sums = np.zeros((max_channels, samples_per_record), dtype=np.int64)
+        self.means = np.zeros((max_channels, samples_per_record))
+
+    def sum_records(self) -> np.ndarray:
+        """
+        Sums all records of all channels in a single reduction.
+        :return: int64 array of shape (max_channels, samples_per_record), reused between calls.
+        """
+        return np.sum(self.records, axis=1, dtype=np.int64, out=self.sums)
+
+    def average_records(self) -> np.ndarray:
+        """
+        Averages all records of all channels.
+        :return: float64 array of shape (max_channels, samples_per_record), reused between calls.
+        """
+        return np.divide(self.sum_records(), self.num_of_records, out=self.means)
+
+    @property
+    def buffer_size(self) -> int:
+        """
+        Number of samples per channel buffer, as passed to ADQ_GetData.
+        """
+        return self.samples_per_record * self.num_of_records
+
+    @property
+    def nbytes(self) -> int:
+        return self.records.nbytes + self.sums.nbytes + self.means.nbytes
+
+
+class RecordBufferPool:
+    """
+    Pool of RecordBuffers keyed by (samples_per_record, num_of_records), reused across repeats and commands.
+
+    Buffers for each key are handed out round-robin from a ring of 'depth' slots, allocated on first use. Views
+    returned from a slot stay valid until the ring wraps round to that slot again, so consumers on other threads must
+    have finished with a frame within 'depth' acquisitions.
+    """
+
+    def __init__(self, depth: int = 4) -> None:
+        self.depth = depth
+        self.slots = {}
+        self.next_slot = {}
+
+    def get(self, samples_per_record: int, num_of_records: int) -> RecordBuffers:
+        """
+        Returns the next buffer set for the given record shape, allocating it if the ring is not yet full.
+        :param samples_per_record: Samples per record.
+        :param num_of_records: Number of records.
+        :return: RecordBuffers
+        """
+        key = (samples_per_record, num_of_records)
+        slots = self.slots.setdefault(key, [])
+        index = self.next_slot.get(key, 0)
+
+        if index == len(slots):
+            slots.append(RecordBuffers(samples_per_record, num_of_records))
+        self.next_slot[key] = (index + 1) % self.depth
+
+        return slots[index]
+
+    def release(self, buffers: RecordBuffers) -> None:
+        """
+        Hands back the buffer set returned by the last get() for its shape, e.g. after a failed transfer, so the next
+        get() reuses it instead of moving on round the ring.
+        :param buffers: Buffer set from the last get().
+        :return:
+        """
+        key = (buffers.samples_per_record, buffers.num_of_records)
+        index = (self.next_slot[key] - 1) % self.depth
+        slots = self.slots[key]
+        if index < len(slots) and slots[index] is buffers:
+            self.next_slot[key] = index
+
+    def reserve(self, depth: int) -> None:
+        """
+        Grows the ring so that at least 'depth' frames can be in use at once.
+        :param depth: Minimum ring depth.
+        :return:
+        """
+        self.depth = max(self.depth, depth)
+
+    def preallocate(self, samples_per_record: int, num_of_records: int) -> None:
+        """
+        Allocates the whole ring for a record shape now, so the first acquisitions don't pay for it.
+        :param samples_per_record: Samples per record.
+        :param num_of_records: Number of records.
+        :return:
+        """
+        slots = self.slots.setdefault((samples_per_record, num_of_records), [])
+        while len(slots) < self.depth:
+            slots.append(RecordBuffers(samples_per_record, num_of_records))
+
+    def clear(self) -> None:
+        """
+        Releases all pooled buffers.
+        :return:
+        """
+        self.slots.clear()
+        self.next_slot.clear()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buf.nbytes for slots in self.slots.values() for buf in slots)
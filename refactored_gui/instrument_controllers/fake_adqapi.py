@@ -0,0 +1,430 @@
+import time
+import ctypes as ct
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class FakeSDR14Timing:
+    """
+    Timing model used by the simulated SDR14. All times are in seconds, rates in samples or bytes per second.
+    With realtime=False no delays are modelled and triggered MultiRecord acquisitions complete immediately.
+    """
+    sample_rate: float = 800e6
+    call_latency: float = 5e-6
+    register_latency: float = 40e-6
+    transfer_rate: float = 1.2e9
+    transfer_setup: float = 150e-6
+    trigger_latency: float = 2e-6
+    rearm_time: float = 1e-6
+    realtime: bool = True
+
+
+class _APIFunction:
+    """
+    Callable wrapper mimicking a ctypes foreign function, so that restype/argtypes can be assigned as with a real CDLL.
+    """
+
+    def __init__(self, name: str, func) -> None:
+        self.__name__ = name
+        self.func = func
+        self.restype = ct.c_int
+        self.argtypes = None
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        return self.func(*args)
+
+
+class FakeADQAPI:
+    """
+    Pure-Python stand-in for ADQAPI.dll. Can be passed to SDR14 or ADQ_tools_lite.sdr14 in place of the loaded library
+    to run the acquisition code paths without hardware.
+    """
+
+    def __init__(self, timing: FakeSDR14Timing | None = None, num_sdr14: int = 1, seed: int = 0) -> None:
+        self.device = SimulatedSDR14(timing, num_sdr14, seed)
+
+    def __getattr__(self, name: str) -> _APIFunction:
+        func = getattr(self.device, name, None) if name.startswith(("ADQ", "CreateADQ", "DeleteADQ")) else None
+        if func is None:
+            raise AttributeError(f"function '{name}' not found")
+
+        api_function = _APIFunction(name, func)
+        self.__dict__[name] = api_function
+
+        return api_function
+
+    def call_counts(self) -> dict[str, int]:
+        """
+        Returns the number of calls made to each API function so far.
+        :return: dict of function name -> number of calls
+        """
+        return {k: v.calls for k, v in self.__dict__.items() if isinstance(v, _APIFunction)}
+
+    def reset_call_counts(self) -> None:
+        """
+        Resets all API call counters to 0.
+        :return:
+        """
+        for v in self.__dict__.values():
+            if isinstance(v, _APIFunction):
+                v.calls = 0
+
+
+def _value(arg) -> int:
+    """
+    Returns the Python value of a ctypes scalar, or the argument itself.
+    """
+    return arg.value if isinstance(arg, ct._SimpleCData) else arg
+
+
+def _deref(arg):
+    """
+    Returns the ctypes object referenced by a byref() or pointer() argument.
+    """
+    return arg._obj if hasattr(arg, "_obj") else arg.contents
+
+
+def _int16_view(pointer, length: int) -> np.ndarray:
+    """
+    Returns a writable int16 view of length samples at the address held by a ctypes pointer.
+    """
+    address = ct.cast(pointer, ct.c_void_p).value
+    return np.frombuffer((ct.c_int16 * length).from_address(address), dtype=np.int16)
+
+
+class SimulatedSDR14:
+    """
+    Behavioural model of a single SDR14 behind an ADQ control unit.
+
+    MultiRecord: writing 1 to user register 0 while the trigger is armed starts the pulse sequence. The sequence is
+    repeated with a period equal to the sum of the pulse/gap/rec registers (2-7, in ns), each repetition triggering one
+    record, so ADQ_GetAcquiredAll becomes true once num_of_records periods have elapsed.
+
+    Streaming: data is produced at sample_rate / sample_skip per channel from ADQ_StartStreaming onwards, so filled
+    transfer buffers accumulate at the card's real rate and overflow if they are not collected fast enough.
+    """
+
+    num_registers = 16
+    memory_bytes = 2 ** 30
+    revision = 32400
+
+    def __init__(self, timing: FakeSDR14Timing | None = None, num_sdr14: int = 1, seed: int = 0) -> None:
+        self.timing = timing if timing is not None else FakeSDR14Timing()
+        self.num_sdr14 = num_sdr14
+        self.rng = np.random.default_rng(seed)
+        self.busy_until = 0.0
+
+        self.registers = [0] * self.num_registers
+        self.clock_source = 0
+        self.trigger_mode = 1
+        self.trigger_delay = 0
+        self.pretrigger = 0
+
+        # MultiRecord state
+        self.mr_setup = None
+        self.armed = False
+        self.acq_start = None
+
+        # Streaming state
+        self.nof_buffers = 8
+        self.samples_per_buffer = 1024
+        self.sample_skip = 1
+        self.stream_status = 0
+        self.stream_start = None
+        self.pages_collected = 0
+        self.overflow = 0
+        self.page = None
+
+        # Noise bank sliced at random offsets to avoid generating fresh noise for every record
+        self.noise = np.round(self.rng.standard_normal(2 ** 20) * 40).astype(np.int16)
+        self.echo_cache = {}
+
+    # Timing helpers
+    def spend(self, duration: float) -> None:
+        """
+        Blocks for the modelled duration of an operation. Operations are serialised as on the real PCIe link.
+        """
+        if not self.timing.realtime:
+            return
+
+        now = time.perf_counter()
+        deadline = max(now, self.busy_until) + duration
+        self.busy_until = deadline
+
+        remaining = deadline - now
+        if remaining > 1e-3:
+            time.sleep(remaining - 5e-4)
+        while time.perf_counter() < deadline:
+            pass
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def sequence_period(self) -> float:
+        """
+        Returns the repetition period of the programmed pulse sequence, never shorter than one record.
+        """
+        record_time = 0.0
+        if self.mr_setup is not None:
+            record_time = self.mr_setup[1] / self.timing.sample_rate
+        sequence_time = sum(self.registers[2:8]) * 1e-9
+
+        return max(sequence_time, record_time + self.timing.rearm_time)
+
+    def records_acquired(self) -> int:
+        if self.acq_start is None or self.mr_setup is None:
+            return 0
+        if not self.timing.realtime:
+            return self.mr_setup[0]
+        elapsed = self.now() - self.acq_start
+        if elapsed < 0:
+            return 0
+
+        return min(self.mr_setup[0], int(elapsed / self.sequence_period()))
+
+    def synthesise(self, out: np.ndarray, channel: int, nof_samples: int) -> None:
+        """
+        Fills out with spin echo records at the register 1 frequency plus noise.
+        """
+        key = (nof_samples, self.registers[1], channel)
+        if key not in self.echo_cache:
+            t = np.arange(nof_samples) / self.timing.sample_rate
+            f = self.registers[1] % self.timing.sample_rate
+            t_echo = t[nof_samples // 2]
+            envelope = 2000 * np.exp(-np.abs(t - t_echo) / (nof_samples / self.timing.sample_rate / 10))
+            self.echo_cache[key] = (envelope * np.cos(2 * np.pi * f * t + channel * np.pi / 2)).astype(np.int16)
+        echo = self.echo_cache[key]
+        if self.noise.size < 2 * nof_samples:
+            self.noise = np.round(self.rng.standard_normal(2 * nof_samples) * 40).astype(np.int16)
+
+        records = out.reshape(-1, nof_samples)
+        for record in records:
+            offset = self.rng.integers(0, self.noise.size - nof_samples)
+            np.add(echo, self.noise[offset:offset + nof_samples], out=record)
+
+    # Control unit
+    def CreateADQControlUnit(self) -> int:
+        self.spend(self.timing.call_latency)
+        return 0x5D14
+
+    def DeleteADQControlUnit(self, cu) -> int:
+        return 1
+
+    def ADQControlUnit_FindDevices(self, cu) -> int:
+        self.spend(self.timing.call_latency)
+        return self.num_sdr14
+
+    def ADQControlUnit_NofADQ(self, cu) -> int:
+        return self.num_sdr14
+
+    def ADQControlUnit_NofSDR14(self, cu) -> int:
+        return self.num_sdr14
+
+    def ADQControlUnit_EnableErrorTrace(self, cu, level, directory) -> int:
+        return 1
+
+    # Device info
+    def ADQAPI_GetRevision(self) -> int:
+        return self.revision
+
+    def ADQ_GetRevision(self, cu, device) -> int:
+        return 0
+
+    def ADQ_GetADQType(self, cu, device) -> int:
+        return 14
+
+    def ADQ_GetBoardSerialNumber(self, cu, device) -> bytes:
+        return b"SIM00001"
+
+    def ADQ_GetBoardProductName(self, cu, device) -> bytes:
+        return b"SDR14"
+
+    def ADQ_GetTemperature(self, cu, device, sensor) -> int:
+        return 45 * 256
+
+    # User registers
+    def ADQ_WriteUserRegister(self, cu, device, target, reg_number, mask, data, retval) -> int:
+        self.spend(self.timing.register_latency)
+
+        reg_number, mask, data = _value(reg_number), _value(mask), _value(data)
+        if not 0 <= reg_number < self.num_registers:
+            return 0
+
+        old = self.registers[reg_number]
+        new = ((old & mask) | (data & ~mask)) & 0xFFFFFFFF
+        self.registers[reg_number] = new
+        _deref(retval).value = new
+
+        # Enabling the device starts the pulse sequence, which triggers the armed MultiRecord acquisition
+        if reg_number == 0 and new & 1 and not old & 1 and self.armed and self.trigger_mode != 1:
+            self.acq_start = self.now() + self.timing.trigger_latency
+
+        return 1
+
+    # Acquisition setup
+    def ADQ_SetClockSource(self, cu, device, clock_source) -> int:
+        self.spend(self.timing.call_latency)
+        self.clock_source = _value(clock_source)
+        return 1
+
+    def ADQ_SetTriggerMode(self, cu, device, trigger_mode) -> int:
+        self.spend(self.timing.call_latency)
+        self.trigger_mode = _value(trigger_mode)
+        return 1 if self.trigger_mode in (1, 2, 3, 4) else 0
+
+    def ADQ_SetExternTrigEdge(self, cu, device, edge) -> int:
+        self.spend(self.timing.call_latency)
+        return 1
+
+    def ADQ_SetPreTrigSamples(self, cu, device, samples) -> int:
+        self.spend(self.timing.call_latency)
+        self.pretrigger = _value(samples)
+        return 1
+
+    def ADQ_SetTriggerDelay(self, cu, device, samples) -> int:
+        self.spend(self.timing.call_latency)
+        self.trigger_delay = _value(samples)
+        return 1
+
+    # MultiRecord
+    def ADQ_MultiRecordSetup(self, cu, device, num_of_records, samples_per_record) -> int:
+        self.spend(self.timing.register_latency)
+        num_of_records, samples_per_record = _value(num_of_records), _value(samples_per_record)
+        if num_of_records <= 0 or samples_per_record <= 0:
+            return 0
+        if num_of_records * samples_per_record * 2 * 2 > self.memory_bytes:
+            return 0
+
+        self.mr_setup = (num_of_records, samples_per_record)
+        self.acq_start = None
+        return 1
+
+    def ADQ_MultiRecordClose(self, cu, device) -> int:
+        self.spend(self.timing.call_latency)
+        self.mr_setup = None
+        self.acq_start = None
+        return 1
+
+    def ADQ_ArmTrigger(self, cu, device) -> int:
+        self.spend(self.timing.call_latency)
+        if self.mr_setup is None:
+            return 0
+        self.armed = True
+        self.acq_start = None
+        return 1
+
+    def ADQ_DisarmTrigger(self, cu, device) -> int:
+        self.spend(self.timing.call_latency)
+        self.armed = False
+        return 1
+
+    def ADQ_SWTrig(self, cu, device) -> int:
+        self.spend(self.timing.call_latency)
+        if not self.armed or self.mr_setup is None:
+            return 0
+        if self.acq_start is None:
+            self.acq_start = self.now() + self.timing.trigger_latency
+        return 1
+
+    def ADQ_GetAcquired(self, cu, device) -> int:
+        self.spend(self.timing.call_latency)
+        return int(self.records_acquired() > 0)
+
+    def ADQ_GetAcquiredRecords(self, cu, device) -> int:
+        self.spend(self.timing.call_latency)
+        return self.records_acquired()
+
+    def ADQ_GetAcquiredAll(self, cu, device) -> int:
+        self.spend(self.timing.call_latency)
+        return int(self.mr_setup is not None and self.records_acquired() == self.mr_setup[0])
+
+    def ADQ_GetData(self, cu, device, target_buffers, buffer_size, bytes_per_sample, start_record, nof_records,
+                    channel_mask, start_sample, nof_samples, transfer_mode) -> int:
+        nof_records, nof_samples = _value(nof_records), _value(nof_samples)
+        start_record, channel_mask = _value(start_record), _value(channel_mask)
+
+        if self.mr_setup is None or start_record + nof_records > self.records_acquired():
+            return 0
+        if nof_records * nof_samples > _value(buffer_size):
+            return 0
+
+        channels = [ch for ch in range(2) if channel_mask & (1 << ch)]
+        self.spend(self.timing.transfer_setup +
+                   len(channels) * nof_records * nof_samples * 2 / self.timing.transfer_rate)
+
+        for ch in channels:
+            self.synthesise(_int16_view(target_buffers[ch], nof_records * nof_samples), ch, nof_samples)
+
+        return 1
+
+    # Streaming
+    def ADQ_SetTransferBuffers(self, cu, device, nof_buffers, samples_per_buffer) -> int:
+        self.spend(self.timing.call_latency)
+        self.nof_buffers, self.samples_per_buffer = _value(nof_buffers), _value(samples_per_buffer)
+        return 1
+
+    def ADQ_SetSampleSkip(self, cu, device, sample_skip) -> int:
+        self.spend(self.timing.call_latency)
+        self.sample_skip = max(1, _value(sample_skip))
+        return 1
+
+    def ADQ_SetStreamStatus(self, cu, device, status) -> int:
+        self.spend(self.timing.call_latency)
+        self.stream_status = _value(status)
+        return 1
+
+    def ADQ_StartStreaming(self, cu, device) -> int:
+        self.spend(self.timing.call_latency)
+        if not self.stream_status:
+            return 0
+        self.page = (ct.c_int16 * self.samples_per_buffer)()
+        self.stream_start = self.now()
+        self.pages_collected = 0
+        self.overflow = 0
+        return 1
+
+    def ADQ_StopStreaming(self, cu, device) -> int:
+        self.spend(self.timing.call_latency)
+        self.stream_start = None
+        return 1
+
+    def pages_pending(self) -> int:
+        if self.stream_start is None:
+            return 0
+        # Both channels share a transfer buffer
+        bytes_per_second = 2 * 2 * self.timing.sample_rate / self.sample_skip
+        pages_produced = int((self.now() - self.stream_start) * bytes_per_second / (self.samples_per_buffer * 2))
+        pending = pages_produced - self.pages_collected
+        if pending > self.nof_buffers:
+            # Host fell behind, data lost
+            self.overflow = 1
+            self.pages_collected = pages_produced - self.nof_buffers
+            pending = self.nof_buffers
+
+        return pending
+
+    def ADQ_GetTransferBufferStatus(self, cu, device, filled_buffers) -> int:
+        self.spend(self.timing.call_latency)
+        _deref(filled_buffers).value = self.pages_pending()
+        return 1
+
+    def ADQ_GetStreamOverflow(self, cu, device) -> int:
+        return self.overflow
+
+    def ADQ_CollectDataNextPage(self, cu, device) -> int:
+        if self.pages_pending() == 0:
+            return 0
+        self.spend(self.timing.transfer_setup + self.samples_per_buffer * 2 / self.timing.transfer_rate)
+        half = self.samples_per_buffer // 2
+        page = np.frombuffer(self.page, dtype=np.int16)
+        self.synthesise(page[:half], 0, half)
+        self.synthesise(page[half:2 * half], 1, half)
+        self.pages_collected += 1
+        return 1
+
+    def ADQ_GetPtrStream(self, cu, device):
+        return ct.cast(self.page, ct.POINTER(ct.c_int16))
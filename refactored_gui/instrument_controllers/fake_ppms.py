@@ -0,0 +1,303 @@
+import math
+import time
+import logging
+import socket
+import threading
+import socketserver
+from dataclasses import dataclass
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FakePPMSModel:
+    """
+    Physical and timing model of the simulated PPMS. Temperatures are in K, fields in Oe, times in seconds of simulated
+    time, which runs 'speed' times faster than the wall clock. With realtime=False the query latency is not slept.
+    """
+    T_initial: float = 300.0
+    H_initial: float = 0.0
+    # First-order lag of the sample temperature behind the (ramped) set point
+    time_constant: float = 20.0
+    T_tolerance: float = 0.05
+    # Time the temperature must stay within tolerance before the status is 'stable'
+    settle_time: float = 10.0
+    T_noise: float = 0.002
+    H_noise: float = 0.05
+    H_max: float = 90000.0
+    query_latency: float = 0.02
+    speed: float = 1.0
+    realtime: bool = True
+
+
+class SimulatedPPMS:
+    """
+    Behavioural model of a PPMS speaking the GPIB text protocol used by PPMS_GPIB:
+
+        TEMP <set point> <rate K/min> <approach>    ramp the set point, the sample follows with a first-order lag
+        FIELD <set point> <rate Oe/s> [...]         linear field ramp (driven mode)
+        GetDat? <mask>                              "mask,timestamp,values...;" for status (1), T (2) and H (4)
+
+    The status word uses the nibbles decoded by PPMS_GPIB.decode_state: temperature in bits 0-3 (1 stable, 2 tracking,
+    5 near, 6 chasing), field in bits 4-7 (4 stable driven, 6 charging, 7 discharging) and chamber in bits 8-11.
+    """
+
+    # Status codes
+    T_STABLE, T_TRACKING, T_NEAR, T_CHASING = 1, 2, 5, 6
+    H_STABLE_DRIVEN, H_CHARGING, H_DISCHARGING = 4, 6, 7
+    CHAMBER_PURGED_SEALED = 1
+
+    def __init__(self, model: FakePPMSModel | None = None, clock=None, seed: int = 0) -> None:
+        """
+        :param model: Model parameters.
+        :param clock: Returns the simulated time in seconds. Defaults to the wall clock scaled by model.speed.
+        :param seed: Seed of the measurement noise.
+        """
+        self.model = model if model is not None else FakePPMSModel()
+        if clock is None:
+            start = time.perf_counter()
+            clock = lambda: (time.perf_counter() - start) * self.model.speed
+        self.clock = clock
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.queries = 0
+
+        self.last_update = self.clock()
+        # Temperature: sample temperature, target and ramped set point
+        self.T = self.model.T_initial
+        self.T_target = self.model.T_initial
+        self.T_setpoint = self.model.T_initial
+        self.T_rate = 0.0
+        self.T_settled_since = self.last_update
+        # Field: current value, target and rate
+        self.H = self.model.H_initial
+        self.H_target = self.model.H_initial
+        self.H_rate = 0.0
+
+    def advance(self, now: float) -> None:
+        """
+        Integrates the model up to 'now'.
+        """
+        dt = now - self.last_update
+        if dt <= 0:
+            return
+
+        # Sub-steps short against the time constant, with an exact exponential update per step
+        steps = max(1, math.ceil(dt / (0.1 * self.model.time_constant)))
+        h = dt / steps
+        decay = 1 - math.exp(-h / self.model.time_constant)
+        for step in range(steps):
+            ramp = self.T_rate / 60 * h
+            if abs(self.T_target - self.T_setpoint) <= ramp:
+                self.T_setpoint = self.T_target
+            else:
+                self.T_setpoint += math.copysign(ramp, self.T_target - self.T_setpoint)
+            self.T += (self.T_setpoint - self.T) * decay
+            if abs(self.T - self.T_target) > self.model.T_tolerance or self.T_setpoint != self.T_target:
+                self.T_settled_since = self.last_update + (step + 1) * h
+
+        ramp = self.H_rate * dt
+        if abs(self.H_target - self.H) <= ramp:
+            self.H = self.H_target
+        else:
+            self.H += math.copysign(ramp, self.H_target - self.H)
+
+        self.last_update = now
+
+    def temperature_status(self, now: float) -> int:
+        if self.T_setpoint != self.T_target:
+            return self.T_TRACKING
+        if abs(self.T - self.T_target) > self.model.T_tolerance:
+            return self.T_CHASING
+        if now - self.T_settled_since < self.model.settle_time:
+            return self.T_NEAR
+        return self.T_STABLE
+
+    def field_status(self) -> int:
+        if self.H == self.H_target:
+            return self.H_STABLE_DRIVEN
+        return self.H_CHARGING if abs(self.H_target) > abs(self.H) else self.H_DISCHARGING
+
+    def status(self, now: float) -> int:
+        return self.temperature_status(now) | self.field_status() << 4 | self.CHAMBER_PURGED_SEALED << 8
+
+    def handle(self, command: str) -> str | None:
+        """
+        Executes one command.
+        :param command: Command text, with or without terminator.
+        :return: Response for queries, None for writes.
+        """
+        words = command.strip().rstrip(";").split()
+        if not words:
+            return None
+        name = words[0].upper()
+
+        with self.lock:
+            now = self.clock()
+            self.advance(now)
+
+            if name == "TEMP":
+                set_point, rate = float(words[1]), float(words[2])
+                self.T_target, self.T_rate = set_point, rate
+                self.T_settled_since = now
+                return None
+            if name == "FIELD":
+                set_point, rate = float(words[1]), float(words[2])
+                if abs(set_point) > self.model.H_max:
+                    raise ValueError(f"Field {set_point} Oe out of range")
+                self.H_target, self.H_rate = set_point, rate
+                return None
+            if name == "GETDAT?":
+                self.queries += 1
+                return self.get_data(int(words[1]), now)
+            if name == "*IDN?":
+                return "QUANTUM DESIGN,PPMS SIMULATOR,0,1.0;"
+
+        raise ValueError(f"Unknown PPMS command: {command!r}")
+
+    def get_data(self, mask: int, now: float) -> str:
+        values = []
+        for bit in range(mask.bit_length()):
+            channel = 1 << bit
+            if not mask & channel:
+                continue
+            if channel == 1:
+                values.append(str(self.status(now)))
+            elif channel == 2:
+                values.append(f"{self.T + self.rng.normal(0, self.model.T_noise):.4f}")
+            elif channel == 4:
+                values.append(f"{self.H + self.rng.normal(0, self.model.H_noise):.2f}")
+            else:
+                values.append("0")
+
+        return ",".join([str(mask), f"{now:.3f}", *values]) + ";"
+
+
+class SimulatedPPMSResource:
+    """
+    pyvisa-like message based resource backed by a SimulatedPPMS, for PPMS_GPIB(resource=...). Every query costs
+    model.query_latency, as a GPIB round trip would.
+    """
+
+    def __init__(self, simulator: SimulatedPPMS | None = None) -> None:
+        self.simulator = simulator if simulator is not None else SimulatedPPMS()
+        self.write_termination = ""
+        self.read_termination = ""
+        self.timeout = 2000
+        self.response = None
+
+    def spend(self) -> None:
+        if self.simulator.model.realtime and self.simulator.model.query_latency > 0:
+            time.sleep(self.simulator.model.query_latency)
+
+    def write(self, command: str) -> int:
+        self.response = self.simulator.handle(command)
+        return len(command)
+
+    def read(self) -> str:
+        if self.response is None:
+            raise TimeoutError("No response pending")
+        response, self.response = self.response, None
+        return response
+
+    def query(self, command: str) -> str:
+        self.spend()
+        self.write(command)
+        return self.read()
+
+    def close(self) -> None:
+        pass
+
+
+class PPMSSimulatorServer(socketserver.ThreadingTCPServer):
+    """
+    Serves a SimulatedPPMS over TCP, one command per line, each query answered with one line. Connect with
+    PPMSSocketResource, or with a pyvisa "TCPIP::<host>::<port>::SOCKET" resource with '\\n' terminations.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, simulator: SimulatedPPMS | None = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        """
+        :param simulator: Simulated instrument shared by all connections.
+        :param host: Interface to listen on.
+        :param port: TCP port, 0 to pick a free one (see address).
+        """
+        self.simulator = simulator if simulator is not None else SimulatedPPMS()
+        self.resource = SimulatedPPMSResource(self.simulator)
+        super().__init__((host, port), _PPMSRequestHandler)
+        self.thread = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.server_address[:2]
+
+    def start(self) -> None:
+        """
+        Serves on a background thread.
+        :return:
+        """
+        self.thread = threading.Thread(target=self.serve_forever, name="ppms-simulator", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+class _PPMSRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            command = line.decode().strip()
+            if not command:
+                continue
+            self.server.resource.spend()
+            try:
+                response = self.server.simulator.handle(command)
+            except (ValueError, IndexError) as ex:
+                # Only queries are answered, a reply to a write would be read as the answer to the next query
+                if not command.split()[0].endswith("?"):
+                    logger.error(f"PPMS simulator rejected {command!r}: {ex}")
+                    continue
+                response = f"ERROR,{ex};"
+            if response is not None:
+                self.wfile.write(f"{response}\n".encode())
+
+
+class PPMSSocketResource:
+    """
+    pyvisa-like resource talking to a PPMSSimulatorServer (or any line based PPMS bridge) over TCP.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 2.0) -> None:
+        self.socket = socket.create_connection((host, port), timeout=timeout)
+        self.file = self.socket.makefile("rwb")
+        self.write_termination = ""
+        self.read_termination = ""
+
+    def write(self, command: str) -> int:
+        self.file.write(f"{command}\n".encode())
+        self.file.flush()
+        return len(command)
+
+    def read(self) -> str:
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("PPMS connection closed")
+        return line.decode().rstrip("\n")
+
+    def query(self, command: str) -> str:
+        self.write(command)
+        return self.read()
+
+    def close(self) -> None:
+        self.file.close()
+        self.socket.close()
@@ -1,58 +1,175 @@
-import pyvisa
 import time
+import threading
 import numpy as np
 import matplotlib.pyplot as plt
 
+from refactored_gui.instrument_controllers.stability import StabilityDetector
+
+try:
+    import pyvisa
+except ImportError:
+    pyvisa = None
+
+
+# GetDat? channel bits, values are returned in order of increasing bit
+STATUS = 1
+TEMPERATURE = 2
+FIELD = 4
+
+
+def parse_get_data(response: str) -> tuple[float, dict[int, float]]:
+    """
+    Parses a GetDat? response "mask,timestamp,value,...;" in one pass.
+    :param response: Response string.
+    :return: (PPMS timestamp in s, {channel bit: value}).
+    """
+    fields = response.strip().rstrip(";").split(",")
+    mask = int(fields[0])
+    channels = [1 << bit for bit in range(mask.bit_length()) if mask & (1 << bit)]
+    if len(fields) - 2 != len(channels):
+        raise ValueError(f"GetDat? response {response!r} does not match bitmask {mask}")
+
+    return float(fields[1]), {channel: float(value) for channel, value in zip(channels, fields[2:])}
+
 
 class PPMS_GPIB:
 
-    def __init__(self, debug_mode: bool = False) -> None:
+    # Default stability thresholds for set_temperature and set_field: the tolerance about the set point is the larger
+    # of an absolute and a relative band, judged over an averaging window in s
+    T_TOLERANCE = 0.05
+    T_RELATIVE_TOLERANCE = 5e-4
+    T_WINDOW = 10.0
+    H_TOLERANCE = 1.0
+    H_RELATIVE_TOLERANCE = 1e-4
+    H_WINDOW = 5.0
+    # Status nibbles at the set point: temperature stable or near, field stable persistent or driven
+    T_SETTLED = {1, 5}
+    H_SETTLED = {1, 4}
+    # Status nibbles of the instrument's own stable verdict, trusted once held for STABLE_FALLBACK_WINDOWS windows
+    T_STABLE = {1}
+    H_STABLE = {1, 4}
+    STABLE_FALLBACK_WINDOWS = 3
+
+    def __init__(self, debug_mode: bool = False, resource=None, address: str = "GPIB0::15::INSTR") -> None:
+        """
+        :param debug_mode: Print and plot the state while setting T or H.
+        :param resource: Open message based resource (query/write), e.g. a SimulatedPPMSResource. If None, the
+            instrument at 'address' is opened with pyvisa.
+        :param address: VISA address of the PPMS.
+        """
         self.debug_mode = debug_mode
-        self.rm = pyvisa.ResourceManager()
-        self.ppms = self.rm.open_resource("GPIB0::15::INSTR")
+        if resource is None:
+            if pyvisa is None:
+                raise ImportError("pyvisa is required to connect to the PPMS, install it or pass a resource")
+            self.rm = pyvisa.ResourceManager()
+            resource = self.rm.open_resource(address)
+        self.ppms = resource
         self.ppms.write_termination = ""
         self.ppms.read_termination = ""
+        # The resource is shared with the conditions sampler thread
+        self.lock = threading.RLock()
 
 
-            
-    def get_current_conditions(self) -> [float, float]:
-        return self.get_temperature(), self.get_field()
+    def query(self, command: str) -> str:
+        with self.lock:
+            return self.ppms.query(command)
 
-    def set_temperature(self, set_temp: float, rate: float) -> None:
+    def write(self, command: str) -> None:
+        with self.lock:
+            self.ppms.write(command)
 
-        self.ppms.write(f"TEMP {set_temp} {rate} 0")
+    def get_data(self, mask: int) -> tuple[float, dict[int, float]]:
+        """
+        Reads several GetDat? channels in a single transaction.
+        :param mask: Sum of channel bits, e.g. TEMPERATURE | FIELD.
+        :return: (PPMS timestamp in s, {channel bit: value}).
+        """
+        return parse_get_data(self.query(f"GetDat? {mask}"))
+
+    def get_current_conditions(self) -> [float, float]:
+        _, data = self.get_data(TEMPERATURE | FIELD)
+        return data[TEMPERATURE], data[FIELD]
+
+    def wait_until_stable(self, channel: int, detector: StabilityDetector, settled_states: set[int],
+                          stable_states: set[int], timeout: float | None = None,
+                          sleep=None) -> tuple[bool, list[float], list[float], list[int]]:
+        """
+        Polls one channel and the status word until the detector reports the value stable, polling quickly near the
+        set point and slowly during long ramps.
+
+        Readings can sit outside the detector's band while the instrument is settled (e.g. a persistent field offset
+        or noisy thermometry), so the instrument's own stable status is accepted once it has held for
+        STABLE_FALLBACK_WINDOWS detector windows.
+        :param channel: TEMPERATURE or FIELD.
+        :param detector: Detector holding the set point and thresholds.
+        :param settled_states: Status nibbles meaning the instrument is at its set point.
+        :param stable_states: Status nibbles of the instrument's own stable verdict.
+        :param timeout: Seconds (PPMS clock) to wait before giving up, None to wait until stable.
+        :param sleep: Waits between polls, time.sleep by default.
+        :return: (stable, timestamps, values, states), stable False if the timeout expired.
+        """
+        key = 'temp' if channel == TEMPERATURE else 'field'
+        unit = 'K' if channel == TEMPERATURE else 'Oe'
 
-        # Log temperature as function of time
         timestamps = []
-        temp = []
-        state = []
-
-        # Measure
-        temp_status = 0
-        while temp_status != 1:
-            # Get temp info and print
-            temp_info = self.ppms.query("GetDat? 2")
-            t = temp_info.split(",")[1]
-            T = temp_info.split(",")[2][:-1]
-
-            print()
-            print(f"Timestamp: {t}s")
-            print(f"Temperature: {T}K")
-            print()
-
-            # Check temp state
-            system_status = self.ppms.query("GetDat? 1")
-            system_state = int(system_status.split(",")[-1][:-1])
-            temp_status = self.decode_state(system_state)['temp']
-            print(f"Temp status = {temp_status}")
+        values = []
+        states = []
+        stable_since = None
+        while True:
+            # Get the value and status in one query
+            t, data = self.get_data(STATUS | channel)
+            status = self.decode_state(int(data[STATUS]))[key]
+            detector.add(t, data[channel], status in settled_states)
 
             timestamps.append(t)
-            temp.append(T)
-            state.append(temp_status)
-
-            time.sleep(1)
-
-        print(f"Temperature stabilised at {set_temp}")
+            values.append(data[channel])
+            states.append(status)
+
+            if detector.stable():
+                return True, timestamps, values, states
+
+            if status not in stable_states:
+                stable_since = None
+            elif stable_since is None:
+                stable_since = t
+            elif t - stable_since >= self.STABLE_FALLBACK_WINDOWS * detector.window:
+                print(f"PPMS reports {key} stable at {data[channel]}{unit}, outside the tolerance of "
+                      f"{detector.tolerance}{unit} about {detector.set_point}{unit}")
+                return True, timestamps, values, states
+
+            if timeout is not None and t - timestamps[0] >= timeout:
+                print(f"{key} not stable at {detector.set_point}{unit} after {timeout}s, "
+                      f"last reading {data[channel]}{unit}, status = {status}")
+                return False, timestamps, values, states
+
+            if self.debug_mode:
+                eta = detector.eta()
+                print(f"Timestamp: {t}s, {key}: {data[channel]}{unit}, status = {status}, "
+                      f"ETA: {'unknown' if eta is None else f'{eta:.0f}s'}")
+
+            (sleep or time.sleep)(detector.next_interval())
+
+    def set_temperature(self, set_temp: float, rate: float, tolerance: float | None = None,
+                        timeout: float | None = None) -> bool:
+        """
+        Sets the temperature and waits until it is stable.
+        :param set_temp: Set point in K.
+        :param rate: Rate in K/min.
+        :param tolerance: Accepted deviation in K, by default T_TOLERANCE or T_RELATIVE_TOLERANCE of the set point.
+        :param timeout: Seconds to wait for stability, None to wait until stable.
+        :return: True if stable, False if the timeout expired.
+        """
+
+        self.write(f"TEMP {set_temp} {rate} 0")
+
+        if tolerance is None:
+            tolerance = max(self.T_TOLERANCE, self.T_RELATIVE_TOLERANCE * abs(set_temp))
+        detector = StabilityDetector(set_temp, tolerance, window=self.T_WINDOW)
+        stable, timestamps, temp, state = self.wait_until_stable(TEMPERATURE, detector, self.T_SETTLED,
+                                                                 self.T_STABLE, timeout)
+
+        if stable:
+            print(f"Temperature stabilised at {set_temp}")
         
         if self.debug_mode:
             
@@ -71,89 +188,61 @@ class PPMS_GPIB:
             plt.title("Temperature status as function of time")
             plt.xlabel("Time (s)")
             plt.ylabel("Temperature status")
-        
+
+        return stable
 
     def get_temperature(self) -> float:
 
-        temp_info = self.ppms.query("GetDat? 2")
-        T = float(temp_info.split(",")[2][:-1])
+        _, data = self.get_data(TEMPERATURE)
 
-        return T
+        return data[TEMPERATURE]
     
 
-    def set_field(self, set_field: float, rate: float) -> None:
-        
-        time.sleep(10)
-        self.ppms.write(f"FIELD {set_field} {rate}")
-        
-        
-        for i in range(10):
-            
-            
-            system_status = self.ppms.query("GetDat? 1")
-            system_state = int(system_status.split(",")[-1][:-1])
-            self.decode_state(system_state)
-            
-            time.sleep(1)
-        
-        
-        #time.sleep(20)
-        #print(self.ppms.query("GETDAT? 4"))
-        
-        """# Log field as function of time
-        timestamps = []
-        field = []
-        state = []
-
-        # Measure
-        field_status = 0
-        i = 0
-        while i < 10:
-            # Get temp info and print
-            field_info = self.ppms.query("GetDat? 4")
-            t = field_info.split(",")[1]
-            H = field_info.split(",")[2][:-1]
-
-            print()
-            print(f"Timestamp: {t}s")
-            print(f"Field: {H}Oe")
-            print()
-
-            # Check field state
-            system_status = self.ppms.query("GetDat? 1")
-            system_state = int(system_status.split(",")[-1][:-1])
-            field_status = self.decode_state(system_state)['field']
-            print(f"Field status = {field_status}")
+    def set_field(self, set_field: float, rate: float, tolerance: float | None = None,
+                  timeout: float | None = None) -> bool:
+        """
+        Sets the field and waits until it is stable.
+        :param set_field: Set point in Oe.
+        :param rate: Rate in Oe/s.
+        :param tolerance: Accepted deviation in Oe, by default H_TOLERANCE or H_RELATIVE_TOLERANCE of the set point.
+        :param timeout: Seconds to wait for stability, None to wait until stable.
+        :return: True if stable, False if the timeout expired.
+        """
 
-            timestamps.append(t)
-            field.append(H)
-            state.append(field_status)
+        self.write(f"FIELD {set_field} {rate}")
 
-            time.sleep(3)
-            i += 1
+        if tolerance is None:
+            tolerance = max(self.H_TOLERANCE, self.H_RELATIVE_TOLERANCE * abs(set_field))
+        detector = StabilityDetector(set_field, tolerance, window=self.H_WINDOW)
+        stable, timestamps, field, state = self.wait_until_stable(FIELD, detector, self.H_SETTLED, self.H_STABLE,
+                                                                  timeout)
+
+        if stable:
+            print(f"Field stabilised at {set_field}Oe")
 
-        print(f"Field stabilised at {set_field}Oe")
-        
-        
         if self.debug_mode:
+
+            timestamps = np.array(timestamps)
+
             plt.figure()
-            plt.plot(timestamps, field)
+            plt.plot(timestamps - timestamps[0], field)
             plt.title("H as function of time")
             plt.xlabel("Time (s)")
             plt.ylabel("H (Oe)")
-            
+
             plt.figure()
-            plt.plot(timestamps, state)
+            plt.plot(timestamps - timestamps[0], state)
             plt.title("Field status as function of time")
             plt.xlabel("Time (s)")
-            plt.ylabel("Field status")"""
+            plt.ylabel("Field status")
+
+        return stable
         
 
     def get_field(self) -> float:
-        field_info = self.ppms.query("GetDat? 4")
-        H = float(field_info.split(",")[2][:-1])
+        _, data = self.get_data(FIELD)
 
-        return H
+        return data[FIELD]
 
 
     
@@ -0,0 +1,130 @@
+import time
+import logging
+import threading
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+
+class PPMSReading(NamedTuple):
+    timestamp: float
+    T: float
+    H: float
+
+
+class PPMSSampler:
+    """
+    Polls the PPMS temperature and field on a background thread, so NMR scans never wait on the instrument bus.
+
+    Readings are timestamped with the host clock (time.time(), the midpoint of the query) and kept in a short history.
+    The history is an immutable tuple replaced as a whole by the polling thread, so readers take no lock: latest() and
+    conditions_at() are a memory read plus, for the latter, an interpolation between the readings either side of the
+    requested time.
+    """
+
+    def __init__(self, read_conditions: Callable[[], tuple[float, float]], interval: float = 1.0, history: int = 64,
+                 logger: logging.Logger | None = None) -> None:
+        """
+        :param read_conditions: Returns (T, H) from the instrument. Called on the sampler thread only.
+        :param interval: Seconds between polls.
+        :param history: Number of readings kept for interpolation, at least 2.
+        :param logger: Logger for polling errors.
+        """
+        self.read_conditions = read_conditions
+        self.interval = interval
+        self.history_length = max(history, 2)
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+
+        self.history = ()
+        self.polls = 0
+        self.errors = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self) -> None:
+        if self.thread is not None and self.thread.is_alive():
+            return
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="ppms-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        Stops polling, waiting for a poll in progress to finish.
+        :param timeout: Seconds to wait for the thread.
+        :return:
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def run(self) -> None:
+        next_poll = time.monotonic()
+        while not self.stop_event.is_set():
+            self.poll()
+            # Fixed rate, however long the query took
+            next_poll += self.interval
+            delay = next_poll - time.monotonic()
+            if delay < 0:
+                next_poll = time.monotonic()
+                delay = 0
+            self.stop_event.wait(delay)
+
+    def poll(self) -> PPMSReading | None:
+        """
+        Takes one reading and adds it to the history.
+        :return: The reading, or None if the query failed.
+        """
+        start = time.time()
+        try:
+            T, H = self.read_conditions()
+        except Exception as ex:
+            self.errors += 1
+            self.logger.error(f"PPMS poll failed: {ex}")
+            return None
+        reading = PPMSReading((start + time.time()) / 2, T, H)
+
+        # Publish a new tuple, readers holding the old one are unaffected
+        self.history = self.history[1 - self.history_length:] + (reading,)
+        self.polls += 1
+
+        return reading
+
+    def latest(self) -> PPMSReading | None:
+        """
+        :return: The most recent reading, None before the first.
+        """
+        history = self.history
+        return history[-1] if history else None
+
+    def conditions_at(self, timestamp: float) -> tuple[float, float] | None:
+        """
+        Returns the conditions at a time, linearly interpolated between the readings before and after it. Times outside
+        the history give the nearest reading.
+        :param timestamp: Host time (time.time()), e.g. the start of a scan.
+        :return: (T, H), or None before the first reading.
+        """
+        history = self.history
+        if not history:
+            return None
+        if timestamp >= history[-1].timestamp:
+            return history[-1].T, history[-1].H
+
+        times, T, H = np.array(history).T
+        return float(np.interp(timestamp, times, T)), float(np.interp(timestamp, times, H))
+
+    def wait_for_reading(self, timeout: float | None = None) -> PPMSReading | None:
+        """
+        Blocks until the first reading is available.
+        :param timeout: Seconds to wait.
+        :return: The latest reading, None on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.history:
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            time.sleep(min(0.01, self.interval))
+
+        return self.latest()
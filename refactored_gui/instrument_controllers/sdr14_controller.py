@@ -7,16 +7,20 @@ from enum import Enum
 
 import numpy as np
 
+from refactored_gui.instrument_controllers.buffer_pool import RecordBufferPool, RecordBuffers
 
 class SDR14:
 
-    def __init__(self, api_path: str = r"M:\Research\NEW FPGA development\NMR spectrometer GUI\refactored_gui\instrument_controllers\ADQAPI.dll") -> None:
+    def __init__(self, api_path: str = r"M:\Research\NEW FPGA development\NMR spectrometer GUI\refactored_gui\instrument_controllers\ADQAPI.dll",
+                 api=None) -> None:
         self.api_path = api_path
 
         # Initialise logger
         self.logger = self.initialise_logger()
-        # Get api
-        self.api = self.retrieve_api()
+        # Get api, use the provided backend (e.g. FakeADQAPI) if given
+        self.api = api if api is not None else self.retrieve_api()
+        # Reusable acquisition buffers
+        self.buffer_pool = RecordBufferPool()
 
         # Handle no API found
         if self.api is None:
@@ -31,8 +35,9 @@ class SDR14:
         self.device_number = self.get_connected_devices()
 
 
-        # Initialise device registers
+        # Initialise device registers and their shadow copy, None = unknown
         self.num_registers = 16
+        self.register_shadow = [None] * self.num_registers
         self.initialise_registers()
 
         # Initialise reg function -> reg number look-up
@@ -41,6 +46,10 @@ class SDR14:
         self.register_mask = {'TX_phase': 0, 'RX_phase': 0}
         # Initialise acquisition parameters
         self.initial_parameters, self.acquisition_parameters = self.initialise_acquisition_parameters()
+        # Acquisition completion settings
+        self.completion_mode = CompletionMode.POLL
+        self.acquisition_timeout = 5.0
+        self.fixed_acquisition_time = 1.0
 
     @staticmethod
     def initialise_logger() -> logging.Logger:
@@ -146,12 +155,8 @@ class SDR14:
         :return:
         """
 
-        for i in range(self.num_registers):
-            if not self.write_register(i, 0):
-                print(f"Error writing to register {i}, exiting...")
-                break
-
-        self.logger.info("All registers initialised to 0")
+        if self.commit_registers([(i, 0, 0) for i in range(self.num_registers)], force=True):
+            self.logger.info("All registers initialised to 0")
 
     @staticmethod
     def initialise_acquisition_parameters() -> tuple:
@@ -172,47 +177,140 @@ class SDR14:
                                               reg_number, 0xFFFFFF, 0, ct.byref(data_response))
 
         if conf:
+            self.register_shadow[reg_number] = data_response.value
             self.logger.info(f"Register {reg_number} = {data_response.value}")
         else:
             self.logger.warning("Read unsuccessful!")
 
         return conf
 
+    def expected_register_value(self, reg_number: int, data: int, mask: int = 0) -> int | None:
+        """
+        Returns the value a register will hold after a masked write, based on the shadow copy.
+        :param reg_number: Register number.
+        :param data: Data to be written.
+        :param mask: Binary mask, set bits keep their current value.
+        :return: Expected register value, or None if the current value is unknown.
+        """
+        current = self.register_shadow[reg_number]
+        if current is None:
+            return None
+
+        return ((current & mask) | (data & ~mask)) & 0xFFFFFFFF
 
-    def write_register(self, reg_number: int, data: int, mask: int = 0) -> bool:
+    def register_holds(self, reg_number: int, data: int, mask: int = 0) -> bool:
+        """
+        Returns True if the shadow copy says a masked write would not change the register. A register of unknown value
+        (e.g. after a failed write) never holds the value, so it is always written.
+        :param reg_number: Register number.
+        :param data: Data to be written.
+        :param mask: Binary mask, set bits keep their current value.
+        :return: bool
         """
-        Writes to specified register.
+        current = self.register_shadow[reg_number]
+        return current is not None and self.expected_register_value(reg_number, data, mask) == current
+
+    def write_register(self, reg_number: int, data: int, mask: int = 0, force: bool = False,
+                       quiet: bool = False) -> bool:
+        """
+        Writes to specified register. Writes which would not change the register are skipped.
         :param reg_number: Number of register to be written to.
         :param data: Data to be written to register.
         :param mask: Binary mask to specify bits to be written to.
-        :return: True if write successful.
+        :param force: Write even if the shadow copy says the register already holds the value.
+        :param quiet: Don't log successful writes.
+        :return: True if write successful or skipped.
         """
+        if not force and self.register_holds(reg_number, data, mask):
+            return True
+
         data_write = ct.c_uint32(data)  # Convert to ctype unsigned integer
         data_response = ct.c_uint32()   # Assign read back value type
         conf = self.api.ADQ_WriteUserRegister(self.cu, self.device_number, 0,
                                               reg_number, mask, data_write, ct.byref(data_response))
 
         if conf:
-            self.logger.info(f"Register {reg_number} = {data_response.value}")
+            self.register_shadow[reg_number] = data_response.value
+            if not quiet:
+                self.logger.info(f"Register {reg_number} = {data_response.value}")
         else:
-            self.logger.warning("Write unsuccessful!")
+            self.register_shadow[reg_number] = None
+            self.logger.warning(f"Write to register {reg_number} unsuccessful!")
 
         return conf
 
+    def commit_registers(self, writes: list[tuple[int, int, int]], force: bool = False) -> bool:
+        """
+        Writes a batch of registers, skipping those already holding the requested value, and logs once for the batch.
+        :param writes: List of (register number, data, mask).
+        :param force: Write every register regardless of the shadow copy.
+        :return: True if all writes were successful.
+        """
+        written = []
+        success = True
+
+        for reg_number, data, mask in writes:
+            if not force and self.register_holds(reg_number, data, mask):
+                continue
+            success &= bool(self.write_register(reg_number, data, mask, force=True, quiet=True))
+            written.append(reg_number)
+
+        self.logger.info(f"Register batch committed: {len(written)} written, {len(writes) - len(written)} unchanged")
+        if written:
+            self.logger.debug(", ".join(f"reg{i} = {self.register_shadow[i]}" for i in written))
+
+        return success
+
+    def sequence_register_writes(self, sequence) -> list[tuple[int, int, int]]:
+        """
+        Converts a sequence into register writes. Fields without a register (look-up value -1) are left out.
+        :param sequence: Sequence to convert.
+        :return: List of (register number, data, mask).
+        """
+        writes = []
+
+        for key, value in sequence.convert_to_dict().items():
+            if key not in self.register_lookup or self.register_lookup[key] < 0:
+                continue
+            writes.append((self.register_lookup[key], value, self.register_mask.get(key, 0)))
+
+        return writes
+
+    def has_register(self, key: str) -> bool:
+        """
+        Returns True if a sequence field is mapped to a user register.
+        :param key: Sequence field name.
+        :return: bool
+        """
+        return self.register_lookup.get(key, -1) >= 0
+
+    def write_sequence_field(self, key: str, value: int, quiet: bool = False) -> bool:
+        """
+        Writes a single sequence field (e.g. TX_phase during a phase cycle) to its register, using the field's mask.
+        :param key: Sequence field name.
+        :param value: Value to write.
+        :param quiet: Don't log successful writes.
+        :return: True if write successful or skipped, False if unsuccessful or the field has no register.
+        """
+        if not self.has_register(key):
+            return False
+
+        return self.write_register(self.register_lookup[key], value, self.register_mask.get(key, 0), quiet=quiet)
+
     def enable_device(self) -> None:
         """
         Enables device by writing '1' to user register 0. Must be called to start any experiment.
         :return:
         """
 
-        self.write_register(0, 1)
+        self.write_register(0, 1, force=True)
 
     def disable_device(self) -> None:
         """
         Disables device by writing '0' to user register 0.
         :return:
         """
-        self.write_register(0, 0)
+        self.write_register(0, 0, force=True)
 
     def set_clock_source(self, clock_source) -> None:
 
@@ -287,56 +385,208 @@ class SDR14:
             self.logger.warning("Error while arming trigger!")
 
 
-    def MR_acquisition(self) -> (np.ndarray, np.ndarray):
+    def wait_for_acquisition(self, timeout: float = 5.0, min_interval: float = 50e-6,
+                             max_interval: float = 5e-3) -> bool:
+        """
+        Polls the device until all MultiRecord records have been acquired. The poll interval starts at min_interval and
+        doubles up to max_interval, so short acquisitions return quickly without spinning on long ones.
+        :param timeout: Time in seconds to wait before giving up.
+        :param min_interval: Initial poll interval in seconds.
+        :param max_interval: Maximum poll interval in seconds.
+        :return: True if all records were acquired before the timeout.
+        """
 
-        # Setup SDR14
-        self.setup_MR_mode()
-        self.set_clock_source(ClockSource.INTERNAL)
-        self.set_trigger_mode(TriggerMode.EXTERNAL)
-        #self.set_external_trig_edge()
+        start = time.perf_counter()
+        interval = min_interval
 
-        self.set_trigger_delay()
+        while not self.api.ADQ_GetAcquiredAll(self.cu, self.device_number):
+            if time.perf_counter() - start > timeout:
+                records = self.api.ADQ_GetAcquiredRecords(self.cu, self.device_number)
+                self.logger.warning(f"Acquisition timed out after {timeout} s, "
+                                    f"{records} / {self.acquisition_parameters.num_of_records} records acquired")
+                return False
 
+            time.sleep(interval)
+            interval = min(2 * interval, max_interval)
 
-        # Arm trigger
-        self.arm_MR_trigger()
+        return True
+
+    def rearm_MR_trigger(self) -> bool:
+        """
+        Disarms and re-arms the trigger for the next MultiRecord acquisition, only logging failures.
+        :return: True if successful.
+        """
+
+        if not self.api.ADQ_DisarmTrigger(self.cu, self.device_number):
+            self.logger.warning("Error while disarming trigger!")
+            return False
+        if not self.api.ADQ_ArmTrigger(self.cu, self.device_number):
+            self.logger.warning("Error while arming trigger!")
+            return False
 
+        return True
+
+    def acquire_records(self) -> RecordBuffers | None:
+        """
+        Runs the pulse sequence on an armed device, waits for the records and transfers them into pooled buffers.
+        :return: RecordBuffers holding the acquired records, or None if the acquisition timed out or the transfer
+            failed.
+        """
 
         # Acquire data
         self.enable_device()
-        time.sleep(1)
+        if self.completion_mode is CompletionMode.POLL:
+            acquired = self.wait_for_acquisition(self.acquisition_timeout)
+        else:
+            time.sleep(self.fixed_acquisition_time)
+            acquired = True
         self.disable_device()
+        if not acquired:
+            return None
         self.logger.info('Data acquisition successful!')
 
-        # Initialise buffers
-        max_channels = 2
-        target_buffers = (ct.POINTER(
-            ct.c_int16 * self.acquisition_parameters.samples_per_record * self.acquisition_parameters.num_of_records)
-                          * max_channels)()
-        # Retrieve data
-        for buf_pntr in target_buffers:
-            buf_pntr.contents = (
-                    ct.c_int16 * self.acquisition_parameters.samples_per_record *
-                    self.acquisition_parameters.num_of_records)()
+        # Get reusable buffers from pool
+        buffers = self.buffer_pool.get(self.acquisition_parameters.samples_per_record,
+                                       self.acquisition_parameters.num_of_records)
 
         ADQ_TRANSFER_MODE = 0  # Default mode
         ADQ_CHANNELS_MASK = 0x3  # Read from both channels
 
-        status = self.api.ADQ_GetData(self.cu, self.device_number, target_buffers,
-                                        self.acquisition_parameters.samples_per_record * self.acquisition_parameters.num_of_records,
+        status = self.api.ADQ_GetData(self.cu, self.device_number, buffers.target_buffers,
+                                        buffers.buffer_size,
                                         2, 0, self.acquisition_parameters.num_of_records, ADQ_CHANNELS_MASK,
                                         0, self.acquisition_parameters.samples_per_record, ADQ_TRANSFER_MODE)
-        if status:
-            self.logger.info('Data retrieved successfully')
+        if not status:
+            # The buffers hold an older scan, hand them back rather than return stale data
+            self.buffer_pool.release(buffers)
+            self.logger.warning('Data transfer failed!')
+            return None
+        self.logger.info('Data retrieved successfully')
 
-        ch1_data = np.frombuffer(target_buffers[0].contents[0], dtype=np.int16)
-        ch2_data = np.frombuffer(target_buffers[1].contents[0], dtype=np.int16)
+        return buffers
 
-        # Disarm trigger and close MR mode
-        self.api.ADQ_DisarmTrigger(self.cu, self.device_number)
-        self.api.ADQ_MultiRecordClose(self.cu, self.device_number)
+    def multirecord_session(self) -> "MultiRecordSession":
+        """
+        Creates a MultiRecord session that keeps the device configured across repeated acquisitions.
+        :return: MultiRecordSession
+        """
+        return MultiRecordSession(self)
 
-        return ch1_data, ch2_data
+    def MR_acquisition(self) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Single MultiRecord acquisition, configuring and closing MultiRecord mode around it.
+        :return: Zero-copy views of the first record of each channel, or None if the acquisition failed.
+        """
+
+        with self.multirecord_session() as session:
+            return session.acquire()
+
+
+class MultiRecordSession:
+    """
+    MultiRecord acquisition configured once and re-armed between scans. Opening the session sets up MultiRecord mode,
+    the clock source and trigger, each acquire() only re-arms the trigger, and close() disarms and closes MultiRecord
+    mode. Can be used as a context manager.
+    """
+
+    def __init__(self, device: SDR14) -> None:
+        self.device = device
+        self.active = False
+        self.scans = 0
+
+    def __enter__(self) -> "MultiRecordSession":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """
+        Configures the device for MultiRecord acquisition.
+        :return:
+        """
+
+        # Setup SDR14
+        self.device.setup_MR_mode()
+        self.device.set_clock_source(ClockSource.INTERNAL)
+        self.device.set_trigger_mode(TriggerMode.EXTERNAL)
+        #self.device.set_external_trig_edge()
+        self.device.set_trigger_delay()
+
+        self.active = True
+        self.scans = 0
+
+    def acquire(self) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Re-arms the trigger and acquires one scan.
+        :return: Zero-copy views of the first record of each channel, or None if the acquisition failed.
+        """
+
+        if not self.active:
+            self.open()
+
+        # Arm trigger
+        self.device.rearm_MR_trigger()
+        buffers = self.device.acquire_records()
+        if buffers is None:
+            return None
+        self.scans += 1
+
+        # Zero-copy views of the first record
+        return buffers.channels[0][0], buffers.channels[1][0]
+
+    def acquire_records(self) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Re-arms the trigger and acquires one scan of num_of_records records.
+        :return: Zero-copy (num_of_records, samples_per_record) views of each channel, or None if the acquisition
+            failed.
+        """
+
+        if not self.active:
+            self.open()
+
+        self.device.rearm_MR_trigger()
+        buffers = self.device.acquire_records()
+        if buffers is None:
+            return None
+        self.scans += 1
+
+        return buffers.channels[0], buffers.channels[1]
+
+    def acquire_average(self) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Re-arms the trigger, acquires one scan of num_of_records records and averages over the records.
+        :return: Averaged record of each channel, valid until the pooled buffer is reused, or None if the acquisition
+            failed.
+        """
+
+        if not self.active:
+            self.open()
+
+        self.device.rearm_MR_trigger()
+        buffers = self.device.acquire_records()
+        if buffers is None:
+            return None
+        self.scans += 1
+        ch1_average, ch2_average = buffers.average_records()
+
+        return ch1_average, ch2_average
+
+    def close(self) -> None:
+        """
+        Disarms the trigger and closes MultiRecord mode. Safe to call more than once.
+        :return:
+        """
+
+        if not self.active:
+            return
+
+        # Disarm trigger and close MR mode
+        self.device.api.ADQ_DisarmTrigger(self.device.cu, self.device.device_number)
+        self.device.api.ADQ_MultiRecordClose(self.device.cu, self.device.device_number)
+        self.active = False
+        self.device.logger.info(f"MultiRecord session closed after {self.scans} scans")
 
 
 @dataclass()
@@ -373,6 +623,11 @@ class ClockSource(Enum):
     EXTERNAL = 2
 
 
+class CompletionMode(Enum):
+    FIXED_DELAY = 0
+    POLL = 1
+
+
 class TriggerMode(Enum):
     SOFTWARE = 1
     EXTERNAL = 2
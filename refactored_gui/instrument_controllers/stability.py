@@ -0,0 +1,122 @@
+import math
+from collections import deque
+
+import numpy as np
+
+
+class StabilityDetector:
+    """
+    Decides when a PPMS quantity (temperature or field) has settled at its set point, from a rolling window of
+    timestamped readings.
+
+    The quantity is stable once the window spans at least 'window' seconds and 'min_readings' readings, its mean is
+    within 'tolerance' of the set point, the least squares slope is below 'slope_limit' and the scatter about the fit
+    is below 'noise_limit'. Readings may also carry the instrument's own verdict (e.g. the status nibble reporting
+    'near' or 'stable'); a reading flagged as not settled keeps the detector unstable for the following window.
+
+    The poll interval adapts to the estimated time of arrival: short near the set point so stability is noticed
+    promptly, long during slow ramps where frequent polling only adds bus traffic.
+    """
+
+    def __init__(self, set_point: float, tolerance: float, window: float = 10.0, slope_limit: float | None = None,
+                 noise_limit: float | None = None, min_readings: int = 5, min_interval: float = 0.2,
+                 max_interval: float = 5.0) -> None:
+        """
+        :param set_point: Target value.
+        :param tolerance: Largest accepted deviation of the mean from the set point.
+        :param window: Seconds of readings judged together.
+        :param slope_limit: Largest accepted drift per second, by default tolerance / window.
+        :param noise_limit: Largest accepted standard deviation about the fit, by default tolerance / 2.
+        :param min_readings: Fewest readings in a window.
+        :param min_interval: Shortest poll interval in s.
+        :param max_interval: Longest poll interval in s.
+        """
+        self.set_point = set_point
+        self.tolerance = tolerance
+        self.window = window
+        self.slope_limit = slope_limit if slope_limit is not None else tolerance / window
+        self.noise_limit = noise_limit if noise_limit is not None else tolerance / 2
+        self.min_readings = max(min_readings, 2)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        self.readings = deque()
+        self.unsettled_at = -math.inf
+
+    def add(self, timestamp: float, value: float, settled: bool = True) -> None:
+        """
+        Adds a reading and drops those that have left the window.
+        :param timestamp: Reading time in s, monotonic.
+        :param value: Reading.
+        :param settled: The instrument's own status agrees the quantity is at its set point.
+        :return:
+        """
+        self.readings.append((timestamp, value))
+        if not settled:
+            self.unsettled_at = timestamp
+
+        while (len(self.readings) > self.min_readings
+               and self.readings[-1][0] - self.readings[1][0] >= self.window):
+            self.readings.popleft()
+
+    def fit(self) -> tuple[float, float, float]:
+        """
+        Least squares line through the window.
+        :return: (mean, slope per s, standard deviation of the residuals)
+        """
+        t, y = np.array(self.readings).T
+        t = t - t.mean()
+        mean = y.mean()
+        slope = (t @ (y - mean)) / (t @ t) if t @ t > 0 else 0.0
+        residuals = y - mean - slope * t
+
+        return mean, slope, residuals.std()
+
+    @property
+    def span(self) -> float:
+        return self.readings[-1][0] - self.readings[0][0] if self.readings else 0.0
+
+    def stable(self) -> bool:
+        if len(self.readings) < self.min_readings or self.span < self.window:
+            return False
+        if self.readings[0][0] <= self.unsettled_at:
+            return False
+
+        mean, slope, noise = self.fit()
+        return (abs(mean - self.set_point) <= self.tolerance and abs(slope) <= self.slope_limit
+                and noise <= self.noise_limit)
+
+    def eta(self) -> float | None:
+        """
+        Estimated seconds until stable: the time to reach the tolerance band at the current slope, plus one window to
+        confirm stability.
+        :return: ETA in s, None while the readings are not heading towards the set point.
+        """
+        if not self.readings:
+            return None
+
+        error = self.set_point - self.readings[-1][1]
+        if abs(error) <= self.tolerance:
+            return max(self.window - self.span, 0.0)
+        if len(self.readings) < 2:
+            return None
+
+        _, slope, _ = self.fit()
+        if slope * error <= 0:
+            return None
+
+        return (abs(error) - self.tolerance) / abs(slope) + self.window
+
+    def next_interval(self) -> float:
+        """
+        Seconds until the next reading: a tenth of the ETA, clamped to the poll interval limits. Polls as fast as
+        allowed within twice the tolerance of the set point, and until there are two readings to estimate the slope.
+        """
+        if len(self.readings) < 2 or abs(self.set_point - self.readings[-1][1]) <= 2 * self.tolerance:
+            return self.min_interval
+
+        eta = self.eta()
+        if eta is None:
+            return self.max_interval
+
+        return min(max(eta / 10, self.min_interval), self.max_interval)
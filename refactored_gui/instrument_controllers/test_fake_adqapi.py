@@ -0,0 +1,177 @@
+import ctypes as ct
+
+import numpy as np
+import pytest
+
+from refactored_gui.data_handling.sequence import Sequence
+from refactored_gui.instrument_controllers.fake_adqapi import FakeADQAPI, FakeSDR14Timing
+from refactored_gui.instrument_controllers import sdr14_controller
+from refactored_gui.instrument_controllers.sdr14_controller import SDR14
+
+
+@pytest.fixture
+def api() -> FakeADQAPI:
+    return FakeADQAPI(FakeSDR14Timing(realtime=False))
+
+
+@pytest.fixture
+def device(api, tmp_path, monkeypatch) -> SDR14:
+    # SDR14 logs to logs.log in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sdr14_controller.time, "sleep", lambda s: None)
+    return SDR14(api=api)
+
+
+def test_write_register_mask(api) -> None:
+    response = ct.c_uint32()
+    api.ADQ_WriteUserRegister(None, 1, 0, 8, 0, ct.c_uint32(0x1234), ct.byref(response))
+    api.ADQ_WriteUserRegister(None, 1, 0, 8, 0xFF00, ct.c_uint32(0xABCD), ct.byref(response))
+
+    assert response.value == 0x12CD
+
+
+def test_api_function_attributes(api) -> None:
+    api.ADQ_GetPtrStream.restype = ct.POINTER(ct.c_int16)
+
+    with pytest.raises(AttributeError):
+        api.ADQ_NotAFunction()
+
+
+def test_MR_acquisition(device, api) -> None:
+    ch1_data, ch2_data = device.MR_acquisition()
+
+    assert ch1_data.dtype == np.int16
+    assert ch1_data.size == ch2_data.size == device.acquisition_parameters.samples_per_record
+    assert np.abs(ch1_data).max() > 0
+    assert api.call_counts()["ADQ_GetData"] == 1
+
+
+def test_get_data_requires_acquisition(api) -> None:
+    api.ADQ_MultiRecordSetup(None, 1, 1, 1024)
+    api.ADQ_ArmTrigger(None, 1)
+    target_buffers = (ct.POINTER(ct.c_int16 * 1024) * 2)()
+    for buf_pntr in target_buffers:
+        buf_pntr.contents = (ct.c_int16 * 1024)()
+
+    assert not api.ADQ_GetAcquiredAll(None, 1)
+    assert not api.ADQ_GetData(None, 1, target_buffers, 1024, 2, 0, 1, 0x3, 0, 1024, 0)
+
+
+def test_streaming_pages(api) -> None:
+    api.ADQ_SetTransferBuffers(None, 1, 4, 2048)
+    api.ADQ_SetStreamStatus(None, 1, 1)
+    api.ADQ_StartStreaming(None, 1)
+    api.device.stream_start -= 1
+
+    filled_buffers = ct.c_uint()
+    api.ADQ_GetTransferBufferStatus(None, 1, ct.byref(filled_buffers))
+    assert filled_buffers.value == 4
+    assert api.ADQ_GetStreamOverflow(None, 1)
+
+    assert api.ADQ_CollectDataNextPage(None, 1)
+    data = ct.cast(api.ADQ_GetPtrStream(None, 1), ct.POINTER(ct.c_int16 * 2048))[0][:]
+    assert len(data) == 2048
+
+
+def test_MR_acquisition_reuses_pooled_buffers(device) -> None:
+    depth = device.buffer_pool.depth
+    first = [device.MR_acquisition()[0] for _ in range(depth + 1)]
+
+    assert np.shares_memory(first[0], first[depth])
+    assert not np.shares_memory(first[0], first[1])
+    assert len(device.buffer_pool.slots) == 1
+
+
+def test_wait_for_acquisition(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    device = SDR14(api=FakeADQAPI())
+
+    device.setup_MR_mode()
+    device.set_trigger_mode(sdr14_controller.TriggerMode.EXTERNAL)
+    device.arm_MR_trigger()
+    assert not device.wait_for_acquisition(timeout=0.01)
+
+    device.enable_device()
+    assert device.wait_for_acquisition(timeout=1)
+
+
+def test_multirecord_session_configures_once(device, api) -> None:
+    api.reset_call_counts()
+    with device.multirecord_session() as session:
+        for _ in range(3):
+            session.acquire()
+
+    counts = api.call_counts()
+    assert counts["ADQ_MultiRecordSetup"] == 1
+    assert counts["ADQ_SetTriggerMode"] == 1
+    assert counts["ADQ_MultiRecordClose"] == 1
+    assert counts["ADQ_ArmTrigger"] == 3
+    assert counts["ADQ_GetData"] == 3
+
+
+def test_acquire_average_over_records(device) -> None:
+    device.acquisition_parameters.num_of_records = 4
+    with device.multirecord_session() as session:
+        ch1_records, ch2_records = session.acquire_records()
+        ch1_average, ch2_average = session.acquire_average()
+
+    assert ch1_records.shape == (4, device.acquisition_parameters.samples_per_record)
+    assert ch1_average.shape == (device.acquisition_parameters.samples_per_record,)
+
+    buffers = device.buffer_pool.get(device.acquisition_parameters.samples_per_record, 4)
+    buffers.records[:] = np.arange(4).reshape(1, 4, 1)
+    assert np.array_equal(buffers.average_records(), np.full((2, buffers.samples_per_record), 1.5))
+
+
+def test_commit_registers_writes_only_changes(device, api) -> None:
+    device.commit_registers(device.sequence_register_writes(Sequence(213000000, 0, 0, 1000, 5000, 1500, 0, 0, 10000)))
+    api.reset_call_counts()
+
+    device.commit_registers(device.sequence_register_writes(Sequence(213000000, 0, 0, 1000, 5000, 1600, 0, 0, 10000)))
+
+    assert api.call_counts()["ADQ_WriteUserRegister"] == 1
+    assert device.register_shadow[device.register_lookup["p2"]] == 1600
+
+
+def test_failed_write_is_retried_on_next_commit(device, api) -> None:
+    sequence = Sequence(213000000, 0, 0, 1000, 5000, 1500, 0, 0, 10000)
+    p2 = device.register_lookup["p2"]
+    write_user_register = api.ADQ_WriteUserRegister.func
+    api.ADQ_WriteUserRegister.func = lambda *args: 0 if args[3] == p2 else write_user_register(*args)
+
+    assert not device.commit_registers(device.sequence_register_writes(sequence))
+    assert device.register_shadow[p2] is None
+
+    # The register's value is unknown, so the same sequence is written again rather than skipped
+    api.ADQ_WriteUserRegister.func = write_user_register
+    api.reset_call_counts()
+    assert device.commit_registers(device.sequence_register_writes(sequence))
+    assert api.call_counts()["ADQ_WriteUserRegister"] == 1
+    assert api.device.registers[p2] == device.register_shadow[p2] == 1500
+
+
+def test_write_sequence_field(device, api) -> None:
+    assert not device.has_register("TX_phase")
+    assert not device.write_sequence_field("TX_phase", 90)
+
+    device.register_lookup["TX_phase"] = 8
+    assert device.write_sequence_field("TX_phase", 90)
+    assert device.register_shadow[8] == 90
+
+
+def test_failed_acquisition_returns_no_data(device, api) -> None:
+    good = device.MR_acquisition()[0].copy()
+    device.acquisition_timeout = 0.01
+    get_acquired_all = api.ADQ_GetAcquiredAll.func
+    api.ADQ_GetAcquiredAll.func = lambda cu, dev: 0
+
+    assert all(device.MR_acquisition() is None for _ in range(device.buffer_pool.depth))
+
+    # A failed transfer hands its buffers back, the next scan goes into them
+    api.ADQ_GetAcquiredAll.func = get_acquired_all
+    api.ADQ_GetData.func = lambda *args: 0
+    key = (device.acquisition_parameters.samples_per_record, 1)
+    next_slot = device.buffer_pool.next_slot[key]
+    assert device.MR_acquisition() is None
+    assert device.buffer_pool.next_slot[key] == next_slot
+    assert good.any()
@@ -0,0 +1,187 @@
+import pytest
+
+from refactored_gui.instrument_controllers.fake_ppms import FakePPMSModel, SimulatedPPMS, SimulatedPPMSResource
+from refactored_gui.instrument_controllers.fake_ppms import PPMSSimulatorServer, PPMSSocketResource
+from refactored_gui.instrument_controllers import ppms_controller
+from refactored_gui.instrument_controllers.ppms_controller import PPMS_GPIB, parse_get_data, STATUS, TEMPERATURE, FIELD
+from refactored_gui.instrument_controllers.stability import StabilityDetector
+
+
+def test_parse_all_channels_in_one_response() -> None:
+    timestamp, data = parse_get_data("7,12345.678,34,300.125,-2500.5;")
+
+    assert timestamp == 12345.678
+    assert data == {STATUS: 34, TEMPERATURE: 300.125, FIELD: -2500.5}
+
+
+def test_parse_rejects_mismatched_response() -> None:
+    with pytest.raises(ValueError):
+        parse_get_data("6,12345.678,300.125;")
+
+
+class ManualClock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> ManualClock:
+    return ManualClock()
+
+
+@pytest.fixture
+def ppms(clock) -> PPMS_GPIB:
+    model = FakePPMSModel(T_noise=0, H_noise=0, realtime=False)
+    return PPMS_GPIB(resource=SimulatedPPMSResource(SimulatedPPMS(model, clock=clock)))
+
+
+def test_temperature_approach_and_status(ppms, clock) -> None:
+    ppms.write("TEMP 10 10 0")
+
+    clock.now = 60
+    _, data = ppms.get_data(STATUS | TEMPERATURE)
+    assert ppms.decode_state(int(data[STATUS]))['temp'] == SimulatedPPMS.T_TRACKING
+    assert 10 < data[TEMPERATURE] < 300
+
+    # Ramp of 29 min, then a first-order approach
+    clock.now = 29 * 60 + 2
+    assert ppms.decode_state(int(ppms.get_data(STATUS)[1][STATUS]))['temp'] == SimulatedPPMS.T_CHASING
+    clock.now = 29 * 60 + 90
+    assert ppms.decode_state(int(ppms.get_data(STATUS)[1][STATUS]))['temp'] == SimulatedPPMS.T_NEAR
+    clock.now = 29 * 60 + 300
+    state = ppms.decode_state(int(ppms.get_data(STATUS)[1][STATUS]))
+    assert state['temp'] == SimulatedPPMS.T_STABLE
+    assert state['chamber'] == SimulatedPPMS.CHAMBER_PURGED_SEALED
+    assert ppms.get_temperature() == pytest.approx(10, abs=0.05)
+
+
+def test_field_ramp(ppms, clock) -> None:
+    ppms.write("FIELD 10000 100")
+
+    clock.now = 50
+    T, H = ppms.get_current_conditions()
+    assert H == pytest.approx(5000)
+    assert ppms.decode_state(int(ppms.get_data(STATUS)[1][STATUS]))['field'] == SimulatedPPMS.H_CHARGING
+
+    clock.now = 101
+    assert ppms.get_field() == pytest.approx(10000)
+    assert ppms.decode_state(int(ppms.get_data(STATUS)[1][STATUS]))['field'] == SimulatedPPMS.H_STABLE_DRIVEN
+
+
+def test_simulator_over_tcp(clock) -> None:
+    model = FakePPMSModel(T_noise=0, H_noise=0, realtime=False)
+    server = PPMSSimulatorServer(SimulatedPPMS(model, clock=clock))
+    server.start()
+    try:
+        ppms = PPMS_GPIB(resource=PPMSSocketResource(*server.address))
+        ppms.write("FIELD -2000 100")
+        # Writes have no reply, make sure the command has been handled before moving the clock
+        assert ppms.query("*IDN?").startswith("QUANTUM DESIGN")
+        clock.now = 100
+        assert ppms.get_current_conditions() == (300, -2000)
+        assert server.simulator.queries == 1
+        ppms.ppms.close()
+    finally:
+        server.stop()
+
+
+@pytest.fixture
+def sleep(clock):
+    polls = []
+
+    def advance(seconds: float) -> None:
+        polls.append(seconds)
+        clock.now += seconds
+
+    advance.polls = polls
+    return advance
+
+
+def test_temperature_returns_once_stable(clock, sleep) -> None:
+    model = FakePPMSModel(T_noise=0.002, H_noise=0, settle_time=120, realtime=False)
+    ppms = PPMS_GPIB(resource=SimulatedPPMSResource(SimulatedPPMS(model, clock=clock)))
+    ppms.write("TEMP 10 10 0")
+    detector = StabilityDetector(10, PPMS_GPIB.T_TOLERANCE, window=PPMS_GPIB.T_WINDOW)
+
+    stable, timestamps, temp, _ = ppms.wait_until_stable(TEMPERATURE, detector, PPMS_GPIB.T_SETTLED,
+                                                         PPMS_GPIB.T_STABLE, sleep=sleep)
+
+    # Ramp of 29 min then the approach, returning before the PPMS settle time has run out
+    assert stable
+    assert temp[-1] == pytest.approx(10, abs=PPMS_GPIB.T_TOLERANCE)
+    assert 29 * 60 < clock.now < 29 * 60 + 120
+    assert ppms.decode_state(int(ppms.get_data(STATUS)[1][STATUS]))['temp'] == SimulatedPPMS.T_NEAR
+    # Slow polling during the ramp, fast near the set point
+    assert max(sleep.polls) == 5.0 and min(sleep.polls) == 0.2
+    assert len(timestamps) < 29 * 60 / 5 + 120 / 0.2
+
+
+def test_field_returns_once_stable(ppms, clock, sleep) -> None:
+    ppms.write("FIELD 10000 100")
+    detector = StabilityDetector(10000, PPMS_GPIB.H_TOLERANCE, window=PPMS_GPIB.H_WINDOW)
+
+    stable, _, field, state = ppms.wait_until_stable(FIELD, detector, PPMS_GPIB.H_SETTLED, PPMS_GPIB.H_STABLE,
+                                                     sleep=sleep)
+
+    assert stable
+    assert field[-1] == 10000
+    assert state[-1] == SimulatedPPMS.H_STABLE_DRIVEN
+    assert 100 <= clock.now < 100 + PPMS_GPIB.H_WINDOW + 2
+
+
+def test_rejected_write_over_tcp_keeps_replies_in_step(clock) -> None:
+    model = FakePPMSModel(T_noise=0, H_noise=0, realtime=False)
+    server = PPMSSimulatorServer(SimulatedPPMS(model, clock=clock))
+    server.start()
+    try:
+        ppms = PPMS_GPIB(resource=PPMSSocketResource(*server.address))
+        # Out of range, rejected without a reply
+        ppms.write("FIELD 100000 100")
+        assert ppms.query("*IDN?").startswith("QUANTUM DESIGN")
+        assert ppms.get_current_conditions() == (300, 0)
+        # Failed queries are still answered
+        assert ppms.query("GetDat? x").startswith("ERROR")
+        assert ppms.get_field() == 0
+        ppms.ppms.close()
+    finally:
+        server.stop()
+
+
+def test_instrument_stable_status_is_trusted_outside_the_band(clock, sleep) -> None:
+    # Field noise far above the requested tolerance, the detector alone would never report stable
+    model = FakePPMSModel(T_noise=0, H_noise=0.5, realtime=False)
+    ppms = PPMS_GPIB(resource=SimulatedPPMSResource(SimulatedPPMS(model, clock=clock)))
+    ppms.write("FIELD 1000 100")
+    detector = StabilityDetector(1000, 0.01, window=PPMS_GPIB.H_WINDOW)
+
+    stable, _, _, state = ppms.wait_until_stable(FIELD, detector, PPMS_GPIB.H_SETTLED, PPMS_GPIB.H_STABLE,
+                                                 sleep=sleep)
+
+    assert stable
+    assert state[-1] == SimulatedPPMS.H_STABLE_DRIVEN
+    fallback = PPMS_GPIB.STABLE_FALLBACK_WINDOWS * PPMS_GPIB.H_WINDOW
+    # Ramp of 10 s, then the fallback, to within two polls at the longest interval
+    assert 10 + fallback <= clock.now <= 10 + fallback + 2 * detector.max_interval
+
+
+def test_wait_gives_up_after_timeout(ppms, clock, sleep) -> None:
+    ppms.write("TEMP 10 10 0")
+    detector = StabilityDetector(10, PPMS_GPIB.T_TOLERANCE, window=PPMS_GPIB.T_WINDOW)
+
+    stable, timestamps, _, state = ppms.wait_until_stable(TEMPERATURE, detector, PPMS_GPIB.T_SETTLED,
+                                                          PPMS_GPIB.T_STABLE, timeout=60, sleep=sleep)
+
+    assert not stable
+    assert 60 <= timestamps[-1] - timestamps[0] < 66
+    assert state[-1] == SimulatedPPMS.T_TRACKING
+
+
+def test_default_tolerance_scales_with_set_point(ppms, clock, sleep, monkeypatch) -> None:
+    monkeypatch.setattr(ppms_controller.time, "sleep", sleep)
+
+    assert ppms.set_field(50000, 500)
+    assert ppms.set_temperature(290, 10, timeout=3600)
@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from refactored_gui.instrument_controllers.ppms_sampler import PPMSSampler, PPMSReading
+
+
+def test_conditions_are_interpolated_between_readings() -> None:
+    sampler = PPMSSampler(lambda: (0.0, 0.0))
+    assert sampler.conditions_at(time.time()) is None
+
+    sampler.history = (PPMSReading(100.0, 10.0, 0.0), PPMSReading(101.0, 12.0, 1000.0))
+
+    assert sampler.conditions_at(100.25) == pytest.approx((10.5, 250.0))
+    # Outside the history the nearest reading is used
+    assert sampler.conditions_at(99.0) == (10.0, 0.0)
+    assert sampler.conditions_at(105.0) == (12.0, 1000.0)
+
+
+def test_history_is_bounded() -> None:
+    readings = iter(range(100))
+    sampler = PPMSSampler(lambda: (next(readings), 0.0), history=8)
+
+    for _ in range(20):
+        sampler.poll()
+
+    assert len(sampler.history) == 8
+    assert sampler.latest().T == 19
+    assert all(a.timestamp <= b.timestamp for a, b in zip(sampler.history, sampler.history[1:]))
+
+
+def test_polls_in_background_and_survives_errors() -> None:
+    calls = []
+
+    def read_conditions():
+        calls.append(None)
+        if len(calls) == 2:
+            raise IOError("GPIB timeout")
+        return 300.0, 5.0
+
+    sampler = PPMSSampler(read_conditions, interval=0.01)
+    sampler.start()
+    assert sampler.wait_for_reading(timeout=5) is not None
+    while len(calls) < 5:
+        time.sleep(0.01)
+    sampler.stop()
+
+    assert sampler.errors == 1
+    assert sampler.polls == len(calls) - 1
+    assert sampler.thread is None
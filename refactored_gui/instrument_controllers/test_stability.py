@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from refactored_gui.instrument_controllers.stability import StabilityDetector
+
+
+def test_stable_only_after_a_flat_window_at_the_set_point() -> None:
+    detector = StabilityDetector(10.0, tolerance=0.05, window=10.0)
+    rng = np.random.default_rng(0)
+
+    for t in range(10):
+        detector.add(t, 10.0 + rng.normal(0, 0.002))
+        assert not detector.stable()
+
+    detector.add(10, 10.0)
+    assert detector.stable()
+
+
+def test_drift_and_offset_are_not_stable() -> None:
+    drifting = StabilityDetector(10.0, tolerance=0.05, window=10.0)
+    offset = StabilityDetector(10.0, tolerance=0.05, window=10.0)
+
+    for t in range(20):
+        drifting.add(t, 9.96 + 0.008 * t)
+        offset.add(t, 10.1)
+
+    assert not drifting.stable()
+    assert not offset.stable()
+
+
+def test_unsettled_status_restarts_the_window() -> None:
+    detector = StabilityDetector(10.0, tolerance=0.05, window=10.0)
+
+    for t in range(20):
+        detector.add(t, 10.0, settled=t != 15)
+    assert not detector.stable()
+
+    for t in range(20, 27):
+        detector.add(t, 10.0)
+    assert detector.stable()
+
+
+def test_eta_and_poll_interval_follow_the_approach() -> None:
+    detector = StabilityDetector(10.0, tolerance=0.05, window=10.0, min_interval=0.2, max_interval=5.0)
+    assert detector.eta() is None
+
+    # Ramp at -1 K/min from 100 K
+    for t in range(0, 60, 5):
+        detector.add(t, 100 - t / 60)
+
+    remaining = 100 - 55 / 60 - 10.05
+    assert detector.eta() == pytest.approx(remaining * 60 + 10)
+    assert detector.next_interval() == 5.0
+
+    # Moving away from the set point has no ETA
+    away = StabilityDetector(10.0, tolerance=0.05)
+    away.add(0, 11.0)
+    away.add(1, 11.5)
+    assert away.eta() is None
+
+    # Close to the set point, poll as fast as allowed
+    detector.add(60, 10.08)
+    assert detector.next_interval() == 0.2
@@ -42,33 +42,89 @@ class MPLPlotManager:
         self.canvs['average_time'].draw()
 
 
+def minmax_envelope(x: np.ndarray, y: np.ndarray, start: int, stop: int, bins: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Peak preserving decimation of x[start:stop], y[start:stop] for display. The samples are split into at most 'bins'
+    equal groups and each group is replaced by its minimum and maximum, so no peak is lost however far the trace is
+    decimated.
+    :param x: x data.
+    :param y: y data.
+    :param start: First sample to include.
+    :param stop: Sample after the last to include.
+    :param bins: Number of groups, e.g. the width of the plot in pixels.
+    :return: (x, y) with at most 2 * bins points. Slices of the input if no decimation is needed.
+    """
+    n = stop - start
+    if n <= 2 * bins:
+        return x[start:stop], y[start:stop]
+
+    step = -(-n // bins)
+    edges = np.arange(0, n, step)
+    segment = y[start:stop]
+
+    y_out = np.empty(2 * edges.size, dtype=segment.dtype)
+    y_out[0::2] = np.minimum.reduceat(segment, edges)
+    y_out[1::2] = np.maximum.reduceat(segment, edges)
+    # Each pair spans its group
+    x_out = np.empty(2 * edges.size, dtype=x.dtype)
+    x_out[0::2] = x[start + edges]
+    x_out[1::2] = x[start + np.minimum(edges + step, n) - 1]
+
+    return x_out, y_out
+
+
 # noinspection PyTypeChecker
 class PyqtgraphPlotManager:
+    """
+    Plots SDR14 records with pyqtgraph. Full resolution data is kept, but only a min/max envelope of about two points per
+    pixel of the visible range is drawn. The envelope is recomputed when a plot is zoomed, panned or resized, so zooming
+    in shows the full resolution and drawing time doesn't depend on record length.
+    """
 
     def __init__(self, plot_widgets: dict) -> None:
 
         self.plots = {k: {'plot_ref': plot_widgets[k],
-                          'lines': self.initialise_lines(k, plot_widgets)} for k in plot_widgets.keys()}
+                          'lines': self.initialise_lines(k, plot_widgets),
+                          'data': {'ch1': None, 'ch2': None},
+                          'buffers': {'ch1': None, 'ch2': None}} for k in plot_widgets.keys()}
 
         # x-axis
         self.fs = 800e6
         self.Ts = 1/self.fs
         self.N = 2 ** 16
         self.xt = np.arange(0, self.N) * self.Ts
+        self.time_axes = {self.N: self.xt}
 
         self.initialise_plot_widgets()
 
+        # Recompute the envelopes when the visible range or plot size changes
+        for k in self.plots.keys():
+            view_box = self.plots[k]['plot_ref'].getViewBox()
+            view_box.sigXRangeChanged.connect(lambda *args, key=k: self.refresh_plot(key))
+            view_box.sigResized.connect(lambda *args, key=k: self.refresh_plot(key))
+
     def initialise_plot_widgets(self) -> None:
 
         styles = {'color': "#000000", 'font-size': "14px"}
 
         for k in self.plots.keys():
             self.plots[k]['plot_ref'].setBackground("w")
-            self.plots[k]['plot_ref'].setLabel("left", "signal", **styles)
-            self.plots[k]['plot_ref'].setLabel("bottom", "t (us)", **styles)
-
-        self.plots['average_time']['plot_ref'].setTitle("Averaged SDR14 signal", color='k')
-        self.plots['last_time']['plot_ref'].setTitle("Last scan SDR14 signal", color='k')
+            if self.is_spectrum(k):
+                self.plots[k]['plot_ref'].setLabel("left", "amplitude", **styles)
+                self.plots[k]['plot_ref'].setLabel("bottom", "f", units="Hz", **styles)
+            else:
+                self.plots[k]['plot_ref'].setLabel("left", "signal", **styles)
+                self.plots[k]['plot_ref'].setLabel("bottom", "t (us)", **styles)
+
+        titles = {'average_time': "Averaged SDR14 signal", 'last_time': "Last scan SDR14 signal",
+                  'average_spectrum': "Averaged SDR14 spectrum", 'last_spectrum': "Last scan SDR14 spectrum"}
+        for k, title in titles.items():
+            if k in self.plots:
+                self.plots[k]['plot_ref'].setTitle(title, color='k')
+
+    @staticmethod
+    def is_spectrum(plot: str) -> bool:
+        return plot.endswith('_spectrum')
 
     def initialise_lines(self, key: str, plot_widgets: dict) -> dict[pg.PlotItem]:
 
@@ -76,5 +132,73 @@ class PyqtgraphPlotManager:
                 'ch2': plot_widgets[key].plot([], [], pen='b')}
 
     def update_plot(self, data: np.ndarray, plot: str, channel: str) -> None:
-        self.plots[plot]['lines'][channel].setData(self.xt, data)
+        """
+        Plots a record. The record is copied, so its buffer (e.g. a shared frame slot) can be reused on return.
+        """
+        self.store_line(plot, channel, self.time_axis(data.size), data)
+        self.render_line(plot, channel)
+
+    def update_spectrum(self, frequencies: np.ndarray, magnitude: np.ndarray, plot: str, channel: str) -> None:
+        """
+        Plots a magnitude spectrum computed off the GUI thread (see SpectrumWorker).
+        :param frequencies: Frequency axis in Hz, increasing.
+        :param magnitude: Magnitude at each frequency.
+        :param plot: Spectrum plot, e.g. 'average_spectrum'.
+        :param channel: 'ch1' or 'ch2'.
+        :return:
+        """
+        self.store_line(plot, channel, frequencies, magnitude)
+        self.render_line(plot, channel)
+
+    def store_line(self, plot: str, channel: str, x: np.ndarray, y: np.ndarray) -> None:
+        """
+        Copies a line's data into a buffer owned by the plot, reused while the length and dtype are unchanged. The plot
+        is redrawn from this copy when zoomed, after the caller's buffer has been reused.
+        """
+        buffers = self.plots[plot]['buffers']
+        # Down-converted I/Q records are plotted as their envelope
+        dtype = np.abs(y[:0]).dtype if np.iscomplexobj(y) else y.dtype
+        if buffers[channel] is None or buffers[channel].shape != y.shape or buffers[channel].dtype != dtype:
+            buffers[channel] = np.empty(y.shape, dtype=dtype)
+
+        if np.iscomplexobj(y):
+            np.abs(y, out=buffers[channel])
+        else:
+            np.copyto(buffers[channel], y)
+        self.plots[plot]['data'][channel] = (x, buffers[channel])
+
+    def refresh_plot(self, plot: str) -> None:
+        for channel in self.plots[plot]['lines'].keys():
+            self.render_line(plot, channel)
+
+    def render_line(self, plot: str, channel: str) -> None:
+        """
+        Draws the min/max envelope of the visible part of a line's data.
+        """
+        if self.plots[plot]['data'][channel] is None:
+            return
+
+        x, y = self.plots[plot]['data'][channel]
+        view_box = self.plots[plot]['plot_ref'].getViewBox()
+        pixels = max(int(view_box.width()), 1)
+
+        if view_box.autoRangeEnabled()[0]:
+            start, stop = 0, x.size
+        else:
+            # Visible samples plus one either side, so lines run to the plot edges
+            x0, x1 = view_box.viewRange()[0]
+            start, stop = np.searchsorted(x, (x0, x1))
+            start, stop = max(start - 1, 0), min(stop + 1, x.size)
+
+        self.plots[plot]['lines'][channel].setData(*minmax_envelope(x, y, start, stop, pixels))
+
+    def time_axis(self, samples: int) -> np.ndarray:
+        """
+        Returns the time axis for a record of the given length. Decimated records span the same time as the raw
+        record, with a longer sample period.
+        """
+        if samples not in self.time_axes:
+            self.time_axes[samples] = np.arange(0, samples) * (self.N * self.Ts / samples)
+
+        return self.time_axes[samples]
 
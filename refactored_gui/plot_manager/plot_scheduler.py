@@ -0,0 +1,138 @@
+import threading
+import time
+from typing import Callable
+
+from PyQt5.QtCore import QObject, QThread, QTimer
+
+
+class PlotScheduler(QObject):
+    """
+    Caps the GUI redraw rate. Frames are submitted as fast as they arrive, but only the latest frame of each plot is
+    kept; a fixed-rate timer draws whatever is pending, so a frame superseded before the next tick is dropped rather
+    than drawn. Submitting only stores a reference, so a burst of frames costs one draw per plot per tick and slow
+    rendering never queues up behind the experiment.
+
+    If drawing takes longer than the frame period, the timer interval is stretched to twice the draw time, which keeps
+    at least half of the GUI thread free for the event loop (acquisition signals, averaging, user input).
+
+    Frames may be submitted from a worker thread through a direct connection, which avoids queueing a signal per frame
+    on the GUI thread. The timer can only be started from its own thread, so call start() first in that case; frames
+    submitted from other threads while it is stopped are drawn by the next start() or stop().
+    """
+
+    def __init__(self, fps: float = 30.0, parent: QObject = None) -> None:
+        """
+        :param fps: Maximum redraw rate.
+        :param parent: Parent QObject.
+        """
+        super().__init__(parent)
+
+        self.period = 1 / fps
+        self.draw_functions = {}
+        self.release_functions = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        # Keep the timer running while no frames arrive
+        self.continuous = False
+
+        self.submitted = 0
+        self.drawn = 0
+        self.dropped = 0
+        self.draw_time = 0.0
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(round(1000 * self.period))
+        self.timer.timeout.connect(self.draw_pending)
+
+    def add_plot(self, key: str, draw: Callable, release: Callable | None = None) -> None:
+        """
+        Registers a plot.
+        :param key: Plot name used when submitting frames.
+        :param draw: Called with the arguments of the latest frame, on the GUI thread.
+        :param release: Called with the arguments of every frame once it has been drawn or dropped, e.g. to free a
+            shared frame slot.
+        :return:
+        """
+        self.draw_functions[key] = draw
+        if release is not None:
+            self.release_functions[key] = release
+
+    def submit(self, key: str, *frame) -> None:
+        """
+        Stores a frame for the next redraw, replacing (dropping) any frame of the same plot not yet drawn. Frame data is
+        held by reference, so the sender must not modify it in place afterwards.
+        :param key: Plot name.
+        :param frame: Arguments of the plot's draw function.
+        :return:
+        """
+        with self.lock:
+            dropped = self.pending.get(key)
+            if dropped is not None:
+                self.dropped += 1
+            self.pending[key] = frame
+            self.submitted += 1
+
+        if dropped is not None and key in self.release_functions:
+            self.release_functions[key](*dropped)
+
+        # Frames from other threads are drawn by the running timer, see start()
+        if not self.continuous and not self.timer.isActive() and QThread.currentThread() == self.thread():
+            self.timer.start()
+
+    def draw_pending(self) -> None:
+        """
+        Draws the latest frame of every plot with one pending. Stops the timer when there is nothing to draw.
+        :return:
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        if not pending:
+            if not self.continuous:
+                self.timer.stop()
+            return
+
+        start = time.perf_counter()
+        for key, frame in pending.items():
+            try:
+                self.draw_functions[key](*frame)
+            finally:
+                if key in self.release_functions:
+                    self.release_functions[key](*frame)
+            self.drawn += 1
+        elapsed = time.perf_counter() - start
+        self.draw_time += elapsed
+
+        # Slow draws stretch the interval rather than back up the event loop
+        self.timer.setInterval(round(1000 * max(self.period, 2 * elapsed)))
+
+    def start(self) -> None:
+        """
+        Keeps the timer running until stop(), for frames submitted from other threads.
+        :return:
+        """
+        self.continuous = True
+        self.timer.start()
+
+    def stop(self) -> None:
+        """
+        Draws any pending frames immediately, e.g. the last frame of an experiment, and stops the timer.
+        :return:
+        """
+        self.continuous = False
+        self.draw_pending()
+        self.timer.stop()
+
+    def reset_stats(self) -> None:
+        self.submitted = 0
+        self.drawn = 0
+        self.dropped = 0
+        self.draw_time = 0.0
+
+    def summary(self) -> str:
+        """
+        :return: One line summary of the frames drawn and dropped.
+        """
+        mean_draw = 1e3 * self.draw_time / self.drawn if self.drawn else 0.0
+        return (f"Plot frames: {self.submitted} submitted, {self.drawn} drawn, {self.dropped} dropped, "
+                f"{mean_draw:.2f} ms per draw")
@@ -0,0 +1,110 @@
+import threading
+from typing import Callable
+
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+from refactored_gui.data_handling.spectrum import SpectrumAnalyser
+
+
+class SpectrumWorker(QObject):
+    """
+    Computes magnitude spectra of plotted records on a worker thread, keeping FFTs off the GUI thread.
+
+    Records are submitted from the GUI thread and only the latest set is kept: while a spectrum is being computed,
+    newer submissions replace each other and the superseded ones are dropped. At most one wake-up is queued on the
+    worker thread, and one result is emitted per computation, so neither thread's event queue grows when the other
+    falls behind.
+
+    Magnitudes are written into a small set of preallocated buffers used in turn. A result stays valid until
+    'buffers' - 1 further results have been emitted, which covers the result waiting in the GUI's plot scheduler.
+    """
+    # (frequencies, tuple of magnitudes in the order submitted)
+    spectra = pyqtSignal(object, object)
+    wake = pyqtSignal()
+
+    def __init__(self, record_duration: float = 2 ** 16 / 800e6, buffers: int = 4, workers: int = -1) -> None:
+        """
+        :param record_duration: Duration of a record in s, giving the sample rate of raw and down-converted records.
+        :param buffers: Number of output buffer sets used in turn.
+        :param workers: Threads used by scipy.fft.
+        """
+        super().__init__()
+
+        self.record_duration = record_duration
+        self.analyser = SpectrumAnalyser(workers=workers)
+        self.num_buffers = buffers
+        self.buffers = {}
+        self.next_buffer = 0
+
+        self.lock = threading.Lock()
+        self.pending = None
+        self.scheduled = False
+
+        self.computed = 0
+        self.dropped = 0
+
+        self.wake.connect(self.process_pending)
+
+    def submit(self, *records: np.ndarray, done: Callable | None = None) -> None:
+        """
+        Requests the spectra of a set of records, replacing any set not yet started.
+        :param records: 1D records, e.g. ch1, ch2, ch1 average and ch2 average.
+        :param done: Called without arguments once the records are no longer needed (computed or dropped), e.g. to
+            release a shared frame slot. May be called on the worker thread.
+        :return:
+        """
+        with self.lock:
+            dropped, self.pending = self.pending, (records, done)
+            if dropped is not None:
+                self.dropped += 1
+            wake = not self.scheduled
+            self.scheduled = True
+
+        if dropped is not None and dropped[1] is not None:
+            dropped[1]()
+        if wake:
+            self.wake.emit()
+
+    @pyqtSlot()
+    def process_pending(self) -> None:
+        """
+        Computes spectra until no records are pending.
+        :return:
+        """
+        while True:
+            with self.lock:
+                pending, self.pending = self.pending, None
+                if pending is None:
+                    self.scheduled = False
+                    return
+
+            records, done = pending
+            try:
+                frequencies, magnitudes = self.compute(records)
+            finally:
+                if done is not None:
+                    done()
+            self.computed += 1
+            self.spectra.emit(frequencies, magnitudes)
+
+    def compute(self, records: tuple) -> tuple[np.ndarray, tuple]:
+        """
+        :param records: 1D records of equal length and dtype.
+        :return: (frequencies, magnitudes), the magnitudes being views of the next buffer set.
+        """
+        samples = records[0].size
+        is_complex = np.iscomplexobj(records[0])
+        sample_rate = samples / self.record_duration
+
+        key = (len(records), self.analyser.output_samples(samples, is_complex))
+        if key not in self.buffers:
+            self.buffers[key] = np.empty((self.num_buffers, *key), dtype=np.float32)
+        out = self.buffers[key][self.next_buffer]
+        self.next_buffer = (self.next_buffer + 1) % self.num_buffers
+
+        frequencies = None
+        for record, magnitude in zip(records, out):
+            frequencies, _ = self.analyser.magnitude(record, sample_rate, out=magnitude)
+
+        return frequencies, tuple(out)
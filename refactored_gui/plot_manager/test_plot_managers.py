@@ -0,0 +1,27 @@
+import numpy as np
+
+from refactored_gui.plot_manager.plot_managers import minmax_envelope
+
+
+def test_envelope_keeps_peaks():
+    x = np.arange(100000, dtype=float)
+    y = np.zeros(100000, dtype=np.int16)
+    y[12345] = 1000
+    y[67890] = -1000
+
+    x_out, y_out = minmax_envelope(x, y, 0, x.size, 500)
+
+    assert x_out.size <= 1000
+    assert y_out.max() == 1000 and y_out.min() == -1000
+    assert x_out[0] == 0 and x_out[-1] == x.size - 1
+    assert np.all(np.diff(x_out) >= 0)
+
+
+def test_envelope_returns_full_resolution_when_zoomed_in():
+    x = np.arange(1000, dtype=float)
+    y = np.arange(1000, dtype=float)
+
+    x_out, y_out = minmax_envelope(x, y, 100, 200, 500)
+
+    assert np.array_equal(x_out, x[100:200])
+    assert np.array_equal(y_out, y[100:200])
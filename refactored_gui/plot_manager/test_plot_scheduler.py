@@ -0,0 +1,57 @@
+import threading
+
+from PyQt5.QtCore import QCoreApplication
+
+from refactored_gui.plot_manager.plot_scheduler import PlotScheduler
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+def test_only_latest_frame_is_drawn():
+    drawn = []
+    scheduler = PlotScheduler(fps=30)
+    scheduler.add_plot('a', lambda *frame: drawn.append(frame))
+
+    for i in range(10):
+        scheduler.submit('a', i, -i)
+    assert scheduler.timer.isActive()
+
+    scheduler.draw_pending()
+
+    assert drawn == [(9, -9)]
+    assert (scheduler.submitted, scheduler.drawn, scheduler.dropped) == (10, 1, 9)
+
+    # Nothing pending, the timer stops until the next frame
+    scheduler.draw_pending()
+    assert not scheduler.timer.isActive()
+
+
+def test_stop_draws_frames_from_other_threads():
+    drawn = []
+    scheduler = PlotScheduler(fps=30)
+    scheduler.add_plot('a', lambda *frame: drawn.append(frame))
+    scheduler.add_plot('b', lambda *frame: drawn.append(frame))
+    scheduler.start()
+
+    worker = threading.Thread(target=lambda: [scheduler.submit(key, i) for i in range(100) for key in 'ab'])
+    worker.start()
+    worker.join()
+
+    scheduler.stop()
+
+    assert sorted(drawn) == [(99,), (99,)]
+    assert scheduler.dropped == 198
+    assert not scheduler.timer.isActive()
+
+
+def test_every_frame_is_released_once():
+    released = []
+    scheduler = PlotScheduler(fps=30)
+    scheduler.add_plot('a', lambda slot: None, release=released.append)
+
+    for slot in range(5):
+        scheduler.submit('a', slot)
+    assert released == [0, 1, 2, 3]
+
+    scheduler.stop()
+    assert released == [0, 1, 2, 3, 4]
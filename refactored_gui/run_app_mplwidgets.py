@@ -421,9 +421,11 @@ class RunApp(Ui_MainWindow):
             prev_item.setForeground(1, brushes['inactive'])
             prev_item.setForeground(2, brushes['inactive'])
 
-    def update_plots(self, ch1_data: np.ndarray, ch2_data: np.ndarray):
+    def update_plots(self, slot: int, ch1_average: np.ndarray, ch2_average: np.ndarray):
+        ch1_data, ch2_data = self.expt_manager.frame_ring.frame(slot)
         self.plot_manager.update_plots(ch1_data, 'chA')
         self.plot_manager.update_plots(ch2_data, 'chB')
+        self.expt_manager.frame_ring.release(slot)
 
     def reset_expt_tab(self, last_index):
         """
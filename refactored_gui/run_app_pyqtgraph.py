@@ -19,6 +19,8 @@ from refactored_gui.data_handling.command import NMRCommand, PPMSFieldCommand, P
 from refactored_gui.experiment_manager.experiment_manager import ExperimentManager
 # Plot management
 from refactored_gui.plot_manager.plot_managers import PyqtgraphPlotManager
+from refactored_gui.plot_manager.plot_scheduler import PlotScheduler
+from refactored_gui.plot_manager.spectrum_worker import SpectrumWorker
 
 
 class RunApp(Ui_MainWindow):
@@ -39,8 +41,22 @@ class RunApp(Ui_MainWindow):
         self.active_sample = None
 
         # Initialise plot manager
-        plot_widgets = {'average_time': self.averageTimePlotWidget, 'last_time': self.lastTimePlotWidget}
+        self.setup_spectrum_widgets()
+        plot_widgets = {'average_time': self.averageTimePlotWidget, 'last_time': self.lastTimePlotWidget,
+                        'average_spectrum': self.averageSpectrumPlotWidget,
+                        'last_spectrum': self.lastSpectrumPlotWidget}
         self.plot_manager = PyqtgraphPlotManager(plot_widgets)
+        # Redraws at most 30 times per second, whatever the repeat rate
+        self.plot_scheduler = PlotScheduler(fps=30)
+        self.plot_scheduler.add_plot('NMR', self.draw_NMR_data, release=self.release_NMR_data)
+        self.plot_scheduler.add_plot('spectrum', self.draw_spectra)
+
+        # Spectra are computed on their own thread
+        self.spectrum_thread = QThread()
+        self.spectrum_worker = SpectrumWorker()
+        self.spectrum_worker.moveToThread(self.spectrum_thread)
+        self.spectrum_worker.spectra.connect(self.update_spectrum_plot)
+        self.spectrum_thread.start()
 
         # Initialise experiment manager
         self.expt_manager = ExperimentManager()
@@ -56,6 +72,24 @@ class RunApp(Ui_MainWindow):
         self.default_seq_filepath = 'sequences\\'
         self.default_data_filepath = 'data\\'
 
+    def setup_spectrum_widgets(self) -> None:
+        """
+        Adds a row of spectrum plots below the time plots.
+        """
+        self.spectrumPlotFrames = QtWidgets.QFrame(self.leftFrame)
+        self.spectrumPlotFrames.setFrameShape(QtWidgets.QFrame.Box)
+        self.spectrumPlotFrames.setFrameShadow(QtWidgets.QFrame.Plain)
+        self.spectrumPlotFrames.setLineWidth(0)
+        self.spectrumPlotFrames.setObjectName("spectrumPlotFrames")
+        spectrum_layout = QtWidgets.QHBoxLayout(self.spectrumPlotFrames)
+        self.averageSpectrumPlotWidget = PlotWidget(self.spectrumPlotFrames)
+        self.averageSpectrumPlotWidget.setObjectName("averageSpectrumPlotWidget")
+        spectrum_layout.addWidget(self.averageSpectrumPlotWidget)
+        self.lastSpectrumPlotWidget = PlotWidget(self.spectrumPlotFrames)
+        self.lastSpectrumPlotWidget.setObjectName("lastSpectrumPlotWidget")
+        spectrum_layout.addWidget(self.lastSpectrumPlotWidget)
+        self.verticalLayout.addWidget(self.spectrumPlotFrames)
+
     @staticmethod
     def initialise_logger() -> logging.Logger:
 
@@ -435,7 +469,36 @@ class RunApp(Ui_MainWindow):
             prev_item.setForeground(1, brushes['inactive'])
             prev_item.setForeground(2, brushes['inactive'])
 
-    def update_plot(self, ch1_data: np.ndarray, ch2_data: np.ndarray, ch1_average: np.ndarray, ch2_average: np.ndarray):
+    def update_plot(self, slot: int, ch1_average: np.ndarray, ch2_average: np.ndarray) -> None:
+        """
+        Receives a repeat held in a shared frame slot. The slot is held by the plot and the spectrum until each has
+        finished with it.
+        """
+        frame_ring = self.expt_manager.frame_ring
+        ch1_data, ch2_data = frame_ring.frame(slot)
+        # The experiment manager retained the slot once for this receiver, hold it once more for the spectrum
+        frame_ring.retain(slot)
+        self.plot_scheduler.submit('NMR', slot, ch1_data, ch2_data, ch1_average, ch2_average)
+        # The averages are views of the running mean, updated in place by the next repeat while the spectrum thread
+        # may still be reading them
+        self.spectrum_worker.submit(ch1_data, ch2_data, ch1_average.copy(), ch2_average.copy(),
+                                    done=lambda: frame_ring.release(slot))
+
+    def update_spectrum_plot(self, frequencies: np.ndarray, magnitudes: tuple) -> None:
+
+        self.plot_scheduler.submit('spectrum', frequencies, magnitudes)
+
+    def draw_spectra(self, frequencies: np.ndarray, magnitudes: tuple) -> None:
+
+        ch1_spectrum, ch2_spectrum, ch1_average_spectrum, ch2_average_spectrum = magnitudes
+        self.plot_manager.update_spectrum(frequencies, ch1_spectrum, 'last_spectrum', 'ch1')
+        self.plot_manager.update_spectrum(frequencies, ch2_spectrum, 'last_spectrum', 'ch2')
+
+        self.plot_manager.update_spectrum(frequencies, ch1_average_spectrum, 'average_spectrum', 'ch1')
+        self.plot_manager.update_spectrum(frequencies, ch2_average_spectrum, 'average_spectrum', 'ch2')
+
+    def draw_NMR_data(self, slot: int, ch1_data: np.ndarray, ch2_data: np.ndarray, ch1_average: np.ndarray,
+                      ch2_average: np.ndarray) -> None:
 
         self.plot_manager.update_plot(ch1_data, 'last_time', 'ch1')
         self.plot_manager.update_plot(ch2_data, 'last_time', 'ch2')
@@ -443,6 +506,10 @@ class RunApp(Ui_MainWindow):
         self.plot_manager.update_plot(ch1_average, 'average_time', 'ch1')
         self.plot_manager.update_plot(ch2_average, 'average_time', 'ch2')
 
+    def release_NMR_data(self, slot: int, *args) -> None:
+
+        self.expt_manager.frame_ring.release(slot)
+
     def reset_expt_tab(self, last_index: int) -> None:
         """
         Resets the main tab after an experiment is finished.
@@ -450,6 +517,10 @@ class RunApp(Ui_MainWindow):
 
         self.startExptBtn.setDisabled(False)
         self.saveDirBtn.setDisabled(False)
+        # Show the final repeat
+        self.plot_scheduler.stop()
+        self.logger.info(self.plot_scheduler.summary())
+        self.plot_scheduler.reset_stats()
         # Handle any early exit
         if last_index == -1:
             self.show_dialog("No commands in experiment!")
@@ -508,6 +579,8 @@ class RunApp(Ui_MainWindow):
     def shutdown_app(self) -> None:
         self.logger.info("Closing application")
         self.expt_manager.close_threads()
+        self.spectrum_thread.quit()
+        self.spectrum_thread.wait()
 
 def close_GUI():
     """
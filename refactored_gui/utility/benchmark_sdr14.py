@@ -0,0 +1,55 @@
+"""
+Benchmarks the SDR14 acquisition paths against the simulated ADQAPI backend, so no hardware is needed.
+
+Run from the repository root:
+    python -m refactored_gui.utility.benchmark_sdr14
+"""
+import time
+import argparse
+
+from refactored_gui.instrument_controllers.fake_adqapi import FakeADQAPI
+from refactored_gui.instrument_controllers.sdr14_controller import SDR14
+
+
+def benchmark_MR_acquisition(repeats: int = 5) -> float:
+    """
+    Times SDR14.MR_acquisition.
+    :param repeats: Number of acquisitions to time.
+    :return: Repeats per second.
+    """
+    device = SDR14(api=FakeADQAPI())
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        device.MR_acquisition()
+    elapsed = time.perf_counter() - start
+
+    return repeats / elapsed
+
+
+def benchmark_streaming(total_records: int = 2000, samples_per_record: int = 2048) -> float:
+    """
+    Times the streaming loop in ADQ_tools_lite.sdr14.get_data_setup.
+    :param total_records: Number of transfer buffers to collect.
+    :param samples_per_record: Samples per transfer buffer (both channels).
+    :return: Throughput in MB/s.
+    """
+    from ADQ_tools_lite import sdr14
+
+    device = sdr14(quiet=True, api=FakeADQAPI())
+
+    start = time.perf_counter()
+    device.get_data_setup(total_records=total_records, samples_per_record=samples_per_record, quiet=True)
+    elapsed = time.perf_counter() - start
+
+    return total_records * samples_per_record * 2 / elapsed / 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--records", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"MR_acquisition: {benchmark_MR_acquisition(args.repeats):.2f} repeats/s")
+    print(f"Streaming: {benchmark_streaming(args.records):.1f} MB/s")
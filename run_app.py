@@ -11,6 +11,7 @@ from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
 from PyQt5.QtGui import QBrush, QColor
 
 import ADQ_tools_lite
+from refactored_gui.plot_manager.plot_scheduler import PlotScheduler
 
 
 # noinspection PyUnresolvedReferences
@@ -199,11 +200,11 @@ class RunApp(Ui_MainWindow):
         self.time_plot_line = {"Channel A": None, "Channel B": None}
         self.frq_plot_line = {"Channel A": None, "Channel B": None}
 
-        # Setup live plotting timer and data variables
-        # self.update_timer = QTimer()
-        # self.update_timer.timeout.connect(self.update_live_plot_on_timeout)
-        # self.ch1_data = None
-        # self.ch2_data = None
+        # Setup live plotting scheduler and data variables, the plots are redrawn at most 30 times per second
+        self.live_scheduler = PlotScheduler(fps=30)
+        self.live_scheduler.add_plot('live', self.update_live_plot)
+        self.ch1_data = None
+        self.ch2_data = None
 
         # Can this stuff be changed in qtdesigner?
         #self.mainTab.setCurrentIndex(0)
@@ -690,7 +691,8 @@ class RunApp(Ui_MainWindow):
         self.liveThread.started.connect(self.liveWorker.continuous_acquisition)
         self.liveThread.finished.connect(self.liveThread.deleteLater)
 
-        self.liveWorker.data_out.connect(self.fetch_live_plot_data)
+        # Direct connection: frames are handed to the scheduler on the worker thread, not queued on the GUI thread
+        self.liveWorker.data_out.connect(self.fetch_live_plot_data, QtCore.Qt.DirectConnection)
         self.liveWorker.finished.connect(self.liveThread.quit)
         self.liveWorker.finished.connect(self.liveWorker.deleteLater)
 
@@ -703,7 +705,8 @@ class RunApp(Ui_MainWindow):
         self.liveThread.finished.connect(lambda: self.startLivePlot.setEnabled(True))
 
         # Start timer for plots
-        self.update_timer.start(500)
+        self.live_scheduler.reset_stats()
+        self.live_scheduler.start()
 
     def end_live_plot(self):
         """
@@ -712,20 +715,29 @@ class RunApp(Ui_MainWindow):
         """
 
         self.liveWorker.stop_acquisition()
-        self.update_timer.stop()
+        self.live_scheduler.stop()
+        print(self.live_scheduler.summary())
 
     def fetch_live_plot_data(self, ch1_data, ch2_data):
         """
+        Runs on the worker thread. Frames not drawn before the next one arrives are dropped.
         :param ch1_data: Data from SDR14 ch1 emitted from worker thread.
         :param ch2_data: Data from SDR14 ch2 emitted from worker thread.
         :return:
         """
 
+        self.live_scheduler.submit('live', ch1_data, ch2_data)
+
+    def update_live_plot(self, ch1_data, ch2_data):
+        """
+        Draws the latest frame, called by the live plot scheduler on the GUI thread.
+        """
+
         # Assign data from SDR14 worker thread to class variables
         self.ch1_data = ch1_data
         self.ch2_data = ch2_data
 
-        # Add to accumulator variable
+        self.update_live_plot_on_timeout()
 
     def update_live_plot_on_timeout(self):
         """
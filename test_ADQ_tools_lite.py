@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from ADQ_tools_lite import StreamRecorder, StreamRingBuffer, TransferBufferWait, read_stream_file, sdr14
+from refactored_gui.instrument_controllers.fake_adqapi import FakeADQAPI, FakeSDR14Timing
+
+
+@pytest.fixture
+def device():
+    return sdr14(quiet=True, api=FakeADQAPI(FakeSDR14Timing(realtime=False)))
+
+
+def test_ring_buffer_wraps():
+    ring = StreamRingBuffer(6)
+    pages = [np.arange(8, dtype=np.int16) + 100 * i for i in range(3)]
+
+    ring.write_page(pages[0])
+    assert np.array_equal(ring.read(3), [[0, 1, 2], [4, 5, 6]])
+    ring.write_page(pages[1])
+    with pytest.raises(BufferError):
+        ring.write_page(pages[2])
+
+    block = ring.read(5)
+    assert np.array_equal(block[0], [3, 100, 101, 102, 103])
+    assert np.array_equal(block[1], [7, 104, 105, 106, 107])
+    assert ring.available == 0
+
+
+def test_get_data_setup_returns_int16_array(device):
+    data, exit_code = device.get_data_setup(total_records=20, samples_per_record=512, quiet=True)
+
+    assert exit_code == 0
+    assert data.dtype == np.int16
+    assert data.shape == (2, 20 * 256)
+
+
+def test_stream_blocks_yields_fixed_size_blocks(device):
+    blocks = list(device.stream_blocks(1000, total_records=20, samples_per_record=512, quiet=True))
+
+    # 20 pages of 256 samples per channel give five whole blocks
+    assert len(blocks) == 5
+    assert all(block.shape == (2, 1000) and block.dtype == np.int16 for block in blocks)
+
+
+@pytest.mark.parametrize("memmap", [False, True])
+def test_binary_recording_round_trip(device, tmp_path, memmap):
+    path = str(tmp_path / "stream.adq")
+    data, exit_code = device.get_data_setup(write_to_file=path, total_records=10, samples_per_record=512,
+                                            quiet=True, memmap=memmap)
+
+    header, recorded = read_stream_file(path)
+    assert header["sample_skip"] == 4
+    assert header["interleave"] == "page_planar"
+    assert recorded.shape == (10, 2, 256)
+    assert np.array_equal(recorded[:, 0].ravel(), data[0])
+    assert np.array_equal(recorded[:, 1].ravel(), data[1])
+
+
+def test_memmap_recording_truncated_to_pages_written(tmp_path):
+    path = str(tmp_path / "stream.adq")
+    with StreamRecorder(path, {"samples_per_page": 8}, total_pages=100) as recorder:
+        recorder.write_page(np.arange(8, dtype=np.int16))
+
+    header, recorded = read_stream_file(path)
+    assert recorded.shape == (1, 2, 4)
+    assert np.array_equal(recorded[0, 1], [4, 5, 6, 7])
+
+
+def test_buffer_wait_backs_off(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("ADQ_tools_lite.time.sleep", sleeps.append)
+    results = iter([0, 0, 0, 0, 0, 0, 0, 2])
+    wait = TransferBufferWait(latency_target=1e-3, min_sleep=1e-4)
+
+    assert wait.wait(lambda: next(results)) == 2
+    assert sleeps == [1e-4, 2e-4, 4e-4, 8e-4, 1e-3, 1e-3, 1e-3]
+    assert wait.waits == 1 and wait.polls == 8
+
+
+def test_slow_stream_does_not_spin():
+    device = sdr14(quiet=True, api=FakeADQAPI())
+    # About 25 pages/s
+    device.stream_cfg_data.sample_skip = 2 ** 15
+    device.get_data_setup(total_records=5, samples_per_record=2048, quiet=True)
+
+    wait = device.buffer_wait
+    assert wait.wait_time > 0.1
+    assert wait.cpu_time < 0.5 * wait.wait_time